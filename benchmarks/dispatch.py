@@ -0,0 +1,72 @@
+#!/usr/bin/env python3
+"""
+بنچمارک سربار هر پیام: PreDispatchMiddleware در برابر مسیر قبلی (دو middleware)
+
+اجرا: python benchmarks/dispatch.py
+"""
+
+import asyncio
+import sys
+import time
+from pathlib import Path
+from types import SimpleNamespace
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from config import get_config, get_snapshot
+from middleware.dispatch import ADMIN_COMMANDS, PreDispatchMiddleware
+from utils.histogram import latency
+
+UPDATES = 100_000
+
+class _Event(SimpleNamespace):
+    async def answer(self, text, **kwargs):
+        pass
+
+async def _handler(event, data):
+    return None
+
+async def _legacy(event, data):
+    """مسیر قبلی: دو middleware، دو await روی get_config و پیمایش لیست دستورات"""
+    if get_snapshot().security.enable_rate_limit:
+        config = await get_config()
+        with latency.time("rate_limit"):
+            config.check_rate_limit(event.from_user.id)
+        config.increment_request_count(event.from_user.id)
+    await get_config()
+    command = event.text
+    if command and command.startswith('/'):
+        cmd_name = command.split()[0].lower()
+        admin_commands = ['/' + name for name in ADMIN_COMMANDS]
+        if any(cmd_name.startswith(cmd) for cmd in admin_commands):
+            get_snapshot().is_admin(event.from_user.id)
+    return await _handler(event, data)
+
+async def _bench(label, call, text):
+    user = SimpleNamespace(id=123456789)
+    event = _Event(from_user=user, text=text)
+    started = time.perf_counter()
+    for _ in range(UPDATES):
+        await call(event, {})
+    elapsed = time.perf_counter() - started
+    print(f"{label:<28} {text[:24]:<26} {elapsed / UPDATES * 1e6:6.2f} us/update")
+
+async def _main():
+    config = await get_config()
+    # محدودیت نرخ در بنچمارک مانع اجرا نشود
+    config.security.max_requests_per_minute = config.security.max_requests_per_day = 10 ** 9
+    middleware = PreDispatchMiddleware()
+    for rate_limit in (True, False):
+        config.security.enable_rate_limit = rate_limit
+        config.publish()
+        print(f"\nrate limit {'on' if rate_limit else 'off'}:")
+        for text in ("https://example.com/file.zip", "/fullstats", "/start"):
+            await _bench("handler only", _handler, text)
+            await _bench("legacy (rate limit + admin)", _legacy, text)
+            await _bench("PreDispatchMiddleware", lambda e, d: middleware(_handler, e, d), text)
+
+def main():
+    asyncio.run(_main())
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,55 @@
+#!/usr/bin/env python3
+"""
+بنچمارک رتبه‌بندی افزایشی در برابر مرتب‌سازی کامل (مسیر قبلی /fullstats)
+
+اجرا: python benchmarks/leaderboard.py
+"""
+
+import random
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from utils.leaderboard import Leaderboard
+
+USERS = 1_000_000
+UPDATES = 200_000
+
+def main():
+    random.seed(1386)
+    activity = {str(100000000 + i): int(random.paretovariate(1.2)) for i in range(USERS)}
+
+    started = time.perf_counter()
+    board = Leaderboard(activity)
+    print(f"bulk load {USERS:,} users: {time.perf_counter() - started:.3f}s")
+
+    user_ids = list(activity)
+    started = time.perf_counter()
+    for _ in range(UPDATES):
+        user_id = random.choice(user_ids)
+        board.increment(user_id)
+        activity[user_id] += 1
+    elapsed = time.perf_counter() - started
+    print(f"{UPDATES:,} increments: {elapsed:.3f}s ({elapsed / UPDATES * 1e6:.2f} us/op)")
+
+    started = time.perf_counter()
+    for _ in range(1000):
+        top = board.top(10)
+    print(f"top(10): {(time.perf_counter() - started) / 1000 * 1e6:.1f} us")
+
+    started = time.perf_counter()
+    for _ in range(10000):
+        board.rank(random.choice(user_ids))
+    print(f"rank(): {(time.perf_counter() - started) / 10000 * 1e6:.2f} us")
+
+    started = time.perf_counter()
+    full_scan = sorted(activity.items(), key=lambda x: x[1], reverse=True)[:10]
+    print(f"full sort (previous /fullstats): {(time.perf_counter() - started) * 1e3:.1f} ms")
+
+    assert [score for _, score in top] == [score for _, score in full_scan]
+
+
+if __name__ == "__main__":
+    main()
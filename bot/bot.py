@@ -4,7 +4,8 @@
 
 import asyncio
 import logging
-from typing import Dict, Any, Optional
+import aiofiles
+from typing import Dict, Any, List, Optional
 from datetime import datetime
 
 from aiogram import Bot, Dispatcher, types
@@ -13,23 +14,53 @@ from aiogram.types import Message, CallbackQuery
 from aiogram.enums import ParseMode
 from aiogram.client.default import DefaultBotProperties
 
-from config import env_config, get_config
+from config import env_config, get_config, get_snapshot, DEFAULT_CONFIG_PATH, ENV_FILE
 from handlers import register_handlers
-from middleware import RateLimitMiddleware, AdminMiddleware
+from middleware import PreDispatchMiddleware, OutboundGovernor, outbound_priority, DELIVERY
 from utils.shortlink import ShortLinkService
 from utils.downloader import DownloadManager
+from utils.config_watcher import ConfigWatcher
+from utils.timeseries import throughput
+from utils.histogram import latency
+from utils.metrics import metrics, MetricsServer
+from utils.tracing import tracer
+from utils.loop_monitor import loop_monitor
+from utils.membership import MembershipChecker
+from utils.dedupe import recent_requests
+from utils import url_canon
+from bot.webhook import WebhookServer
+from utils.job_queue import JobQueue, JobStore, Job, JOBS_PATH
+from utils.album import AlbumBuffer, AlbumItem, Batch
+from utils.cdn import CDNDelivery, CDNServer, create_storage
 
 logger = logging.getLogger(__name__)
 
+THROUGHPUT_PATH = "data/throughput.json"
+SHARD_THROUGHPUT_PATH = "data/shards/{index}.throughput.json"
+SHARD_JOBS_PATH = "data/shards/{index}.jobs.sqlite3"
+THROUGHPUT_SAVE_INTERVAL = 60  # ثانیه
+
 class TelegramBot:
     """کلاس اصلی ربات تلگرام"""
     
-    def __init__(self):
+    def __init__(self, shard: Optional[int] = None):
+        self.shard = shard  # شماره worker در حالت چند پروسه‌ای (None = تک‌پروسه)
+        self.throughput_path = THROUGHPUT_PATH if shard is None else SHARD_THROUGHPUT_PATH.format(index=shard)
         self.bot: Optional[Bot] = None
+        self.governor: Optional[OutboundGovernor] = None
         self.dp: Optional[Dispatcher] = None
         self.config = None
         self.shortlink_service: Optional[ShortLinkService] = None
         self.download_manager: Optional[DownloadManager] = None
+        self.config_watcher: Optional[ConfigWatcher] = None
+        self._throughput_task: Optional[asyncio.Task] = None
+        self.metrics_server: Optional[MetricsServer] = None
+        self.membership: Optional[MembershipChecker] = None
+        self.webhook_server: Optional[WebhookServer] = None
+        self.jobs: Optional[JobQueue] = None
+        self.albums: Optional[AlbumBuffer] = None
+        self.cdn: Optional[CDNDelivery] = None
+        self.cdn_server: Optional[CDNServer] = None
         
     async def setup(self):
         """راه‌اندازی اولیه ربات"""
@@ -42,25 +73,240 @@ class TelegramBot:
             default=DefaultBotProperties(parse_mode=ParseMode.HTML)
         )
         
+        # همه درخواست‌های API از زمان‌بند خروجی می‌گذرند (نرخ، اولویت، retry_after، یکی کردن ویرایش‌ها)
+        self.governor = OutboundGovernor(**self._governor_limits())
+        self.bot.session.middleware(self.governor)
+        
         # ایجاد dispatcher
         self.dp = Dispatcher()
         
         # ایجاد سرویس‌ها
-        self.shortlink_service = ShortLinkService()
+        self.shortlink_service = ShortLinkService(service=self.config.display_settings.short_link_service)
         self.download_manager = DownloadManager(
             max_file_size=env_config.max_file_size,
-            parallel_downloads=env_config.parallel_downloads
+            parallel_downloads=env_config.parallel_downloads,
+            config=self.config,
+            request_timeout=env_config.request_timeout
+        )
+        
+        self.membership = MembershipChecker(
+            self.bot,
+            positive_ttl=env_config.membership_ttl,
+            negative_ttl=env_config.membership_negative_ttl,
+            api_rate=env_config.membership_api_rate
         )
+        self.membership.start()
         
-        # ثبت middleware
-        self.dp.message.middleware(RateLimitMiddleware())
-        self.dp.message.middleware(AdminMiddleware())
+        # تحویل فایل‌های بزرگ با لینک امضا شده CDN (سرور فایل و پاکسازی فقط در یک پروسه)
+        if env_config.enable_cdn:
+            self.cdn = CDNDelivery(
+                create_storage(env_config.cdn_storage, env_config.cdn_storage_dir),
+                base_url=env_config.cdn_url,
+                secret=env_config.cdn_secret,
+                link_ttl=env_config.cdn_link_ttl,
+                max_bytes=env_config.cdn_max_bytes,
+                gc_interval=env_config.cdn_gc_interval
+            )
+            if not self.shard:
+                self.cdn.start()
+                self.cdn_server = CDNServer(self.cdn, env_config.cdn_host, env_config.cdn_port)
+                try:
+                    await self.cdn_server.start()
+                except OSError as e:
+                    logger.error("خطا در راه‌اندازی سرور فایل CDN: %s", e)
+                    self.cdn_server = None
+        
+        # ثبت middleware (محدودیت نرخ، دستور، ادمین و زبان در یک مرحله)
+        self.dp.message.middleware(PreDispatchMiddleware())
         
         # ثبت هندلرها
         await register_handlers(self.dp, self)
         
-        # تنظیم command list
-        await self.set_bot_commands()
+        # صف ماندگار کارهای آپلود (کارهای نیمه‌تمام پیش از ری‌استارت ادامه می‌یابند)
+        jobs_path = JOBS_PATH if self.shard is None else SHARD_JOBS_PATH.format(index=self.shard)
+        self.albums = AlbumBuffer(self._deliver_album, self._complete_batch)
+        self.jobs = JobQueue(JobStore(jobs_path), self._run_job, workers=env_config.job_workers,
+                             limits=self.config.get_job_limits, on_batch_done=self.albums.close)
+        self.jobs.start()
+        
+        # تنظیم command list (در حالت چند پروسه‌ای فقط یک بار)
+        if not self.shard:
+            await self.set_bot_commands()
+        
+        # پایش تأخیر حلقه رویداد و callback های مسدودکننده
+        loop_monitor.block_threshold = env_config.loop_block_threshold
+        loop_monitor.start()
+        
+        # حذف لینک‌ها و update های تکراری (با کلید لینک نرمال‌شده)
+        url_canon.configure(env_config.url_tracking_params)
+        recent_requests.completed_ttl = env_config.duplicate_window
+        
+        # ردیابی کارها (خطوط JSON در logs/traces.jsonl)
+        self._configure_tracing()
+        
+        # آمار گذردهی (بافر حلقوی با حافظه ثابت)
+        throughput.load(self.throughput_path)
+        self._throughput_task = asyncio.ensure_future(self._persist_throughput())
+        
+        # بارگذاری مجدد تنظیمات از دیسک بدون ری‌استارت
+        if env_config.config_reload_interval > 0:
+            self.config_watcher = ConfigWatcher(interval=env_config.config_reload_interval)
+            self.config_watcher.watch(DEFAULT_CONFIG_PATH, self._reload_app_config)
+            self.config_watcher.watch(str(ENV_FILE), self._reload_env_config)
+            self.config_watcher.start()
+        
+        # متریک‌های Prometheus (اختیاری)
+        if env_config.enable_metrics:
+            self._register_metrics()
+            self.metrics_server = MetricsServer(metrics, env_config.metrics_host, env_config.metrics_port)
+            try:
+                await self.metrics_server.start()
+            except OSError as e:
+                logger.error("خطا در راه‌اندازی سرور متریک: %s", e)
+                self.metrics_server = None
+    
+    def _register_metrics(self):
+        """ثبت گیج‌هایی که هنگام scrape از اجزای ربات خوانده می‌شوند"""
+        downloads = self.download_manager
+        shortlink = self.shortlink_service
+        metrics.gauge("active_downloads", "Downloads holding a slot or waiting for one",
+                      lambda: sum(downloads.active_downloads.values()))
+        metrics.gauge("download_slots", "Download semaphore state", lambda: {
+            'limit': downloads.semaphore.limit,
+            'active': downloads.semaphore.active,
+            'waiting': downloads.semaphore.waiting,
+        }, label="state")
+        metrics.gauge("reserved_disk_bytes", "Disk space reserved by in-flight downloads",
+                      lambda: downloads.reserved_disk)
+        metrics.gauge("bytes_per_second", "Transfer rate over the last minute",
+                      self._transfer_rates, label="direction")
+        metrics.gauge("event_loop_lag_seconds", "Last sampled event loop lag",
+                      lambda: loop_monitor.last_lag)
+        metrics.gauge("event_loop_blocks_total", "Times the loop was blocked longer than LOOP_BLOCK_THRESHOLD",
+                      lambda: loop_monitor.blocked_count, kind="counter")
+        metrics.gauge("shortlink_cache_requests_total", "Short link cache lookups by result", lambda: {
+            'hit': shortlink.cache_hits,
+            'miss': shortlink.cache_misses,
+        }, label="result", kind="counter")
+        metrics.gauge("shortlink_cache_hit_ratio", "Short link cache hit ratio", lambda: (
+            shortlink.cache_hits / (shortlink.cache_hits + shortlink.cache_misses)
+            if shortlink.cache_hits + shortlink.cache_misses else 0.0
+        ))
+        membership = self.membership
+        metrics.gauge("membership_cache_entries", "Cached required-channel membership results",
+                      lambda: membership.stats()['entries'])
+        metrics.gauge("membership_lookups_total", "Membership lookups by result", lambda: {
+            'hit': membership.hits,
+            'miss': membership.misses,
+            'api_call': membership.api_calls,
+        }, label="result", kind="counter")
+        metrics.gauge("duplicates_dropped_total", "Duplicate requests dropped before any work", lambda: {
+            'update': recent_requests.dropped_updates,
+            'url': recent_requests.dropped_urls,
+        }, label="kind", kind="counter")
+        if env_config.bot_mode == "webhook":
+            metrics.gauge("webhook_updates_in_flight", "Webhook updates being processed",
+                          lambda: self.webhook_server.in_flight if self.webhook_server else 0)
+            metrics.gauge("webhook_rejected_total", "Webhook updates rejected with 503 (backpressure)",
+                          lambda: self.webhook_server.rejected if self.webhook_server else 0, kind="counter")
+        metrics.gauge("job_queue_depth", "Upload jobs waiting for a job worker",
+                      lambda: self.jobs.depth if self.jobs else 0)
+        metrics.gauge("jobs_running", "Upload jobs being processed",
+                      lambda: len(self.jobs.running) if self.jobs else 0)
+        metrics.gauge("album_buffered_files", "Downloaded batch files waiting for their album",
+                      lambda: self.albums.buffered if self.albums else 0)
+        if self.cdn:
+            cdn = self.cdn
+            metrics.gauge("cdn_stored_bytes", "Bytes kept in CDN storage", lambda: cdn.stored_bytes)
+            metrics.gauge("cdn_stored_files", "Files kept in CDN storage", lambda: cdn.stored_objects)
+            metrics.gauge("cdn_files_total", "CDN files by event", lambda: {
+                'published': cdn.published,
+                'evicted': cdn.evicted,
+            }, label="event", kind="counter")
+            metrics.gauge("cdn_requests_total", "CDN file server requests by result", lambda: {
+                'served': self.cdn_server.served if self.cdn_server else 0,
+                'rejected': self.cdn_server.rejected if self.cdn_server else 0,
+            }, label="result", kind="counter")
+        governor = self.governor
+        metrics.gauge("telegram_outbound_waiting", "API calls waiting for the global rate limit",
+                      governor.waiting, label="priority")
+        metrics.gauge("telegram_outbound_total", "Outbound API calls that were delayed, retried or coalesced", lambda: {
+            'throttled': governor.throttled,
+            'retry_after': governor.retried,
+            'coalesced': governor.coalesced,
+        }, label="event", kind="counter")
+        metrics.gauge("config_version", "Published config snapshot version",
+                      lambda: get_snapshot().version)
+    
+    def _governor_limits(self) -> Dict[str, Any]:
+        """نرخ‌های API از .env (در حالت چند پروسه‌ای نرخ سراسری بین worker ها تقسیم می‌شود)"""
+        workers = max(1, env_config.workers) if self.shard is not None else 1
+        return {
+            'global_rate': env_config.tg_global_rate / workers,
+            'chat_rate': env_config.tg_chat_rate,
+            'group_rate': env_config.tg_group_rate,
+            'max_retries': env_config.tg_max_retries,
+        }
+    
+    @staticmethod
+    def _configure_tracing():
+        """اعمال تنظیمات ردیابی از .env"""
+        tracer.configure(
+            enabled=env_config.enable_tracing,
+            sample_rate=env_config.trace_sample_rate,
+            slow_threshold=env_config.trace_slow_threshold
+        )
+    
+    @staticmethod
+    def _transfer_rates() -> Dict[str, float]:
+        """نرخ دریافت و ارسال در دقیقه اخیر (بایت بر ثانیه)"""
+        summary = throughput.summary(60)
+        return {'in': summary['bytes_in_per_second'], 'out': summary['bytes_out_per_second']}
+    
+    async def _persist_throughput(self):
+        """ذخیره دوره‌ای آمار گذردهی"""
+        while True:
+            await asyncio.sleep(THROUGHPUT_SAVE_INTERVAL)
+            await self._save_throughput()
+    
+    async def _save_throughput(self):
+        """ذخیره آمار گذردهی در فایل"""
+        try:
+            async with aiofiles.open(self.throughput_path, 'w', encoding='utf-8') as f:
+                await f.write(throughput.dumps())
+        except Exception as e:
+            logger.error("خطا در ذخیره آمار گذردهی: %s", e)
+    
+    async def _reload_app_config(self):
+        """اعمال تغییرات data/config.json"""
+        await self.config.reload_settings(DEFAULT_CONFIG_PATH)
+        # ویرایش فایل ممکن است پیش‌تر هنگام save() خوانده شده باشد؛ اجزای وابسته همیشه به‌روز می‌شوند
+        self.shortlink_service.service = get_snapshot().display.short_link_service
+        self.jobs.refresh()
+    
+    async def _reload_env_config(self):
+        """اعمال تغییرات .env روی اجزای در حال اجرا"""
+        changed = env_config.reload()
+        if not changed:
+            return
+        
+        logger.info("تنظیمات .env بارگذاری مجدد شد: %s", ', '.join(changed))
+        self.download_manager.apply_limits(
+            max_file_size=env_config.max_file_size,
+            parallel_downloads=env_config.parallel_downloads,
+            request_timeout=env_config.request_timeout
+        )
+        if self.config_watcher and env_config.config_reload_interval > 0:
+            self.config_watcher.interval = env_config.config_reload_interval
+        self._configure_tracing()
+        self.governor.configure(**self._governor_limits())
+        loop_monitor.block_threshold = env_config.loop_block_threshold
+        recent_requests.completed_ttl = env_config.duplicate_window
+        url_canon.configure(env_config.url_tracking_params)
+        if self.cdn:
+            self.cdn.link_ttl = env_config.cdn_link_ttl
+            self.cdn.max_bytes = env_config.cdn_max_bytes
+            self.cdn.gc_interval = env_config.cdn_gc_interval
         
     async def set_bot_commands(self):
         """تنظیم لیست دستورات ربات"""
@@ -71,6 +317,8 @@ class TelegramBot:
             types.BotCommand(command="support", description="📞 تماس با پشتیبانی"),
             types.BotCommand(command="status", description="📊 وضعیت ربات"),
             types.BotCommand(command="mystats", description="📈 آمار کاربر"),
+            types.BotCommand(command="cancel", description="🛑 لغو آپلودها"),
+            types.BotCommand(command="queue", description="📋 صف آپلودهای من"),
         ]
         
         # اضافه کردن دستورات ادمین
@@ -86,6 +334,17 @@ class TelegramBot:
             types.BotCommand(command="fullstats", description="📊 آمار کامل ربات"),
             types.BotCommand(command="resetstats", description="🔄 ریست آمار"),
             types.BotCommand(command="security", description="🔧 تنظیمات امنیتی"),
+            types.BotCommand(command="blockhost", description="⛔ مسدود کردن دامنه"),
+            types.BotCommand(command="allowhost", description="✅ دامنه مجاز"),
+            types.BotCommand(command="removehost", description="➖ حذف دامنه از فیلتر"),
+            types.BotCommand(command="listhosts", description="🌐 لیست دامنه‌ها"),
+            types.BotCommand(command="quota", description="📦 سهمیه کاربران"),
+            types.BotCommand(command="setquota", description="📦 تنظیم سهمیه کاربر"),
+            types.BotCommand(command="resetquota", description="♻️ حذف سهمیه اختصاصی"),
+            types.BotCommand(command="settier", description="🎚 سطح کاربر (همزمانی و صف)"),
+            types.BotCommand(command="deliverymode", description="🌐 ارسال با تلگرام یا لینک CDN"),
+            types.BotCommand(command="latency", description="⏱ تأخیر مراحل پردازش"),
+            types.BotCommand(command="profile", description="🔬 پروفایل لحظه‌ای ربات"),
         ]
         
         commands.extend(admin_commands)
@@ -97,16 +356,83 @@ class TelegramBot:
         if not self.bot or not self.dp:
             raise RuntimeError("ربات راه‌اندازی نشده است. ابتدا setup() را فراخوانی کنید.")
         
+        # انواع update مورد نیاز (شامل chat_member برای کش عضویت)
+        allowed_updates = self.dp.resolve_used_update_types()
+        
+        if env_config.bot_mode == "webhook":
+            await self._run_webhook(allowed_updates)
+            return
+        
         # حذف webhook (اگر وجود دارد)
-        await self.bot.delete_webhook(drop_pending_updates=True)
+        await self.bot.delete_webhook(drop_pending_updates=False)
         
         # شروع polling
-        await self.dp.start_polling(self.bot)
+        await self.dp.start_polling(self.bot, allowed_updates=allowed_updates)
+    
+    async def _run_webhook(self, allowed_updates):
+        """اجرای سرور webhook تا زمان لغو"""
+        self.webhook_server = WebhookServer(
+            self.dp,
+            self.bot,
+            host=env_config.webhook_host,
+            port=env_config.webhook_port,
+            path=env_config.webhook_path,
+            secret_token=env_config.webhook_secret,
+            max_concurrent=env_config.webhook_max_concurrent
+        )
+        await self.webhook_server.start()
+        
+        # بدون WEBHOOK_URL فقط سرور محلی اجرا می‌شود (برای تست یا وقتی webhook از قبل ثبت شده)
+        if env_config.webhook_url:
+            await self.bot.set_webhook(
+                url=env_config.webhook_url.rstrip('/') + env_config.webhook_path,
+                secret_token=env_config.webhook_secret,
+                allowed_updates=allowed_updates,
+                max_connections=min(100, env_config.webhook_max_concurrent)
+            )
+            logger.info("webhook در تلگرام ثبت شد")
+        
+        await asyncio.Event().wait()
     
     async def shutdown(self):
         """خاموش کردن ربات"""
+        if self.webhook_server:
+            await self.webhook_server.stop()
+        
+        if self.config_watcher:
+            await self.config_watcher.stop()
+        
+        if self.metrics_server:
+            await self.metrics_server.stop()
+        
+        if self.cdn_server:
+            await self.cdn_server.stop()
+        
+        if self.cdn:
+            await self.cdn.stop()
+        
+        await loop_monitor.stop()
+        
+        if self.membership:
+            await self.membership.stop()
+        
+        if self._throughput_task:
+            self._throughput_task.cancel()
+            await self._save_throughput()
+        
+        if self.albums:
+            await self.albums.stop()
+        
+        if self.jobs:
+            await self.jobs.stop()
+        
         if self.download_manager:
-            await self.download_manager.shutdown()
+            keep = set()
+            if self.jobs:
+                keep |= self.jobs.resumable_files()
+            if self.albums:
+                keep |= self.albums.files()
+            await self.download_manager.shutdown(keep=keep)
         
         if self.bot:
             await self.bot.session.close()
@@ -121,49 +447,88 @@ class TelegramBot:
         handler = UserHandlers(self)
         await handler._process_upload(message, url)
     
+    async def _run_job(self, job: Job) -> str:
+        """اجرای یک کار از صف آپلود"""
+        from handlers.user_handlers import UserHandlers
+        with outbound_priority(DELIVERY):
+            return await UserHandlers(self).run_job(job)
+    
+    async def _deliver_album(self, batch: Batch, items: List[AlbumItem]):
+        """ارسال گروهی فایل‌های آماده یک دسته"""
+        from handlers.user_handlers import UserHandlers
+        with outbound_priority(DELIVERY):
+            await UserHandlers(self).deliver_album(batch, items)
+    
+    async def _complete_batch(self, batch: Batch):
+        """پیام خلاصه پس از پایان یک دسته"""
+        from handlers.user_handlers import UserHandlers
+        await UserHandlers(self).complete_batch(batch)
+    
     async def send_message(self, chat_id: int, text: str, **kwargs) -> Message:
         """ارسال پیام با هندل کردن خطاها"""
         try:
-            return await self.bot.send_message(chat_id, text, **kwargs)
+            with latency.time("tg.send_message"), tracer.span("tg.send_message", chat_id=chat_id):
+                return await self.bot.send_message(chat_id, text, **kwargs)
         except Exception as e:
-            logger.error(f"خطا در ارسال پیام به {chat_id}: {e}")
+            metrics.count_error("telegram")
+            logger.error("خطا در ارسال پیام به %s: %s", chat_id, e)
             raise
     
     async def edit_message(self, chat_id: int, message_id: int, text: str, **kwargs) -> Message:
         """ویرایش پیام با هندل کردن خطاها"""
         try:
-            return await self.bot.edit_message_text(text, chat_id, message_id, **kwargs)
+            with latency.time("tg.edit_message"), tracer.span("tg.edit_message", chat_id=chat_id):
+                return await self.bot.edit_message_text(text, chat_id, message_id, **kwargs)
         except Exception as e:
-            logger.error(f"خطا در ویرایش پیام {message_id} در {chat_id}: {e}")
+            metrics.count_error("telegram")
+            logger.error("خطا در ویرایش پیام %s در %s: %s", message_id, chat_id, e)
             raise
     
     async def delete_message(self, chat_id: int, message_id: int):
         """حذف پیام با هندل کردن خطاها"""
         try:
-            await self.bot.delete_message(chat_id, message_id)
+            with latency.time("tg.delete_message"), tracer.span("tg.delete_message", chat_id=chat_id):
+                await self.bot.delete_message(chat_id, message_id)
         except Exception as e:
-            logger.error(f"خطا در حذف پیام {message_id} از {chat_id}: {e}")
+            metrics.count_error("telegram")
+            logger.error("خطا در حذف پیام %s از %s: %s", message_id, chat_id, e)
     
     async def send_document(self, chat_id: int, document, **kwargs) -> Message:
         """ارسال فایل با هندل کردن خطاها"""
         try:
-            return await self.bot.send_document(chat_id, document, **kwargs)
+            with latency.time("tg.send_document"), tracer.span("tg.send_document", chat_id=chat_id):
+                return await self.bot.send_document(chat_id, document, **kwargs)
+        except Exception as e:
+            metrics.count_error("telegram")
+            logger.error("خطا در ارسال فایل به %s: %s", chat_id, e)
+            raise
+    
+    async def send_media_group(self, chat_id: int, media: list, **kwargs) -> List[Message]:
+        """ارسال آلبوم (۲ تا ۱۰ فایل) با هندل کردن خطاها"""
+        try:
+            with latency.time("tg.send_media_group"), tracer.span("tg.send_media_group", chat_id=chat_id, items=len(media)):
+                return await self.bot.send_media_group(chat_id, media, **kwargs)
         except Exception as e:
-            logger.error(f"خطا در ارسال فایل به {chat_id}: {e}")
+            metrics.count_error("telegram")
+            logger.error("خطا در ارسال آلبوم به %s: %s", chat_id, e)
             raise
     
     async def send_photo(self, chat_id: int, photo, **kwargs) -> Message:
         """ارسال عکس با هندل کردن خطاها"""
         try:
-            return await self.bot.send_photo(chat_id, photo, **kwargs)
+            with latency.time("tg.send_photo"), tracer.span("tg.send_photo", chat_id=chat_id):
+                return await self.bot.send_photo(chat_id, photo, **kwargs)
         except Exception as e:
-            logger.error(f"خطا در ارسال عکس به {chat_id}: {e}")
+            metrics.count_error("telegram")
+            logger.error("خطا در ارسال عکس به %s: %s", chat_id, e)
             raise
     
     async def send_video(self, chat_id: int, video, **kwargs) -> Message:
         """ارسال ویدیو با هندل کردن خطاها"""
         try:
-            return await self.bot.send_video(chat_id, video, **kwargs)
+            with latency.time("tg.send_video"), tracer.span("tg.send_video", chat_id=chat_id):
+                return await self.bot.send_video(chat_id, video, **kwargs)
         except Exception as e:
-            logger.error(f"خطا در ارسال ویدیو به {chat_id}: {e}")
+            metrics.count_error("telegram")
+            logger.error("خطا در ارسال ویدیو به %s: %s", chat_id, e)
             raise
@@ -0,0 +1,329 @@
+"""
+حالت چند پروسه‌ای: یک supervisor و N پروسه worker
+
+- supervisor فقط update ها را دریافت می‌کند (getUpdates یا webhook) و هر update را
+  با consistent hashing روی شناسه کاربر به یک worker می‌دهد؛ پس وضعیت هر کاربر
+  (active_downloads، محدودیت نرخ، سهمیه) فقط در یک worker است
+- هر worker یک TelegramBot کامل با dispatcher خودش اجرا می‌کند و وضعیت کاربرانش را
+  در data/shards/<n>.json ذخیره می‌کند؛ تنظیمات در data/config.json مشترک است و با
+  hot reload بین worker ها پخش می‌شود
+- اسلات‌های دانلود (PARALLEL_DOWNLOADS) با یک سمافور بین پروسه‌ای بین همه worker ها مشترک است؛
+  اسلات‌های در دست هر worker در یک آرایه مشترک شمرده می‌شوند و وقتی worker از کار
+  افتاده دوباره اجرا می‌شود، supervisor آن‌ها را آزاد می‌کند
+- هر worker حداکثر WEBHOOK_MAX_CONCURRENT update را همزمان پردازش می‌کند؛ بقیه در صف
+  آن (WORKER_QUEUE_SIZE) می‌مانند و با پر شدن صف، دریافت update در supervisor متوقف می‌شود
+"""
+
+import asyncio
+import bisect
+import hashlib
+import logging
+import multiprocessing
+import queue
+from typing import Any, Dict, List, Optional, Set
+
+import aiohttp
+
+from utils.metrics import metrics
+
+logger = logging.getLogger(__name__)
+
+API_URL = "https://api.telegram.org/bot{token}/{method}"
+POLL_TIMEOUT = 30  # ثانیه (long polling)
+SHARD_STATE_PATH = "data/shards/{index}.json"
+SHARD_LOG_PATH = "logs/bot.shard{index}.log"
+
+# کلیدهای update که فرستنده را در from دارند
+_SENDER_KEYS = (
+    'message', 'edited_message', 'callback_query', 'chat_member', 'my_chat_member',
+    'inline_query', 'chosen_inline_result', 'shipping_query', 'pre_checkout_query',
+)
+
+def update_user_id(update: Dict[str, Any]) -> Optional[int]:
+    """شناسه فرستنده update (یا چت، اگر فرستنده نداشته باشد)"""
+    for key in _SENDER_KEYS:
+        event = update.get(key)
+        if event is None:
+            continue
+        sender = event.get('from')
+        if sender:
+            return sender['id']
+        chat = event.get('chat')
+        if chat:
+            return chat['id']
+    return None
+
+class HashRing:
+    """consistent hashing با گره‌های مجازی (تغییر تعداد worker فقط بخش کوچکی از کاربران را جابه‌جا می‌کند)"""
+
+    def __init__(self, nodes: int, replicas: int = 160):
+        points = sorted(
+            (self._hash(f"{node}:{replica}"), node)
+            for node in range(nodes) for replica in range(replicas)
+        )
+        self._points = [point for point, _ in points]
+        self._nodes = [node for _, node in points]
+
+    @staticmethod
+    def _hash(value: str) -> int:
+        return int.from_bytes(hashlib.blake2b(value.encode(), digest_size=8).digest(), 'big')
+
+    def node_for(self, key: int) -> int:
+        index = bisect.bisect(self._points, self._hash(str(key)))
+        return self._nodes[index % len(self._nodes)]
+
+class GlobalSlots:
+    """
+    اسلات‌های دانلود مشترک بین worker ها
+    (multiprocessing.Semaphore با تلاش غیرمسدودکننده تا حلقه رویداد مسدود نشود)
+    held: آرایه مشترک تعداد اسلات‌های در دست هر worker (برای آزادسازی پس از خرابی)
+    """
+
+    def __init__(self, semaphore, held, index: int, max_delay: float = 0.1):
+        self._semaphore = semaphore
+        self._held = held
+        self.index = index
+        self.max_delay = max_delay
+
+    async def __aenter__(self):
+        delay = 0.005
+        while not self._semaphore.acquire(False):
+            await asyncio.sleep(delay)
+            delay = min(delay * 2, self.max_delay)
+        with self._held.get_lock():
+            self._held[self.index] += 1
+
+    async def __aexit__(self, exc_type, exc, tb):
+        with self._held.get_lock():
+            self._held[self.index] -= 1
+        self._semaphore.release()
+
+    @staticmethod
+    def reclaim(semaphore, held, index: int) -> int:
+        """آزاد کردن اسلات‌های worker متوقف شده؛ تعداد آزاد شده را برمی‌گرداند"""
+        with held.get_lock():
+            count = held[index]
+            held[index] = 0
+        for _ in range(count):
+            semaphore.release()
+        return count
+
+class Supervisor:
+    """اجرای worker ها، دریافت update ها و تقسیم آن‌ها بین worker ها"""
+
+    def __init__(self, settings, workers: int, queue_size: int = 1000):
+        self.settings = settings  # EnvironmentConfig (تنظیمات .env)
+        self.workers = workers
+        self.queue_size = queue_size
+        self.ring = HashRing(workers)
+        self._context = multiprocessing.get_context("spawn")
+        self._slots = self._context.Semaphore(max(1, settings.parallel_downloads))
+        self._held_slots = self._context.Array('i', workers)
+        self._queues = [self._context.Queue(queue_size) for _ in range(workers)]
+        self._processes: List[Optional[multiprocessing.Process]] = [None] * workers
+        self._session: Optional[aiohttp.ClientSession] = None
+        self.routed = [0] * workers
+
+    async def run(self):
+        """شروع worker ها و دریافت update ها تا زمان لغو"""
+        for index in range(self.workers):
+            self._start_worker(index)
+        self._register_metrics()
+        self._session = aiohttp.ClientSession()
+        allowed_updates = await self._allowed_updates()
+        watchdog = asyncio.ensure_future(self._watch_workers())
+        try:
+            if self.settings.bot_mode == "webhook":
+                await self._run_webhook(allowed_updates)
+            else:
+                await self._poll(allowed_updates)
+        finally:
+            watchdog.cancel()
+
+    async def shutdown(self, timeout: float = 30):
+        """ارسال پیام پایان به worker ها و انتظار برای خروج آن‌ها"""
+        if self._session:
+            await self._session.close()
+        for worker_queue in self._queues:
+            try:
+                worker_queue.put_nowait(None)
+            except queue.Full:
+                pass
+        loop = asyncio.get_event_loop()
+        for process in self._processes:
+            if process is None:
+                continue
+            await loop.run_in_executor(None, process.join, timeout)
+            if process.is_alive():
+                logger.warning("worker %s به موقع خارج نشد؛ متوقف می‌شود", process.name)
+                process.terminate()
+
+    async def feed_raw_update(self, bot, update: Dict[str, Any]):
+        """ارسال update به worker مالک کاربر (امضای Dispatcher برای استفاده در WebhookServer)"""
+        user_id = update_user_id(update)
+        index = self.ring.node_for(user_id if user_id is not None else update['update_id'])
+        self.routed[index] += 1
+        worker_queue = self._queues[index]
+        try:
+            worker_queue.put_nowait(update)
+        except queue.Full:
+            # صف worker پر است: بدون مسدود کردن حلقه منتظر می‌مانیم (فشار معکوس روی دریافت)
+            await asyncio.get_event_loop().run_in_executor(None, worker_queue.put, update)
+
+    def _start_worker(self, index: int):
+        process = self._context.Process(
+            target=_worker_main,
+            args=(index, self._queues[index], self._slots, self._held_slots),
+            name=f"prolink-worker-{index}",
+            daemon=True
+        )
+        process.start()
+        self._processes[index] = process
+        logger.info("worker %s شروع شد (pid %s)", index, process.pid)
+
+    async def _watch_workers(self, interval: float = 5):
+        """راه‌اندازی مجدد worker هایی که از کار افتاده‌اند"""
+        while True:
+            await asyncio.sleep(interval)
+            for index, process in enumerate(self._processes):
+                if process is not None and not process.is_alive():
+                    metrics.count_error("worker")
+                    logger.error("worker %s با کد %s خارج شد؛ راه‌اندازی مجدد", index, process.exitcode)
+                    reclaimed = GlobalSlots.reclaim(self._slots, self._held_slots, index)
+                    if reclaimed:
+                        logger.warning("%s اسلات دانلود worker %s آزاد شد", reclaimed, index)
+                    self._start_worker(index)
+
+    async def _allowed_updates(self) -> List[str]:
+        """انواع update مورد نیاز هندلرها (مثل حالت تک‌پروسه)"""
+        from aiogram import Dispatcher
+        from handlers import register_handlers
+        dp = Dispatcher()
+        await register_handlers(dp, None)
+        return dp.resolve_used_update_types()
+
+    async def _call(self, method: str, **params) -> Any:
+        """فراخوانی مستقیم Bot API (supervisor به aiogram Bot نیاز ندارد)"""
+        url = API_URL.format(token=self.settings.bot_token, method=method)
+        timeout = aiohttp.ClientTimeout(total=POLL_TIMEOUT + 10)
+        params = {key: value for key, value in params.items() if value is not None}
+        async with self._session.post(url, json=params, timeout=timeout) as response:
+            payload = await response.json()
+        if not payload.get('ok'):
+            raise RuntimeError(f"{method}: {payload.get('description')}")
+        return payload['result']
+
+    async def _poll(self, allowed_updates: List[str]):
+        """long polling و تقسیم update های خام (بدون parse در supervisor)"""
+        await self._call("deleteWebhook", drop_pending_updates=False)
+        offset = None
+        while True:
+            try:
+                updates = await self._call(
+                    "getUpdates", offset=offset, timeout=POLL_TIMEOUT, allowed_updates=allowed_updates
+                )
+            except (aiohttp.ClientError, asyncio.TimeoutError, RuntimeError) as e:
+                metrics.count_error("telegram")
+                logger.error("خطا در دریافت update ها: %s", e)
+                await asyncio.sleep(1)
+                continue
+            for update in updates:
+                offset = update['update_id'] + 1
+                await self.feed_raw_update(None, update)
+
+    async def _run_webhook(self, allowed_updates: List[str]):
+        from bot.webhook import WebhookServer
+        server = WebhookServer(
+            self,
+            None,
+            host=self.settings.webhook_host,
+            port=self.settings.webhook_port,
+            path=self.settings.webhook_path,
+            secret_token=self.settings.webhook_secret,
+            max_concurrent=self.settings.webhook_max_concurrent
+        )
+        await server.start()
+        try:
+            if self.settings.webhook_url:
+                await self._call(
+                    "setWebhook",
+                    url=self.settings.webhook_url.rstrip('/') + self.settings.webhook_path,
+                    secret_token=self.settings.webhook_secret,
+                    allowed_updates=allowed_updates,
+                    max_connections=min(100, self.settings.webhook_max_concurrent)
+                )
+            await asyncio.Event().wait()
+        finally:
+            await server.stop()
+
+    def _register_metrics(self):
+        if not self.settings.enable_metrics:
+            return
+        metrics.gauge("worker_updates_routed_total", "Updates routed to each worker", lambda: {
+            str(index): count for index, count in enumerate(self.routed)
+        }, label="worker", kind="counter")
+        metrics.gauge("worker_alive", "Worker processes alive", lambda: sum(
+            1 for process in self._processes if process is not None and process.is_alive()
+        ))
+
+
+def _worker_main(index: int, updates, slots, held_slots):
+    """نقطه شروع پروسه worker"""
+    from config import env_config
+    from utils.logging_setup import setup_logging, stop_logging
+
+    # هر worker فایل لاگ خودش را دارد (چرخش فایل مشترک بین پروسه‌ها امن نیست)
+    stop_logging()
+    setup_logging(
+        level=env_config.log_level,
+        enable_file_logging=env_config.enable_file_logging,
+        log_file=SHARD_LOG_PATH.format(index=index),
+        max_bytes=env_config.log_max_bytes,
+        backup_count=env_config.log_backup_count,
+        rotate_when=env_config.log_rotate_when
+    )
+    try:
+        asyncio.run(_run_worker(index, updates, slots, held_slots))
+    except KeyboardInterrupt:
+        pass
+    finally:
+        stop_logging()
+
+async def _feed(bot, update: Dict[str, Any]):
+    try:
+        await bot.dp.feed_raw_update(bot.bot, update)
+    except Exception as e:
+        logger.error("خطا در پردازش update %s: %s", update.get('update_id'), e)
+
+async def _run_worker(index: int, updates, slots, held_slots):
+    from bot.bot import TelegramBot
+    from config import env_config, use_state_file
+
+    use_state_file(SHARD_STATE_PATH.format(index=index), keep_totals=index == 0)
+    # هر worker متریک‌های خودش را روی پورت بعدی ارائه می‌دهد
+    env_config.metrics_port += index + 1
+
+    bot = TelegramBot(shard=index)
+    await bot.setup()
+    bot.download_manager.global_slots = GlobalSlots(slots, held_slots, index)
+
+    loop = asyncio.get_event_loop()
+    tasks: Set[asyncio.Task] = set()
+    # update بعدی فقط وقتی از صف برداشته می‌شود که جا باشد؛ صف پر فشار معکوس را به supervisor می‌رساند
+    in_flight = asyncio.Semaphore(max(1, env_config.webhook_max_concurrent))
+    logger.info("worker %s آماده است", index)
+    try:
+        while True:
+            await in_flight.acquire()
+            update = await loop.run_in_executor(None, updates.get)
+            if update is None:
+                in_flight.release()
+                break
+            task = asyncio.ensure_future(_feed(bot, update))
+            tasks.add(task)
+            task.add_done_callback(tasks.discard)
+            task.add_done_callback(lambda _: in_flight.release())
+        if tasks:
+            await asyncio.wait(set(tasks), timeout=60)
+    finally:
+        await bot.shutdown()
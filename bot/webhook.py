@@ -0,0 +1,90 @@
+"""
+حالت webhook: سرور aiohttp داخلی برای دریافت update ها
+
+- هدر X-Telegram-Bot-Api-Secret-Token با WEBHOOK_SECRET مقایسه می‌شود
+- پاسخ فوراً برگردانده می‌شود و update در پس‌زمینه به dispatcher داده می‌شود
+- اگر تعداد update های در حال پردازش به سقف برسد 503 برمی‌گردد (تلگرام دوباره می‌فرستد)
+"""
+
+import asyncio
+import hmac
+import logging
+from typing import Any, Dict, Optional, Set
+
+from aiohttp import web
+
+from utils.metrics import metrics
+
+logger = logging.getLogger(__name__)
+
+SECRET_HEADER = "X-Telegram-Bot-Api-Secret-Token"
+
+class WebhookServer:
+    """دریافت update ها از تلگرام (یا reverse proxy) و ارسال به dispatcher"""
+
+    def __init__(self, dispatcher, bot, host: str = "0.0.0.0", port: int = 8080, path: str = "/webhook",
+                 secret_token: str = "", max_concurrent: int = 256):
+        self.dispatcher = dispatcher  # aiogram Dispatcher
+        self.bot = bot  # aiogram Bot
+        self.host = host
+        self.port = port
+        self.path = path
+        self.secret_token = secret_token
+        self.max_concurrent = max_concurrent
+        self.rejected = 0
+        self._tasks: Set[asyncio.Task] = set()
+        self._runner: Optional[web.AppRunner] = None
+
+    @property
+    def in_flight(self) -> int:
+        return len(self._tasks)
+
+    def make_app(self) -> web.Application:
+        """برنامه aiohttp با مسیر webhook (برای start و تست)"""
+        app = web.Application()
+        app.router.add_post(self.path, self._handle_update)
+        return app
+
+    async def start(self):
+        """شروع سرور"""
+        self._runner = web.AppRunner(self.make_app(), access_log=None)
+        await self._runner.setup()
+        await web.TCPSite(self._runner, self.host, self.port).start()
+        logger.info("webhook روی http://%s:%s%s فعال شد", self.host, self.port, self.path)
+
+    async def stop(self, timeout: float = 10):
+        """توقف سرور و انتظار (محدود) برای update های در حال پردازش"""
+        if self._runner:
+            await self._runner.cleanup()
+            self._runner = None
+        if self._tasks:
+            await asyncio.wait(set(self._tasks), timeout=timeout)
+
+    async def _handle_update(self, request: web.Request) -> web.Response:
+        if self.secret_token and not hmac.compare_digest(
+            request.headers.get(SECRET_HEADER, ""), self.secret_token
+        ):
+            return web.Response(status=401)
+
+        if len(self._tasks) >= self.max_concurrent:
+            self.rejected += 1
+            return web.Response(status=503, headers={"Retry-After": "1"})
+
+        try:
+            update = await request.json()
+        except (ValueError, UnicodeDecodeError):
+            return web.Response(status=400)
+        if not isinstance(update, dict) or 'update_id' not in update:
+            return web.Response(status=400)
+
+        task = asyncio.ensure_future(self._process(update))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+        return web.Response(text="ok")
+
+    async def _process(self, update: Dict[str, Any]):
+        try:
+            await self.dispatcher.feed_raw_update(self.bot, update)
+        except Exception as e:
+            metrics.count_error("webhook")
+            logger.error("خطا در پردازش update %s: %s", update.get('update_id'), e)
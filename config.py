@@ -3,20 +3,68 @@ Configuration management for the bot
 """
 
 import os
+import re
 import json
 import logging
-from typing import Dict, List, Any, Optional, Tuple
-from dataclasses import dataclass, field, asdict
+import tempfile
+from typing import Dict, List, Any, Optional, Tuple, FrozenSet
+from dataclasses import dataclass, field, asdict, fields
+from collections import namedtuple
 from datetime import datetime, timezone
 import aiofiles
 from pathlib import Path
 from dotenv import load_dotenv
 import asyncio
+import time
 
 from config.i18n import translator, Language
+from utils.leaderboard import Leaderboard
+from utils.histogram import latency
+from utils.tracing import tracer
+from utils.host_filter import HostFilter
+from utils.url_canon import DEFAULT_TRACKING_PARAMS
 
 logger = logging.getLogger(__name__)
 
+_rate_clock: Tuple[int, Optional[datetime], str, str] = (-1, None, "", "")
+
+def _rate_limit_clock() -> Tuple[datetime, str, str]:
+    """Current UTC time with its minute and date keys (formatted at most once per second)"""
+    global _rate_clock
+    second = int(time.time())
+    if _rate_clock[0] != second:
+        now = datetime.now(timezone.utc)
+        _rate_clock = (second, now, now.strftime("%Y-%m-%d %H:%M"), now.strftime("%Y-%m-%d"))
+    return _rate_clock[1], _rate_clock[2], _rate_clock[3]
+
+DEFAULT_CONFIG_PATH = "data/config.json"
+
+# Per-user sections that go to the state file when one is attached (worker shards)
+STATE_SECTIONS = ('statistics', 'user_sessions', 'user_languages')
+
+# Sections taken from the config file on hot reload
+SETTINGS_SECTIONS = (
+    'display_settings', 'security', 'quota', 'scheduler', 'delivery', 'broadcast',
+    'admin_ids', 'required_channels',
+)
+
+def _section_key(value: Any) -> str:
+    """Comparable form of one settings section"""
+    return json.dumps(value, sort_keys=True, ensure_ascii=False)
+
+DELIVERY_MODES = ("telegram", "auto", "cdn")
+ENV_FILE = Path(__file__).parent / ".env"
+
+# .env settings only read at startup (servers, processes, pools); a reload keeps the running values
+RESTART_ONLY_SETTINGS = (
+    'bot_token', 'bot_mode', 'workers', 'worker_queue_size', 'job_workers',
+    'webhook_url', 'webhook_path', 'webhook_host', 'webhook_port', 'webhook_secret', 'webhook_max_concurrent',
+    'enable_metrics', 'metrics_host', 'metrics_port',
+    'enable_cdn', 'cdn_url', 'cdn_secret', 'cdn_storage', 'cdn_storage_dir', 'cdn_host', 'cdn_port',
+    'membership_ttl', 'membership_negative_ttl', 'membership_api_rate',
+    'log_level', 'enable_file_logging', 'log_max_bytes', 'log_backup_count', 'log_rotate_when',
+)
+
 @dataclass
 class DisplaySettings:
     show_filename: bool = True
@@ -35,12 +83,39 @@ class SecuritySettings:
     max_requests_per_day: int = 100  # Daily limit
     enable_anti_spam: bool = True
     blocked_extensions: List[str] = field(default_factory=lambda: ["exe", "scr", "bat", "cmd", "msi", "vbs", "ps1", "sh"])
+    allowed_hosts: List[str] = field(default_factory=list)  # Empty = any host; entries include subdomains
+    blocked_hosts: List[str] = field(default_factory=list)  # Checked before allowed_hosts
+
+@dataclass
+class QuotaSettings:
+    enable_quota: bool = True
+    daily_bytes: int = 10 * 1024 ** 3  # 10GB
+    hourly_bytes: int = 2 * 1024 ** 3  # 2GB
+    daily_slot_seconds: int = 4 * 3600  # Download slot time per day
+    hourly_slot_seconds: int = 3600
+    user_overrides: Dict[str, Dict[str, int]] = field(default_factory=dict)  # user_id -> {limit_name: value}
+
+@dataclass
+class SchedulerSettings:
+    default_tier: str = "standard"
+    admin_tier: str = "power"
+    tiers: Dict[str, Dict[str, int]] = field(default_factory=lambda: {
+        "standard": {"concurrency": 1, "queue_depth": 5},
+        "power": {"concurrency": 3, "queue_depth": 50},
+    })  # tier -> {concurrency: jobs running at once, queue_depth: jobs waiting}
+    user_tiers: Dict[str, str] = field(default_factory=dict)  # user_id -> tier name
+
+@dataclass
+class DeliverySettings:
+    mode: str = "auto"  # "telegram", "auto" (CDN link above upload_limit) or "cdn" (always a CDN link)
+    upload_limit: int = 50 * 1024 ** 2  # Bot API upload limit
 
 @dataclass
 class Statistics:
     total_downloads: int = 0
     total_users: int = 0
     total_size_gb: float = 0.0
+    total_cancelled: int = 0
     last_active: str = ""
     user_activity: Dict[str, int] = field(default_factory=dict)  # user_id -> download_count
     user_daily_requests: Dict[str, Dict[str, int]] = field(default_factory=dict)  # user_id -> {date: count}
@@ -51,74 +126,326 @@ class BroadcastSettings:
     last_sent: str = ""
     cooldown: int = 3600
 
+# Immutable views of the settings sections (field names mirror the dataclasses)
+DisplayView = namedtuple('DisplayView', [f.name for f in fields(DisplaySettings)])
+SecurityView = namedtuple('SecurityView', [f.name for f in fields(SecuritySettings)])
+
+@dataclass(frozen=True)
+class ConfigSnapshot:
+    """
+    Versioned, immutable view of display/security/admin settings.
+    Published atomically by AppConfig.publish() and read without awaits;
+    derived lookups are precomputed once per version.
+    """
+    version: int
+    display: DisplayView
+    security: SecurityView
+    admin_ids: FrozenSet[int]
+    required_channels: Tuple[str, ...]
+    blocked_extensions: FrozenSet[str]
+    host_filter: HostFilter
+    
+    @classmethod
+    def build(cls, config: 'AppConfig', version: int) -> 'ConfigSnapshot':
+        """Build snapshot from mutable config"""
+        security = asdict(config.security)
+        security['blocked_extensions'] = tuple(security['blocked_extensions'])
+        security['allowed_hosts'] = tuple(security['allowed_hosts'])
+        security['blocked_hosts'] = tuple(security['blocked_hosts'])
+        return cls(
+            version=version,
+            display=DisplayView(**asdict(config.display_settings)),
+            security=SecurityView(**security),
+            admin_ids=frozenset(config.admin_ids),
+            required_channels=tuple(config.required_channels),
+            blocked_extensions=frozenset(ext.lower().lstrip('.') for ext in config.security.blocked_extensions),
+            host_filter=HostFilter(config.security.allowed_hosts, config.security.blocked_hosts),
+        )
+    
+    def is_admin(self, user_id: int) -> bool:
+        """Check if user is admin"""
+        return user_id in self.admin_ids
+    
+    def is_extension_blocked(self, filename: str) -> bool:
+        """Check file extension against blocked list"""
+        extension = filename.rsplit('.', 1)[-1].lower() if '.' in filename else ''
+        return extension in self.blocked_extensions
+    
+    def is_host_allowed(self, url: str) -> bool:
+        """Check URL host against the allowed/blocked host lists"""
+        return self.host_filter.check_url(url)
+
 @dataclass
 class AppConfig:
     display_settings: DisplaySettings = field(default_factory=DisplaySettings)
     security: SecuritySettings = field(default_factory=SecuritySettings)
+    quota: QuotaSettings = field(default_factory=QuotaSettings)
+    scheduler: SchedulerSettings = field(default_factory=SchedulerSettings)
+    delivery: DeliverySettings = field(default_factory=DeliverySettings)
     statistics: Statistics = field(default_factory=Statistics)
     broadcast: BroadcastSettings = field(default_factory=BroadcastSettings)
     admin_ids: List[int] = field(default_factory=lambda: [7660976743])
     required_channels: List[str] = field(default_factory=list)
     user_sessions: Dict[str, Dict[str, Any]] = field(default_factory=dict)  # user_id -> session_data
     user_languages: Dict[str, str] = field(default_factory=dict)  # user_id -> language_code
+    quota_reserved: Dict[str, int] = field(default_factory=dict, repr=False, compare=False)  # user_id -> in-flight bytes (not persisted)
+    saved_mtime_ns: int = field(default=0, repr=False, compare=False)  # mtime of our last save (not persisted)
+    state_path: Optional[str] = field(default=None, repr=False, compare=False)  # per-shard state file (not persisted)
+    settings_payload: str = field(default="", repr=False, compare=False)  # last settings written/read with a state file
+    saved_sections: Dict[str, str] = field(default_factory=dict, repr=False, compare=False)  # section -> _section_key as last read/written
+    leaderboard: Leaderboard = field(default=None, init=False, repr=False, compare=False)  # derived from statistics.user_activity
+    
+    def __post_init__(self):
+        self.leaderboard = Leaderboard(self.statistics.user_activity)
     
     @classmethod
-    async def load(cls, config_path: str = "data/config.json") -> 'AppConfig':
+    async def load(cls, config_path: str = DEFAULT_CONFIG_PATH) -> 'AppConfig':
         """Load settings from JSON file"""
         try:
             if os.path.exists(config_path):
+                mtime_ns = os.stat(config_path).st_mtime_ns
                 async with aiofiles.open(config_path, 'r', encoding='utf-8') as f:
                     content = await f.read()
-                    data = json.loads(content)
-                    
-                    # Convert dictionary to object
-                    display = DisplaySettings(**data.get('display_settings', {}))
-                    security = SecuritySettings(**data.get('security', {}))
-                    stats = Statistics(**data.get('statistics', {}))
-                    broadcast = BroadcastSettings(**data.get('broadcast', {}))
-                    
-                    return cls(
-                        display_settings=display,
-                        security=security,
-                        statistics=stats,
-                        broadcast=broadcast,
-                        admin_ids=data.get('admin_ids', [7660976743]),
-                        required_channels=data.get('required_channels', []),
-                        user_sessions=data.get('user_sessions', {}),
-                        user_languages=data.get('user_languages', {})
-                    )
+                data = json.loads(content)
+                config = cls.from_dict(data)
+                config.saved_mtime_ns = mtime_ns
+                config._remember_sections(data)
+                return config
         except Exception as e:
             logger.error(f"Error loading settings: {e}")
         
         # If file doesn't exist or error, return default settings
         return cls()
     
-    async def save(self, config_path: str = "data/config.json") -> bool:
-        """Save settings to JSON file"""
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> 'AppConfig':
+        """Convert dictionary to object (raises on invalid data)"""
+        display = DisplaySettings(**data.get('display_settings', {}))
+        security = SecuritySettings(**data.get('security', {}))
+        quota = QuotaSettings(**data.get('quota', {}))
+        scheduler = SchedulerSettings(**data.get('scheduler', {}))
+        delivery = DeliverySettings(**data.get('delivery', {}))
+        stats = Statistics(**data.get('statistics', {}))
+        broadcast = BroadcastSettings(**data.get('broadcast', {}))
+        
+        return cls(
+            display_settings=display,
+            security=security,
+            quota=quota,
+            scheduler=scheduler,
+            delivery=delivery,
+            statistics=stats,
+            broadcast=broadcast,
+            admin_ids=data.get('admin_ids', [7660976743]),
+            required_channels=data.get('required_channels', []),
+            user_sessions=data.get('user_sessions', {}),
+            user_languages=data.get('user_languages', {})
+        )
+    
+    def validate(self) -> List[str]:
+        """Validate settings values, returns list of problems"""
+        errors = []
+        if self.security.max_requests_per_minute < 1 or self.security.max_requests_per_day < 1:
+            errors.append("security: request limits must be positive")
+        if not all(isinstance(ext, str) for ext in self.security.blocked_extensions):
+            errors.append("security: blocked_extensions must be strings")
+        for name in ('allowed_hosts', 'blocked_hosts'):
+            if not all(isinstance(host, str) and host.strip() for host in getattr(self.security, name)):
+                errors.append(f"security: {name} must be non-empty strings")
+        for name in ('daily_bytes', 'hourly_bytes', 'daily_slot_seconds', 'hourly_slot_seconds'):
+            if getattr(self.quota, name) < 0:
+                errors.append(f"quota: {name} must not be negative")
+        tiers = self.scheduler.tiers
+        for name, limits in tiers.items():
+            if limits.get('concurrency', 0) < 1 or limits.get('queue_depth', -1) < 0:
+                errors.append(f"scheduler: tier {name} needs concurrency >= 1 and queue_depth >= 0")
+        for tier in (self.scheduler.default_tier, self.scheduler.admin_tier, *self.scheduler.user_tiers.values()):
+            if tier not in tiers:
+                errors.append(f"scheduler: unknown tier {tier}")
+                break
+        if self.delivery.mode not in DELIVERY_MODES:
+            errors.append(f"delivery: mode must be one of {', '.join(DELIVERY_MODES)}")
+        if self.delivery.upload_limit < 1:
+            errors.append("delivery: upload_limit must be positive")
+        if not self.admin_ids or not all(isinstance(admin_id, int) for admin_id in self.admin_ids):
+            errors.append("admin_ids must be a non-empty list of integers")
+        if not all(isinstance(channel, str) for channel in self.required_channels):
+            errors.append("required_channels must be strings")
+        return errors
+    
+    def apply_settings(self, other: 'AppConfig') -> bool:
+        """
+        Swap in settings sections from another config, keeping runtime state
+        (statistics, sessions, languages). Returns True if anything changed.
+        """
+        changed = (
+            self.display_settings != other.display_settings or
+            self.security != other.security or
+            self.quota != other.quota or
+            self.scheduler != other.scheduler or
+            self.delivery != other.delivery or
+            self.broadcast.enabled != other.broadcast.enabled or
+            self.broadcast.cooldown != other.broadcast.cooldown or
+            self.admin_ids != other.admin_ids or
+            self.required_channels != other.required_channels
+        )
+        if not changed:
+            return False
+        
+        self.display_settings = other.display_settings
+        self.security = other.security
+        self.quota = other.quota
+        self.scheduler = other.scheduler
+        self.delivery = other.delivery
+        self.broadcast.enabled = other.broadcast.enabled
+        self.broadcast.cooldown = other.broadcast.cooldown
+        self.admin_ids = other.admin_ids
+        self.required_channels = other.required_channels
+        self.publish()
+        return True
+    
+    async def reload_settings(self, config_path: str = DEFAULT_CONFIG_PATH) -> bool:
+        """
+        Re-read settings from disk after an external edit; returns True if applied.
+        Only sections edited on disk since our last load/save are taken, so settings
+        changed in memory meanwhile (e.g. by an admin command) are kept.
+        """
         try:
-            # Create directory if it doesn't exist
-            os.makedirs(os.path.dirname(config_path), exist_ok=True)
-            
-            # Convert to dictionary
-            data = {
-                'display_settings': asdict(self.display_settings),
-                'security': asdict(self.security),
-                'statistics': asdict(self.statistics),
-                'broadcast': asdict(self.broadcast),
-                'admin_ids': self.admin_ids,
-                'required_channels': self.required_channels,
-                'user_sessions': self.user_sessions,
-                'user_languages': self.user_languages
+            mtime_ns = os.stat(config_path).st_mtime_ns
+            if mtime_ns == self.saved_mtime_ns:
+                return False  # Our own save
+            async with aiofiles.open(config_path, 'r', encoding='utf-8') as f:
+                data = json.loads(await f.read())
+            # Handled once, also when invalid (the next save then rewrites the file)
+            self.saved_mtime_ns = mtime_ns
+            edited = {
+                name: data[name] for name in SETTINGS_SECTIONS
+                if name in data and _section_key(data[name]) != self.saved_sections.get(name)
             }
-            
-            async with aiofiles.open(config_path, 'w', encoding='utf-8') as f:
-                await f.write(json.dumps(data, ensure_ascii=False, indent=2))
-            
+            fresh = self.from_dict({**self._to_dict(), **edited})
+        except Exception as e:
+            logger.error("Invalid settings file, keeping current settings: %s", e)
+            return False
+        
+        errors = fresh.validate()
+        if errors:
+            logger.error("Invalid settings file, keeping current settings: %s", '; '.join(errors))
+            return False
+        
+        self._remember_sections(edited)
+        if self.apply_settings(fresh):
+            if self.state_path is not None:
+                self.settings_payload = self._dump(self._to_dict(), exclude=STATE_SECTIONS)
+            logger.info("Settings reloaded from %s", config_path)
+            return True
+        return False
+    
+    async def attach_state(self, state_path: str, keep_totals: bool = True):
+        """
+        Keep per-user state (statistics, sessions, languages) in a separate file,
+        one per worker shard. Settings stay in the shared config file and are only
+        rewritten when they change. Without an existing state file the shard starts
+        from the shared file; only the shard with keep_totals inherits the totals.
+        """
+        self.state_path = state_path
+        self.settings_payload = self._dump(self._to_dict(), exclude=STATE_SECTIONS)
+        try:
+            if os.path.exists(state_path):
+                async with aiofiles.open(state_path, 'r', encoding='utf-8') as f:
+                    data = json.loads(await f.read())
+                self.statistics = Statistics(**data.get('statistics', {}))
+                self.user_sessions = data.get('user_sessions', {})
+                self.user_languages = data.get('user_languages', {})
+                self.leaderboard = Leaderboard(self.statistics.user_activity)
+            elif not keep_totals:
+                self.statistics.total_downloads = 0
+                self.statistics.total_users = 0
+                self.statistics.total_size_gb = 0.0
+        except Exception as e:
+            logger.error("Error loading state file %s: %s", state_path, e)
+    
+    async def save(self, config_path: str = DEFAULT_CONFIG_PATH) -> bool:
+        """Save settings to JSON file (and per-user state to the state file, if attached)"""
+        try:
+            # Take in an edit made to the file since our last save instead of overwriting it
+            if os.path.exists(config_path):
+                await self.reload_settings(config_path)
+            data = self._to_dict()
+            with latency.time("config_save"), tracer.span("config_save") as span:
+                if self.state_path is None:
+                    payload = self._dump(data)
+                    span.set(bytes=len(payload))
+                    await self._write(config_path, payload)
+                    # Remember our own write so the file watcher does not reload it
+                    self.saved_mtime_ns = os.stat(config_path).st_mtime_ns
+                    self._remember_sections(data)
+                    return True
+                
+                state_payload = self._dump({name: data[name] for name in STATE_SECTIONS})
+                settings_payload = self._dump(data, exclude=STATE_SECTIONS)
+                span.set(bytes=len(state_payload))
+                await self._write(self.state_path, state_payload)
+                if settings_payload != self.settings_payload or not os.path.exists(config_path):
+                    await self._write(config_path, settings_payload)
+                    self.saved_mtime_ns = os.stat(config_path).st_mtime_ns
+                    self.settings_payload = settings_payload
+                    self._remember_sections(data)
             return True
         except Exception as e:
-            logger.error(f"Error saving settings: {e}")
+            logger.error("Error saving settings: %s", e)
             return False
     
+    def _remember_sections(self, data: Dict[str, Any]):
+        """Record settings sections as they are on disk (to detect external edits)"""
+        for name in SETTINGS_SECTIONS:
+            if name in data:
+                self.saved_sections[name] = _section_key(data[name])
+    
+    @staticmethod
+    def _dump(data: Dict[str, Any], exclude: Tuple[str, ...] = ()) -> str:
+        return json.dumps({key: value for key, value in data.items() if key not in exclude},
+                          ensure_ascii=False, indent=2)
+    
+    @staticmethod
+    async def _write(path: str, payload: str):
+        # Create directory if it doesn't exist
+        directory = os.path.dirname(path) or '.'
+        os.makedirs(directory, exist_ok=True)
+        # Write a temp file next to it and swap it in, so the watcher and other shards never read half a file
+        fd, tmp_path = tempfile.mkstemp(dir=directory, prefix=os.path.basename(path) + '.', suffix='.tmp')
+        os.close(fd)
+        try:
+            if os.path.exists(path):
+                os.chmod(tmp_path, os.stat(path).st_mode & 0o777)  # mkstemp creates it 0600
+            async with aiofiles.open(tmp_path, 'w', encoding='utf-8') as f:
+                await f.write(payload)
+            os.replace(tmp_path, path)
+        except BaseException:
+            os.unlink(tmp_path)
+            raise
+    
+    def _to_dict(self) -> Dict[str, Any]:
+        """Convert to dictionary (persisted sections only)"""
+        return {
+            'display_settings': asdict(self.display_settings),
+            'security': asdict(self.security),
+            'quota': asdict(self.quota),
+            'scheduler': asdict(self.scheduler),
+            'delivery': asdict(self.delivery),
+            'statistics': asdict(self.statistics),
+            'broadcast': asdict(self.broadcast),
+            'admin_ids': self.admin_ids,
+            'required_channels': self.required_channels,
+            'user_sessions': self.user_sessions,
+            'user_languages': self.user_languages
+        }
+    
+    def publish(self) -> ConfigSnapshot:
+        """Publish a new immutable snapshot (call after changing settings)"""
+        global _snapshot
+        _snapshot = ConfigSnapshot.build(self, _snapshot.version + 1)
+        return _snapshot
+    
     def is_admin(self, user_id: int) -> bool:
         """Check if user is admin"""
         return user_id in self.admin_ids
@@ -143,9 +470,7 @@ class AppConfig:
             return True, ""
         
         user_id_str = str(user_id)
-        now = datetime.now(timezone.utc)
-        current_minute = now.strftime("%Y-%m-%d %H:%M")
-        current_date = now.strftime("%Y-%m-%d")
+        now, current_minute, current_date = _rate_limit_clock()
         
         # Initialize user session
         if user_id_str not in self.user_sessions:
@@ -179,9 +504,7 @@ class AppConfig:
     def increment_request_count(self, user_id: int):
         """Increment request counter for user"""
         user_id_str = str(user_id)
-        now = datetime.now(timezone.utc)
-        current_minute = now.strftime("%Y-%m-%d %H:%M")
-        current_date = now.strftime("%Y-%m-%d")
+        now, current_minute, current_date = _rate_limit_clock()
         
         if user_id_str not in self.user_sessions:
             self.user_sessions[user_id_str] = {
@@ -198,23 +521,150 @@ class AppConfig:
         
         # Increment daily counter
         daily_requests = user_session.get('daily_requests', {})
+        new_day = current_date not in daily_requests
         daily_requests[current_date] = daily_requests.get(current_date, 0) + 1
         user_session['daily_requests'] = daily_requests
         
         # Cleanup old data (minute)
-        for minute in list(minute_requests.keys()):
-            if minute != current_minute:
-                del minute_requests[minute]
+        if len(minute_requests) > 1:
+            for minute in list(minute_requests.keys()):
+                if minute != current_minute:
+                    del minute_requests[minute]
+        
+        # Cleanup old data (daily - older than 30 days), once per user per day
+        if new_day:
+            self._prune_daily(daily_requests, now)
+    
+    @staticmethod
+    def _prune_daily(counters: Dict[str, Any], now: datetime, keep_days: int = 30):
+        """Remove date-keyed entries older than keep_days"""
+        for date in list(counters.keys()):
+            try:
+                date_obj = datetime.strptime(date, "%Y-%m-%d").replace(tzinfo=timezone.utc)
+                if (now - date_obj).days > keep_days:
+                    del counters[date]
+            except:
+                pass
+    
+    def get_quota_limits(self, user_id: int) -> Dict[str, int]:
+        """Get effective quota limits for user (defaults merged with admin overrides)"""
+        limits = {
+            'daily_bytes': self.quota.daily_bytes,
+            'hourly_bytes': self.quota.hourly_bytes,
+            'daily_slot_seconds': self.quota.daily_slot_seconds,
+            'hourly_slot_seconds': self.quota.hourly_slot_seconds,
+        }
+        limits.update(self.quota.user_overrides.get(str(user_id), {}))
+        return limits
+    
+    def get_user_tier(self, user_id: int) -> str:
+        """Get scheduler tier of user (assigned tier, else admin or default tier)"""
+        tier = self.scheduler.user_tiers.get(str(user_id))
+        if tier is None:
+            tier = self.scheduler.admin_tier if user_id in self.admin_ids else self.scheduler.default_tier
+        return tier
+    
+    def get_job_limits(self, user_id: int) -> Tuple[int, int]:
+        """Get (concurrent jobs, queued jobs) allowed for user by tier"""
+        tiers = self.scheduler.tiers
+        limits = tiers.get(self.get_user_tier(user_id)) or tiers.get(self.scheduler.default_tier) or {}
+        return max(1, limits.get('concurrency', 1)), max(0, limits.get('queue_depth', 0))
+    
+    def use_cdn(self, file_size: int) -> bool:
+        """Deliver a downloaded file as a CDN link instead of uploading it to Telegram"""
+        mode = self.delivery.mode
+        return mode == "cdn" or (mode == "auto" and file_size > self.delivery.upload_limit)
+    
+    def get_quota_usage(self, user_id: int) -> Dict[str, float]:
+        """Get quota usage of user in current hour and day"""
+        now = datetime.now(timezone.utc)
+        user_session = self.user_sessions.get(str(user_id), {})
+        hourly = user_session.get('quota_hourly', {}).get(now.strftime("%Y-%m-%d %H"), [0, 0])
+        daily = user_session.get('quota_daily', {}).get(now.strftime("%Y-%m-%d"), [0, 0])
+        return {
+            'hourly_bytes': hourly[0],
+            'hourly_slot_seconds': hourly[1],
+            'daily_bytes': daily[0],
+            'daily_slot_seconds': daily[1],
+        }
+    
+    def quota_remaining_bytes(self, user_id: int) -> Optional[int]:
+        """Bytes user may still transfer (None if quota disabled)"""
+        if not self.quota.enable_quota:
+            return None
+        limits = self.get_quota_limits(user_id)
+        usage = self.get_quota_usage(user_id)
+        reserved = self.quota_reserved.get(str(user_id), 0)
+        remaining = min(
+            limits['hourly_bytes'] - usage['hourly_bytes'],
+            limits['daily_bytes'] - usage['daily_bytes'],
+        )
+        return max(0, int(remaining - reserved))
+    
+    def check_quota(self, user_id: int, expected_bytes: int = 0) -> Tuple[bool, str]:
+        """
+        Check byte and slot-time quota before a download starts
+        Returns: (is_allowed, error_message)
+        """
+        if not self.quota.enable_quota:
+            return True, ""
+        
+        limits = self.get_quota_limits(user_id)
+        usage = self.get_quota_usage(user_id)
+        remaining = self.quota_remaining_bytes(user_id)
+        
+        slot_exhausted = (
+            usage['hourly_slot_seconds'] >= limits['hourly_slot_seconds'] or
+            usage['daily_slot_seconds'] >= limits['daily_slot_seconds']
+        )
+        if slot_exhausted or remaining <= 0 or expected_bytes > remaining:
+            user_lang = self.get_user_language(user_id)
+            error_msg = translator.get("quota_exceeded", user_lang,
+                remaining_mb=remaining / (1024 * 1024)
+            )
+            return False, error_msg
+        
+        return True, ""
+    
+    def reserve_quota(self, user_id: int, nbytes: int):
+        """Reserve bytes for an admitted download until it is charged"""
+        user_id_str = str(user_id)
+        self.quota_reserved[user_id_str] = self.quota_reserved.get(user_id_str, 0) + nbytes
+    
+    def release_quota(self, user_id: int, nbytes: int):
+        """Release a reservation made by reserve_quota"""
+        user_id_str = str(user_id)
+        left = self.quota_reserved.get(user_id_str, 0) - nbytes
+        if left > 0:
+            self.quota_reserved[user_id_str] = left
+        else:
+            self.quota_reserved.pop(user_id_str, None)
+    
+    def charge_quota(self, user_id: int, nbytes: int, slot_seconds: float):
+        """Charge transferred bytes and download slot time to user quota"""
+        user_id_str = str(user_id)
+        now = datetime.now(timezone.utc)
+        current_hour = now.strftime("%Y-%m-%d %H")
+        current_date = now.strftime("%Y-%m-%d")
+        
+        user_session = self.user_sessions.setdefault(user_id_str, {
+            'minute_requests': {},
+            'daily_requests': {}
+        })
         
-        # Cleanup old data (daily - older than 30 days)
-        for date in list(daily_requests.keys()):
+        hourly = user_session.setdefault('quota_hourly', {})
+        hour_usage = hourly.get(current_hour, [0, 0])
+        hourly[current_hour] = [hour_usage[0] + nbytes, round(hour_usage[1] + slot_seconds, 2)]
+        for hour in list(hourly.keys()):
+            if hour != current_hour:
+                del hourly[hour]
+        
+        daily = user_session.setdefault('quota_daily', {})
+        day_usage = daily.get(current_date, [0, 0])
+        daily[current_date] = [day_usage[0] + nbytes, round(day_usage[1] + slot_seconds, 2)]
+        for date in list(daily.keys()):
             if date != current_date:
-                try:
-                    date_obj = datetime.strptime(date, "%Y-%m-%d").replace(tzinfo=timezone.utc)
-                    if (now - date_obj).days > 30:
-                        del daily_requests[date]
-                except:
-                    pass
+                del daily[date]
     
     def increment_statistics(self, user_id: int, file_size: int):
         """Increment global statistics"""
@@ -223,8 +673,24 @@ class AppConfig:
         self.statistics.last_active = datetime.now(timezone.utc).strftime("%Y-%m-%d %H:%M:%S")
         
         user_id_str = str(user_id)
-        self.statistics.user_activity[user_id_str] = self.statistics.user_activity.get(user_id_str, 0) + 1
+        self.statistics.user_activity[user_id_str] = self.leaderboard.increment(user_id_str)
         self.statistics.total_users = len(self.statistics.user_activity)
+        
+        # Per-user daily upload history
+        now = datetime.now(timezone.utc)
+        current_date = now.strftime("%Y-%m-%d")
+        user_history = self.statistics.user_daily_requests.setdefault(user_id_str, {})
+        user_history[current_date] = user_history.get(current_date, 0) + 1
+        self._prune_daily(user_history, now)
+    
+    def increment_cancelled(self):
+        """Count an upload cancelled by its user"""
+        self.statistics.total_cancelled += 1
+    
+    def reset_statistics(self):
+        """Reset statistics and derived indexes"""
+        self.statistics = Statistics()
+        self.leaderboard.clear()
     
     def can_send_broadcast(self) -> bool:
         """Check if broadcast can be sent"""
@@ -249,9 +715,9 @@ class AppConfig:
 
 # Environment configuration
 class EnvironmentConfig:
-    def __init__(self):
+    def __init__(self, override: bool = False):
         # Load from .env file
-        load_dotenv()
+        load_dotenv(ENV_FILE, override=override)
         
         # Core settings
         self.bot_token = os.getenv("BOT_TOKEN", "")
@@ -264,10 +730,18 @@ class EnvironmentConfig:
         self.retry_attempts = int(os.getenv("RETRY_ATTEMPTS", "3"))
         self.parallel_downloads = int(os.getenv("PARALLEL_DOWNLOADS", "3"))
         
-        # CDN settings
+        # CDN settings (files are delivered as signed, expiring links served by a built-in file server)
         self.enable_cdn = os.getenv("ENABLE_CDN", "false").lower() == "true"
         self.cdn_provider = os.getenv("CDN_PROVIDER", "cloudflare")
-        self.cdn_url = os.getenv("CDN_URL", "")
+        self.cdn_url = os.getenv("CDN_URL", "")  # Public base URL of the CDN in front of the file server
+        self.cdn_secret = os.getenv("CDN_SECRET", "")  # Signs download links
+        self.cdn_storage = os.getenv("CDN_STORAGE", "local")
+        self.cdn_storage_dir = os.getenv("CDN_STORAGE_DIR", "data/cdn")
+        self.cdn_host = os.getenv("CDN_HOST", "0.0.0.0")
+        self.cdn_port = int(os.getenv("CDN_PORT", "8090"))
+        self.cdn_link_ttl = int(os.getenv("CDN_LINK_TTL", "86400"))  # Seconds a link (and its file) is kept
+        self.cdn_max_bytes = int(os.getenv("CDN_MAX_BYTES", str(50 * 1024 ** 3)))  # Oldest files go first above this
+        self.cdn_gc_interval = float(os.getenv("CDN_GC_INTERVAL", "600"))
         
         # Update settings
         self.enable_auto_update = os.getenv("ENABLE_AUTO_UPDATE", "false").lower() == "true"
@@ -277,6 +751,88 @@ class EnvironmentConfig:
         # Logging
         self.log_level = os.getenv("LOG_LEVEL", "INFO")
         self.enable_file_logging = os.getenv("ENABLE_FILE_LOGGING", "true").lower() == "true"
+        self.log_max_bytes = int(os.getenv("LOG_MAX_BYTES", str(10 * 1024 * 1024)))
+        self.log_backup_count = int(os.getenv("LOG_BACKUP_COUNT", "5"))
+        self.log_rotate_when = os.getenv("LOG_ROTATE_WHEN", "")  # e.g. "midnight"; empty = size-based
+        
+        # Update delivery: "polling" or "webhook" (built-in aiohttp server)
+        self.bot_mode = os.getenv("BOT_MODE", "polling").lower()
+        self.webhook_url = os.getenv("WEBHOOK_URL", "")  # Public base URL; empty = don't register with Telegram
+        self.webhook_path = os.getenv("WEBHOOK_PATH", "/webhook")
+        self.webhook_host = os.getenv("WEBHOOK_HOST", "0.0.0.0")
+        self.webhook_port = int(os.getenv("WEBHOOK_PORT", "8080"))
+        self.webhook_secret = os.getenv("WEBHOOK_SECRET", "")
+        self.webhook_max_concurrent = int(os.getenv("WEBHOOK_MAX_CONCURRENT", "256"))
+        
+        # Outbound Telegram API budget: messages/second overall and per private chat, per minute in groups
+        self.tg_global_rate = float(os.getenv("TG_GLOBAL_RATE", "30"))
+        self.tg_chat_rate = float(os.getenv("TG_CHAT_RATE", "1"))
+        self.tg_group_rate = float(os.getenv("TG_GROUP_RATE", "20"))
+        self.tg_max_retries = int(os.getenv("TG_MAX_RETRIES", "3"))  # Retries after a 429 (retry_after)
+        
+        # Persistent upload queue (jobs running at once; downloads are still limited by PARALLEL_DOWNLOADS)
+        self.job_workers = int(os.getenv("JOB_WORKERS", "8"))
+        
+        # Let Telegram fetch small photos and PDF/ZIP/GIF documents by URL (no download here)
+        self.enable_url_fetch = os.getenv("ENABLE_URL_FETCH", "true").lower() == "true"
+        
+        # Worker processes (>1 = supervisor routes updates to workers by user ID)
+        self.workers = int(os.getenv("WORKERS", "1"))
+        self.worker_queue_size = int(os.getenv("WORKER_QUEUE_SIZE", "1000"))
+        
+        # Hot reload (seconds between file checks, 0 = disabled)
+        self.config_reload_interval = float(os.getenv("CONFIG_RELOAD_INTERVAL", "5"))
+        
+        # Prometheus metrics endpoint (disabled by default)
+        self.enable_metrics = os.getenv("ENABLE_METRICS", "false").lower() == "true"
+        self.metrics_host = os.getenv("METRICS_HOST", "127.0.0.1")
+        self.metrics_port = int(os.getenv("METRICS_PORT", "9108"))
+        
+        # Required-channel membership cache (seconds) and getChatMember budget (calls/second)
+        self.membership_ttl = float(os.getenv("MEMBERSHIP_TTL", "3600"))
+        self.membership_negative_ttl = float(os.getenv("MEMBERSHIP_NEGATIVE_TTL", "60"))
+        self.membership_api_rate = float(os.getenv("MEMBERSHIP_API_RATE", "20"))
+        
+        # Seconds a delivered link is ignored if the same user sends it again (0 = only while running)
+        self.duplicate_window = float(os.getenv("DUPLICATE_WINDOW", "30"))
+        
+        # Query parameters dropped from links before caching/dedupe ("name" or "prefix*")
+        self.url_tracking_params = [
+            param.strip() for param in os.getenv("URL_TRACKING_PARAMS", ",".join(DEFAULT_TRACKING_PARAMS)).split(",")
+            if param.strip()
+        ]
+        
+        # Event loop watchdog (seconds the loop may block before its stack is logged)
+        self.loop_block_threshold = float(os.getenv("LOOP_BLOCK_THRESHOLD", "0.5"))
+        
+        # Per-job tracing (JSON lines in logs/traces.jsonl)
+        self.enable_tracing = os.getenv("ENABLE_TRACING", "false").lower() == "true"
+        self.trace_sample_rate = float(os.getenv("TRACE_SAMPLE_RATE", "0.1"))
+        self.trace_slow_threshold = float(os.getenv("TRACE_SLOW_THRESHOLD", "60"))
+    
+    def reload(self) -> List[str]:
+        """
+        Re-read .env and swap in new values
+        Returns: names of changed settings (empty if unchanged or invalid)
+        """
+        try:
+            fresh = EnvironmentConfig(override=True)
+            if fresh.parallel_downloads < 1 or fresh.max_file_size < 1 or fresh.request_timeout < 1:
+                raise ValueError("PARALLEL_DOWNLOADS, MAX_FILE_SIZE and REQUEST_TIMEOUT must be positive")
+            if min(fresh.tg_global_rate, fresh.tg_chat_rate, fresh.tg_group_rate) <= 0:
+                raise ValueError("TG_GLOBAL_RATE, TG_CHAT_RATE and TG_GROUP_RATE must be positive")
+        except (ValueError, OSError) as e:
+            logger.error("Invalid .env, keeping current settings: %s", e)
+            return []
+        
+        for name in RESTART_ONLY_SETTINGS:
+            if getattr(fresh, name) != getattr(self, name):
+                logger.warning("%s changed in .env; restart the bot to apply it", name.upper())
+                setattr(fresh, name, getattr(self, name))
+        
+        changed = [name for name, value in vars(fresh).items() if getattr(self, name, None) != value]
+        self.__dict__.update(vars(fresh))
+        return changed
     
     def validate(self) -> bool:
         """Validate environment configuration"""
@@ -284,16 +840,43 @@ class EnvironmentConfig:
             logger.error("BOT_TOKEN is not set!")
             logger.error("Please edit .env file and set your bot token.")
             return False
+        if self.bot_mode not in ("polling", "webhook"):
+            logger.error("BOT_MODE must be 'polling' or 'webhook', got '%s'", self.bot_mode)
+            return False
+        if self.bot_mode == "webhook" and not re.fullmatch(r"[A-Za-z0-9_-]{1,256}", self.webhook_secret):
+            logger.error("WEBHOOK_SECRET must be 1-256 characters of A-Z, a-z, 0-9, _ and -")
+            return False
+        if min(self.tg_global_rate, self.tg_chat_rate, self.tg_group_rate) <= 0:
+            logger.error("TG_GLOBAL_RATE, TG_CHAT_RATE and TG_GROUP_RATE must be positive")
+            return False
+        if self.enable_cdn and (not self.cdn_url or len(self.cdn_secret) < 16):
+            logger.error("ENABLE_CDN needs CDN_URL and a CDN_SECRET of at least 16 characters")
+            return False
         return True
 
 
 # Global instances
 env_config = EnvironmentConfig()
 app_config: Optional[AppConfig] = None
+_snapshot: ConfigSnapshot = ConfigSnapshot.build(AppConfig(), 0)
+_state_file: Optional[Tuple[str, bool]] = None  # (path, keep_totals) for worker shards
+
+def use_state_file(state_path: str, keep_totals: bool = True):
+    """Store per-user state in state_path (call before the first get_config)"""
+    global _state_file
+    _state_file = (state_path, keep_totals)
 
 async def get_config() -> AppConfig:
     """Get configuration instance (load if necessary)"""
     global app_config
     if app_config is None:
-        app_config = await AppConfig.load()
+        config = await AppConfig.load()
+        if _state_file is not None:
+            await config.attach_state(*_state_file)
+        app_config = config
+        app_config.publish()
     return app_config
+
+def get_snapshot() -> ConfigSnapshot:
+    """Get current settings snapshot (synchronous, safe on hot paths)"""
+    return _snapshot
@@ -7,7 +7,10 @@ from .constants import *
 
 # برای سازگاری با کد موجود
 try:
-    from ..config import AppConfig, EnvironmentConfig, get_config, env_config
+    from ..config import (
+        AppConfig, ConfigSnapshot, EnvironmentConfig, get_config, get_snapshot, env_config,
+        use_state_file, DEFAULT_CONFIG_PATH, ENV_FILE, DELIVERY_MODES,
+    )
 except ImportError:
     # اگر ماژول سطح بالا موجود نبود
     pass
@@ -15,9 +18,15 @@ except ImportError:
 # Re-export important classes and functions
 __all__ = [
     'AppConfig',
+    'ConfigSnapshot',
     'EnvironmentConfig',
     'get_config',
+    'get_snapshot',
     'env_config',
+    'use_state_file',
+    'DEFAULT_CONFIG_PATH',
+    'ENV_FILE',
+    'DELIVERY_MODES',
 ]
 
 __version__ = "1.0.0"
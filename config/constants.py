@@ -91,6 +91,14 @@ DEFAULT_CONFIG = {
         "enable_anti_spam": True,
         "blocked_extensions": ["exe", "scr", "bat", "cmd", "msi", "vbs"],
     },
+    "quota": {
+        "enable_quota": True,
+        "daily_bytes": 10 * 1024 ** 3,
+        "hourly_bytes": 2 * 1024 ** 3,
+        "daily_slot_seconds": 4 * 3600,
+        "hourly_slot_seconds": 3600,
+        "user_overrides": {},
+    },
     "statistics": {
         "total_downloads": 0,
         "total_users": 0,
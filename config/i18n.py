@@ -37,7 +37,8 @@ class Translator:
         en_file = translations_dir / "en.json"
         if en_file.exists():
             with open(en_file, 'r', encoding='utf-8') as f:
-                self.translations['en'] = json.load(f)
+                # Defaults first so keys added in newer versions are available
+                self.translations['en'] = {**self._get_default_english(), **json.load(f)}
         else:
             self.translations['en'] = self._get_default_english()
             with open(en_file, 'w', encoding='utf-8') as f:
@@ -47,7 +48,8 @@ class Translator:
         fa_file = translations_dir / "fa.json"
         if fa_file.exists():
             with open(fa_file, 'r', encoding='utf-8') as f:
-                self.translations['fa'] = json.load(f)
+                # Defaults first so keys added in newer versions are available
+                self.translations['fa'] = {**self._get_default_persian(), **json.load(f)}
         else:
             self.translations['fa'] = self._get_default_persian()
             with open(fa_file, 'w', encoding='utf-8') as f:
@@ -63,18 +65,40 @@ class Translator:
             "info": "ℹ️ Info",
             
             # Bot commands
-            "start": "🤖 Welcome to irProLink Bot!\n\n📋 **Main Commands:**\n• /start - Show help\n• /upload [link] - Upload file\n• /help - Complete guide\n• /support - Contact support\n• /status - Bot status\n• /mystats - User statistics\n\n📞 **Support:** {support_username}\n\n🚀 **Features:**\n• Upload up to 2GB\n• Complete file details\n• Short link: {short_link_status}\n• Service: {short_link_service}\n• All formats supported\n• Advanced security\n\n🔗 **Example:** `/upload https://example.com/file.zip`",
+            "start": "🤖 Welcome to irProLink Bot!\n\n📋 **Main Commands:**\n• /start - Show help\n• /upload [link] - Upload file\n• /help - Complete guide\n• /support - Contact support\n• /status - Bot status\n• /mystats - User statistics\n• /cancel - Cancel your uploads\n• /queue - Your upload queue\n\n📞 **Support:** {support_username}\n\n🚀 **Features:**\n• Upload up to 2GB\n• Complete file details\n• Short link: {short_link_status}\n• Service: {short_link_service}\n• All formats supported\n• Advanced security\n\n🔗 **Example:** `/upload https://example.com/file.zip`",
             
             "help": "📖 **Complete Bot Guide**\n\n🔗 **How to use:**\n1. Send direct file link\n2. Or use /upload command\n\n📝 **Example:**\n`/upload https://example.com/file.zip`\n\n📊 **Displayed details:**\n• Full filename {filename_status}\n• Size in MB {filesize_status}\n• Source link {sourceurl_status} {short_link_note}\n• User ID {userid_status}\n• Bot copyright {copyright_status}\n\n⚠️ **Limitations:**\n• Max size: {max_size} MB\n• Direct links only\n• Upload time: 5 minutes\n• Max requests: {max_per_minute}/minute\n• Daily requests: {max_per_day}\n\n❓ **Support:** {support_username}\n\n⚙️ **Admin commands:**\n(Only accessible to admins)",
             
             # Upload process
             "upload_started": "🔍 Checking link...",
+            "cancel_button": "✖️ Cancel",
+            "upload_cancelled": "🛑 Upload cancelled.",
+            "jobs_cancelled": "🛑 Cancelled {count} upload(s).",
+            "no_active_jobs": "📭 You have no uploads in progress.",
+            "upload_queued": "🕒 Queued (#{position} in your queue). It starts when one of your current uploads finishes.",
+            "queue_full": "⚠️ Your upload queue is full ({limit} uploads). Wait for some to finish or use /cancel.",
+            "queue_status": "📋 Your uploads ({tier}: {concurrency} at a time, up to {queue_depth} queued)\n\n{jobs}",
+            "queue_running": "▶️ {host}",
+            "queue_waiting": "{position}. 🕒 {host}",
+            "batch_queued": "📥 {count} links queued. Files are sent in albums as they are ready.",
+            "batch_skipped": "⚠️ {count} link(s) skipped: blocked site, already in progress or queue full.",
+            "batch_empty": "⚠️ None of these links can be uploaded: blocked site or already in progress.",
+            "batch_done": "✅ {delivered} of {total} files sent.",
+            "url_file_too_large": "📄 The link file is too large (max {max_kb} KB).",
+            "no_urls_found": "🔍 No links found in the file.",
+            "cdn_link": "⏳ This download link expires {expires} (UTC).",
+            "cdn_download": "⬇️ Download",
             "download_started": "⏳ Downloading file...",
             "upload_in_progress": "📤 Uploading to Telegram...",
             "upload_success": "✅ File uploaded successfully!",
             "invalid_url": "❌ Invalid URL! Please send a direct link.",
             "file_too_large": "📁 File size exceeds limit! Max: {max_size}",
             "rate_limit_exceeded": "⏰ Too many requests! Please wait.",
+            "quota_exceeded": "📦 Download quota exceeded! Remaining: {remaining_mb:.1f} MB. Please try again later.",
+            "server_busy": "⏳ Server storage is busy right now. Please try again later.",
+            "join_required": "📢 Please join {channels} to use the bot, then send your link again.",
+            "host_blocked": "🚫 Downloads from this site are not allowed.",
+            "upload_resumed": "🔄 The bot was restarted; resuming your upload...",
             
             # Admin messages
             "admin_only": "⛔ Admin only!",
@@ -104,18 +128,40 @@ class Translator:
             "info": "ℹ️ اطلاعات",
             
             # Bot commands
-            "start": "🤖 به ربات irProLink خوش آمدید!\n\n📋 **دستورات اصلی:**\n• /start - نمایش راهنما\n• /upload [لینک] - آپلود فایل\n• /help - راهنمای کامل\n• /support - تماس با پشتیبانی\n• /status - وضعیت ربات\n• /mystats - آمار کاربری\n\n📞 **پشتیبانی:** {support_username}\n\n🚀 **ویژگی‌ها:**\n• آپلود تا ۲ گیگابایت\n• نمایش جزئیات کامل فایل\n• لینک کوتاه: {short_link_status}\n• سرویس: {short_link_service}\n• پشتیبانی از همه فرمت‌ها\n• امنیت پیشرفته\n\n🔗 **مثال:** `/upload https://example.com/file.zip`",
+            "start": "🤖 به ربات irProLink خوش آمدید!\n\n📋 **دستورات اصلی:**\n• /start - نمایش راهنما\n• /upload [لینک] - آپلود فایل\n• /help - راهنمای کامل\n• /support - تماس با پشتیبانی\n• /status - وضعیت ربات\n• /mystats - آمار کاربری\n• /cancel - لغو آپلودهای شما\n• /queue - صف آپلودهای شما\n\n📞 **پشتیبانی:** {support_username}\n\n🚀 **ویژگی‌ها:**\n• آپلود تا ۲ گیگابایت\n• نمایش جزئیات کامل فایل\n• لینک کوتاه: {short_link_status}\n• سرویس: {short_link_service}\n• پشتیبانی از همه فرمت‌ها\n• امنیت پیشرفته\n\n🔗 **مثال:** `/upload https://example.com/file.zip`",
             
             "help": "📖 **راهنمای کامل ربات**\n\n🔗 **نحوه استفاده:**\n۱. لینک مستقیم فایل را ارسال کنید\n۲. یا از دستور /upload استفاده کنید\n\n📝 **مثال:**\n`/upload https://example.com/file.zip`\n\n📊 **جزئیات نمایش داده شده:**\n• نام کامل فایل {filename_status}\n• حجم به مگابایت {filesize_status}\n• لینک منبع {sourceurl_status} {short_link_note}\n• آیدی کاربر {userid_status}\n• کپی رایت ربات {copyright_status}\n\n⚠️ **محدودیت‌ها:**\n• حداکثر حجم: {max_size} مگابایت\n• فقط لینک‌های مستقیم\n• زمان آپلود: ۵ دقیقه\n• حداکثر درخواست: {max_per_minute} در دقیقه\n• حداکثر درخواست روزانه: {max_per_day}\n\n❓ **پشتیبانی:** {support_username}\n\n⚙️ **دستورات ادمین:**\n(فقط برای مدیران قابل دسترسی است)",
             
             # Upload process
             "upload_started": "🔍 در حال بررسی لینک...",
+            "cancel_button": "✖️ لغو",
+            "upload_cancelled": "🛑 آپلود لغو شد.",
+            "jobs_cancelled": "🛑 {count} آپلود لغو شد.",
+            "no_active_jobs": "📭 آپلودی در جریان ندارید.",
+            "upload_queued": "🕒 در صف (شماره {position} در صف شما). پس از پایان یکی از آپلودهای فعلی‌تان شروع می‌شود.",
+            "queue_full": "⚠️ صف آپلود شما پر است ({limit} آپلود). صبر کنید تا چند مورد تمام شوند یا از /cancel استفاده کنید.",
+            "queue_status": "📋 آپلودهای شما ({tier}: {concurrency} همزمان، تا {queue_depth} در صف)\n\n{jobs}",
+            "queue_running": "▶️ {host}",
+            "queue_waiting": "{position}. 🕒 {host}",
+            "batch_queued": "📥 {count} لینک در صف قرار گرفت. فایل‌ها پس از آماده شدن به صورت آلبوم ارسال می‌شوند.",
+            "batch_skipped": "⚠️ {count} لینک رد شد: سایت مسدود، در حال پردازش یا صف پر.",
+            "batch_empty": "⚠️ هیچ‌کدام از این لینک‌ها قابل آپلود نیست: سایت مسدود یا در حال پردازش.",
+            "batch_done": "✅ {delivered} از {total} فایل ارسال شد.",
+            "url_file_too_large": "📄 فایل لینک‌ها بیش از حد بزرگ است (حداکثر {max_kb} کیلوبایت).",
+            "no_urls_found": "🔍 لینکی در فایل پیدا نشد.",
+            "cdn_link": "⏳ این لینک دانلود در {expires} (UTC) منقضی می‌شود.",
+            "cdn_download": "⬇️ دانلود",
             "download_started": "⏳ در حال دانلود فایل...",
             "upload_in_progress": "📤 در حال آپلود به تلگرام...",
             "upload_success": "✅ فایل با موفقیت آپلود شد!",
             "invalid_url": "❌ لینک نامعتبر! لطفاً لینک مستقیم ارسال کنید.",
             "file_too_large": "📁 حجم فایل بیش از حد مجاز! حداکثر: {max_size}",
             "rate_limit_exceeded": "⏰ درخواست‌های زیادی ارسال کرده‌اید! لطفاً صبر کنید.",
+            "quota_exceeded": "📦 سهمیه دانلود شما تمام شده است! باقی‌مانده: {remaining_mb:.1f} مگابایت. لطفاً بعداً تلاش کنید.",
+            "server_busy": "⏳ فضای ذخیره‌سازی سرور در حال حاضر پر است. لطفاً بعداً تلاش کنید.",
+            "join_required": "📢 برای استفاده از ربات ابتدا در {channels} عضو شوید، سپس لینک را دوباره ارسال کنید.",
+            "host_blocked": "🚫 دانلود از این سایت مجاز نیست.",
+            "upload_resumed": "🔄 ربات دوباره راه‌اندازی شد؛ ادامه آپلود شما...",
             
             # Admin messages
             "admin_only": "⛔ فقط ادمین!",
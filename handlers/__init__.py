@@ -2,8 +2,8 @@
 ماژول ثبت هندلرها
 """
 
-from aiogram import Dispatcher
-from .user_handlers import UserHandlers
+from aiogram import Dispatcher, F
+from .user_handlers import UserHandlers, CANCEL_PREFIX
 from .admin_handlers import AdminHandlers
 
 async def register_handlers(dp: Dispatcher, bot):
@@ -18,6 +18,17 @@ async def register_handlers(dp: Dispatcher, bot):
     dp.message.register(user_handlers.handle_support, commands=["support"])
     dp.message.register(user_handlers.handle_status, commands=["status"])
     dp.message.register(user_handlers.handle_user_stats, commands=["mystats"])
+    dp.message.register(user_handlers.handle_cancel, commands=["cancel"])
+    dp.message.register(user_handlers.handle_queue, commands=["queue"])
+    
+    # دکمه لغو روی پیام وضعیت آپلود
+    dp.callback_query.register(user_handlers.handle_cancel_callback, F.data.startswith(CANCEL_PREFIX))
+    
+    # به‌روزرسانی کش عضویت کانال‌های اجباری (ربات باید ادمین کانال باشد)
+    dp.chat_member.register(user_handlers.handle_chat_member)
+    
+    # فایل متنی حاوی لینک‌ها (ارسال دسته‌ای)
+    dp.message.register(user_handlers.handle_url_file, F.document)
     
     # هندلر برای لینک‌های مستقیم
     dp.message.register(user_handlers.handle_direct_link)
@@ -43,3 +54,14 @@ async def register_handlers(dp: Dispatcher, bot):
     dp.message.register(admin_handlers.handle_full_stats, commands=["fullstats"])
     dp.message.register(admin_handlers.handle_reset_stats, commands=["resetstats"])
     dp.message.register(admin_handlers.handle_security_settings, commands=["security"])
+    dp.message.register(admin_handlers.handle_block_host, commands=["blockhost"])
+    dp.message.register(admin_handlers.handle_allow_host, commands=["allowhost"])
+    dp.message.register(admin_handlers.handle_remove_host, commands=["removehost"])
+    dp.message.register(admin_handlers.handle_list_hosts, commands=["listhosts"])
+    dp.message.register(admin_handlers.handle_set_quota, commands=["setquota"])
+    dp.message.register(admin_handlers.handle_reset_quota, commands=["resetquota"])
+    dp.message.register(admin_handlers.handle_quota, commands=["quota"])
+    dp.message.register(admin_handlers.handle_set_tier, commands=["settier"])
+    dp.message.register(admin_handlers.handle_delivery_mode, commands=["deliverymode"])
+    dp.message.register(admin_handlers.handle_latency, commands=["latency"])
+    dp.message.register(admin_handlers.handle_profile, commands=["profile"])
@@ -3,10 +3,15 @@
 """
 
 import logging
-from aiogram.types import Message
+from aiogram.types import Message, BufferedInputFile
 from aiogram.enums import ParseMode
 
-from config import get_config
+from config import get_config, DELIVERY_MODES
+from middleware import outbound_priority, BULK
+from utils.timeseries import throughput
+from utils.histogram import latency
+from utils import profiler
+from utils.host_filter import normalize_host
 
 logger = logging.getLogger(__name__)
 
@@ -16,57 +21,59 @@ class AdminHandlers:
     def __init__(self, bot):
         self.bot = bot
     
-    async def handle_add_channel(self, message: Message):
+    async def handle_add_channel(self, message: Message, is_admin: bool = False, command_args: str = ""):
         """اضافه کردن کانال اجباری"""
         config = await get_config()
         
-        if not config.is_admin(message.from_user.id):
+        if not is_admin:
             await message.answer("⛔ دسترسی ممنوع!")
             return
         
-        command_parts = message.text.split()
-        if len(command_parts) < 2:
+        args = command_args.split()
+        if not args:
             await message.answer("⚠️ لطفاً آیدی کانال را وارد کنید\nمثال: /addchannel @channel")
             return
         
-        channel = command_parts[1].strip()
+        channel = args[0]
         if not channel.startswith('@'):
             await message.answer("⚠️ آیدی کانال باید با @ شروع شود")
             return
         
         if channel not in config.required_channels:
             config.required_channels.append(channel)
+            config.publish()
             await config.save()
             await message.answer(f"✅ کانال {channel} به لیست کانال‌های اجباری اضافه شد")
         else:
             await message.answer("⚠️ این کانال قبلاً اضافه شده است")
     
-    async def handle_remove_channel(self, message: Message):
+    async def handle_remove_channel(self, message: Message, is_admin: bool = False, command_args: str = ""):
         """حذف کانال اجباری"""
         config = await get_config()
         
-        if not config.is_admin(message.from_user.id):
+        if not is_admin:
             await message.answer("⛔ دسترسی ممنوع!")
             return
         
-        command_parts = message.text.split()
-        if len(command_parts) < 2:
+        args = command_args.split()
+        if not args:
             await message.answer("⚠️ لطفاً آیدی کانال را وارد کنید\nمثال: /removechannel @channel")
             return
         
-        channel = command_parts[1].strip()
+        channel = args[0]
         if channel in config.required_channels:
             config.required_channels.remove(channel)
+            config.publish()
             await config.save()
             await message.answer(f"✅ کانال {channel} از لیست حذف شد")
         else:
             await message.answer("⚠️ این کانال در لیست وجود ندارد")
     
-    async def handle_list_channels(self, message: Message):
+    async def handle_list_channels(self, message: Message, is_admin: bool = False):
         """لیست کانال‌های اجباری"""
         config = await get_config()
         
-        if not config.is_admin(message.from_user.id):
+        if not is_admin:
             await message.answer("⛔ دسترسی ممنوع!")
             return
         
@@ -76,23 +83,24 @@ class AdminHandlers:
             channels_list = "\n".join([f"{i+1}. {channel}" for i, channel in enumerate(config.required_channels)])
             await message.answer(f"📋 لیست کانال‌های اجباری:\n\n{channels_list}")
     
-    async def handle_add_admin(self, message: Message):
+    async def handle_add_admin(self, message: Message, is_admin: bool = False, command_args: str = ""):
         """اضافه کردن ادمین"""
         config = await get_config()
         
-        if not config.is_admin(message.from_user.id):
+        if not is_admin:
             await message.answer("⛔ دسترسی ممنوع!")
             return
         
-        command_parts = message.text.split()
-        if len(command_parts) < 2:
+        args = command_args.split()
+        if not args:
             await message.answer("⚠️ لطفاً آیدی ادمین را وارد کنید\nمثال: /addadmin 123456789")
             return
         
         try:
-            admin_id = int(command_parts[1].strip())
+            admin_id = int(args[0])
             if admin_id not in config.admin_ids:
                 config.admin_ids.append(admin_id)
+                config.publish()
                 await config.save()
                 await message.answer(f"✅ آیدی {admin_id} به لیست ادمین‌ها اضافه شد")
             else:
@@ -100,27 +108,28 @@ class AdminHandlers:
         except ValueError:
             await message.answer("⚠️ آیدی نامعتبر است")
     
-    async def handle_remove_admin(self, message: Message):
+    async def handle_remove_admin(self, message: Message, is_admin: bool = False, command_args: str = ""):
         """حذف ادمین"""
         config = await get_config()
         
-        if not config.is_admin(message.from_user.id):
+        if not is_admin:
             await message.answer("⛔ دسترسی ممنوع!")
             return
         
-        command_parts = message.text.split()
-        if len(command_parts) < 2:
+        args = command_args.split()
+        if not args:
             await message.answer("⚠️ لطفاً آیدی ادمین را وارد کنید\nمثال: /removeadmin 123456789")
             return
         
         try:
-            admin_id = int(command_parts[1].strip())
+            admin_id = int(args[0])
             if admin_id == message.from_user.id:
                 await message.answer("⚠️ نمی‌توانید خودتان را حذف کنید")
                 return
             
             if admin_id in config.admin_ids:
                 config.admin_ids.remove(admin_id)
+                config.publish()
                 await config.save()
                 await message.answer(f"✅ آیدی {admin_id} از لیست ادمین‌ها حذف شد")
             else:
@@ -128,11 +137,11 @@ class AdminHandlers:
         except ValueError:
             await message.answer("⚠️ آیدی نامعتبر است")
     
-    async def handle_list_admins(self, message: Message):
+    async def handle_list_admins(self, message: Message, is_admin: bool = False):
         """لیست ادمین‌ها"""
         config = await get_config()
         
-        if not config.is_admin(message.from_user.id):
+        if not is_admin:
             await message.answer("⛔ دسترسی ممنوع!")
             return
         
@@ -150,11 +159,11 @@ class AdminHandlers:
             
             await message.answer("👑 لیست ادمین‌ها:\n\n" + "\n".join(admins_list))
     
-    async def handle_display_config(self, message: Message):
+    async def handle_display_config(self, message: Message, is_admin: bool = False):
         """نمایش تنظیمات نمایش"""
         config = await get_config()
         
-        if not config.is_admin(message.from_user.id):
+        if not is_admin:
             await message.answer("⛔ دسترسی ممنوع!")
             return
         
@@ -190,35 +199,35 @@ class AdminHandlers:
         
         await message.answer(config_text, parse_mode=ParseMode.MARKDOWN)
     
-    async def handle_toggle_filename(self, message: Message):
+    async def handle_toggle_filename(self, message: Message, is_admin: bool = False):
         """تغییر نمایش نام فایل"""
-        await self._toggle_setting(message, 'filename')
+        await self._toggle_setting(message, 'filename', is_admin)
     
-    async def handle_toggle_filesize(self, message: Message):
+    async def handle_toggle_filesize(self, message: Message, is_admin: bool = False):
         """تغییر نمایش حجم فایل"""
-        await self._toggle_setting(message, 'filesize')
+        await self._toggle_setting(message, 'filesize', is_admin)
     
-    async def handle_toggle_sourceurl(self, message: Message):
+    async def handle_toggle_sourceurl(self, message: Message, is_admin: bool = False):
         """تغییر نمایش لینک منبع"""
-        await self._toggle_setting(message, 'sourceurl')
+        await self._toggle_setting(message, 'sourceurl', is_admin)
     
-    async def handle_toggle_userid(self, message: Message):
+    async def handle_toggle_userid(self, message: Message, is_admin: bool = False):
         """تغییر نمایش آیدی کاربر"""
-        await self._toggle_setting(message, 'userid')
+        await self._toggle_setting(message, 'userid', is_admin)
     
-    async def handle_toggle_copyright(self, message: Message):
+    async def handle_toggle_copyright(self, message: Message, is_admin: bool = False):
         """تغییر نمایش کپی رایت"""
-        await self._toggle_setting(message, 'copyright')
+        await self._toggle_setting(message, 'copyright', is_admin)
     
-    async def handle_toggle_shortlink(self, message: Message):
+    async def handle_toggle_shortlink(self, message: Message, is_admin: bool = False):
         """تغییر لینک کوتاه"""
-        await self._toggle_setting(message, 'shortlink')
+        await self._toggle_setting(message, 'shortlink', is_admin)
     
-    async def _toggle_setting(self, message: Message, setting: str):
+    async def _toggle_setting(self, message: Message, setting: str, is_admin: bool):
         """تغییر تنظیمات نمایش"""
         config = await get_config()
         
-        if not config.is_admin(message.from_user.id):
+        if not is_admin:
             await message.answer("⛔ دسترسی ممنوع!")
             return
         
@@ -239,6 +248,7 @@ class AdminHandlers:
         name, attr = setting_names[setting]
         current_value = getattr(display, attr)
         setattr(display, attr, not current_value)
+        config.publish()
         
         status = 'فعال' if not current_value else 'غیرفعال'
         await message.answer(
@@ -247,41 +257,41 @@ class AdminHandlers:
             parse_mode=ParseMode.MARKDOWN
         )
     
-    async def handle_set_copyright(self, message: Message):
+    async def handle_set_copyright(self, message: Message, is_admin: bool = False, command_args: str = ""):
         """تغییر متن کپی رایت"""
         config = await get_config()
         
-        if not config.is_admin(message.from_user.id):
+        if not is_admin:
             await message.answer("⛔ دسترسی ممنوع!")
             return
         
-        command_parts = message.text.split(maxsplit=1)
-        if len(command_parts) < 2:
+        if not command_args.strip():
             await message.answer("⚠️ لطفاً متن کپی رایت را وارد کنید\nمثال: /setcopyright متن جدید")
             return
         
-        text = command_parts[1].strip()
+        text = command_args.strip()
         config.display_settings.copyright_text = text
+        config.publish()
         
         await message.answer(
             f"✅ متن کپی رایت به '{text}' تغییر کرد\n\n"
             f"⚠️ برای ذخیره دائمی از /saveconfig استفاده کنید"
         )
     
-    async def handle_set_shortlink_service(self, message: Message):
+    async def handle_set_shortlink_service(self, message: Message, is_admin: bool = False, command_args: str = ""):
         """تغییر سرویس لینک کوتاه"""
         config = await get_config()
         
-        if not config.is_admin(message.from_user.id):
+        if not is_admin:
             await message.answer("⛔ دسترسی ممنوع!")
             return
         
-        command_parts = message.text.split()
-        if len(command_parts) < 2:
+        args = command_args.split()
+        if not args:
             await message.answer("⚠️ لطفاً نام سرویس را وارد کنید\nمثال: /setshortlinkservice is.gd")
             return
         
-        service = command_parts[1].strip().lower()
+        service = args[0].lower()
         valid_services = ['tinyurl', 'is.gd', 'cleanuri']
         
         if service not in valid_services:
@@ -291,6 +301,7 @@ class AdminHandlers:
             return
         
         config.display_settings.short_link_service = service
+        config.publish()
         self.bot.shortlink_service.service = service
         
         await message.answer(
@@ -298,11 +309,11 @@ class AdminHandlers:
             f"⚠️ برای ذخیره دائمی از /saveconfig استفاده کنید"
         )
     
-    async def handle_save_config(self, message: Message):
+    async def handle_save_config(self, message: Message, is_admin: bool = False):
         """ذخیره تنظیمات"""
         config = await get_config()
         
-        if not config.is_admin(message.from_user.id):
+        if not is_admin:
             await message.answer("⛔ دسترسی ممنوع!")
             return
         
@@ -311,11 +322,11 @@ class AdminHandlers:
         else:
             await message.answer("❌ خطا در ذخیره تنظیمات")
     
-    async def handle_broadcast(self, message: Message):
+    async def handle_broadcast(self, message: Message, is_admin: bool = False, command_args: str = ""):
         """ارسال پیام همگانی"""
         config = await get_config()
         
-        if not config.is_admin(message.from_user.id):
+        if not is_admin:
             await message.answer("⛔ دسترسی ممنوع!")
             return
         
@@ -327,45 +338,61 @@ class AdminHandlers:
             await message.answer("⏰ می‌توانید بعداً دوباره پیام همگانی ارسال کنید")
             return
         
-        command_parts = message.text.split(maxsplit=1)
-        if len(command_parts) < 2:
+        if not command_args.strip():
             await message.answer("⚠️ لطفاً متن پیام را وارد کنید\nمثال: /broadcast متن پیام")
             return
         
-        broadcast_text = command_parts[1].strip()
+        broadcast_text = command_args.strip()
         config.update_broadcast_time()
         await config.save()
         
-        await message.answer(
-            f"✅ پیام همگانی با موفقیت تنظیم شد\n\n"
-            f"📝 متن:\n{broadcast_text}\n\n"
-            f"👥 ارسال به: {config.statistics.total_users} کاربر\n"
-            f"📅 زمان: {config.broadcast.last_sent}",
-            parse_mode=ParseMode.MARKDOWN
-        )
+        # پیام همگانی پس از پاسخ کاربران و ارسال فایل‌ها
+        with outbound_priority(BULK):
+            await message.answer(
+                f"✅ پیام همگانی با موفقیت تنظیم شد\n\n"
+                f"📝 متن:\n{broadcast_text}\n\n"
+                f"👥 ارسال به: {config.statistics.total_users} کاربر\n"
+                f"📅 زمان: {config.broadcast.last_sent}",
+                parse_mode=ParseMode.MARKDOWN
+            )
     
-    async def handle_full_stats(self, message: Message):
+    async def handle_full_stats(self, message: Message, is_admin: bool = False):
         """آمار کامل ربات"""
         config = await get_config()
         
-        if not config.is_admin(message.from_user.id):
+        if not is_admin:
             await message.answer("⛔ دسترسی ممنوع!")
             return
         
         stats = config.statistics
         
-        # کاربران برتر
-        top_users = sorted(
-            [(uid, count) for uid, count in stats.user_activity.items()],
-            key=lambda x: x[1],
-            reverse=True
-        )[:10]
+        # کاربران برتر (از رتبه‌بندی افزایشی، بدون مرتب‌سازی کل کاربران)
+        top_users = config.leaderboard.top(10)
         
         top_users_text = "\n".join([
             f"{i+1}. {uid}: {count} دانلود"
             for i, (uid, count) in enumerate(top_users)
         ]) if top_users else "📭 هنوز کاربری فعالیت نکرده است"
         
+        # گذردهی اخیر
+        recent = throughput.summary(300)
+        hourly = throughput.summary(3600)
+        daily = throughput.summary(86400)
+        jobs_trend = throughput.trend('finished', 86400)
+        bytes_trend = throughput.trend('bytes_in', 86400)
+        
+        throughput_text = (
+            f"• ۵ دقیقه اخیر: {recent['jobs_per_minute']:.2f} کار/دقیقه، "
+            f"ورودی {recent['bytes_in_per_second'] / 1024 / 1024:.2f} MB/s، "
+            f"خروجی {recent['bytes_out_per_second'] / 1024 / 1024:.2f} MB/s\n"
+            f"• ساعت اخیر: {hourly['started']:.0f} شروع، {hourly['finished']:.0f} موفق، {hourly['failed']:.0f} ناموفق\n"
+            f"• میانگین (ساعت اخیر): انتظار صف {hourly['avg_queue_wait']:.1f}s، "
+            f"دانلود {hourly['avg_download_time']:.1f}s، آپلود {hourly['avg_upload_time']:.1f}s\n"
+            f"• ۲۴ ساعت اخیر: {daily['finished']:.0f} موفق، {daily['failed']:.0f} ناموفق، "
+            f"میانگین دانلود {daily['avg_download_time']:.1f}s\n"
+            f"• روند نسبت به ۲۴ ساعت قبل: کارها {self._format_trend(jobs_trend)}، حجم {self._format_trend(bytes_trend)}"
+        )
+        
         full_stats = (
             f"📈 **آمار کامل ربات**\n\n"
             f"🤖 **نام ربات:** @irprolinkbot\n"
@@ -374,6 +401,7 @@ class AdminHandlers:
             f"📊 **آمار کلی:**\n"
             f"• 👥 تعداد کاربران: {stats.total_users}\n"
             f"• 📥 تعداد دانلودها: {stats.total_downloads}\n"
+            f"• 🛑 لغو شده توسط کاربر: {stats.total_cancelled}\n"
             f"• 💽 حجم کل: {stats.total_size_gb:.2f} گیگابایت\n"
             f"• 📅 آخرین فعالیت: {stats.last_active}\n\n"
             f"⚙️ **تنظیمات:**\n"
@@ -381,19 +409,29 @@ class AdminHandlers:
             f"• ⏰ محدودیت درخواست: {config.security.max_requests_per_minute}/دقیقه\n"
             f"• 🛡️ امنیت فایل: {'✅' if config.security.enable_anti_spam else '❌'}\n"
             f"• 📢 برودکست: {'✅' if config.broadcast.enabled else '❌'}\n\n"
+            f"⚡ **گذردهی اخیر:**\n"
+            f"{throughput_text}\n\n"
             f"🏆 **کاربران برتر:**\n"
             f"{top_users_text}\n\n"
             f"👑 **ادمین‌ها:** {len(config.admin_ids)} نفر\n"
             f"📢 **کانال‌های اجباری:** {len(config.required_channels)} کانال"
         )
         
-        await message.answer(full_stats, parse_mode=ParseMode.MARKDOWN)
+        with outbound_priority(BULK):
+            await message.answer(full_stats, parse_mode=ParseMode.MARKDOWN)
+    
+    def _format_trend(self, change) -> str:
+        """نمایش درصد تغییر"""
+        if change is None:
+            return "—"
+        arrow = "📈" if change > 5 else "📉" if change < -5 else "➡️"
+        return f"{arrow} {change:+.0f}%"
     
-    async def handle_reset_stats(self, message: Message):
+    async def handle_reset_stats(self, message: Message, is_admin: bool = False):
         """ریست آمار"""
         config = await get_config()
         
-        if not config.is_admin(message.from_user.id):
+        if not is_admin:
             await message.answer("⛔ دسترسی ممنوع!")
             return
         
@@ -402,21 +440,21 @@ class AdminHandlers:
         admin_ids = [main_admin] if main_admin in config.admin_ids else [main_admin]
         
         # ریست کردن آمار
-        from dataclasses import replace
-        config.statistics = type(config.statistics)()
+        config.reset_statistics()
         config.admin_ids = admin_ids
         config.user_sessions = {}
+        config.publish()
         
         if await config.save():
             await message.answer("✅ آمار با موفقیت ریست شد\nتمام آمار کاربران و دانلودها پاک شدند")
         else:
             await message.answer("❌ خطا در ذخیره تنظیمات")
     
-    async def handle_security_settings(self, message: Message):
+    async def handle_security_settings(self, message: Message, is_admin: bool = False):
         """تنظیمات امنیتی"""
         config = await get_config()
         
-        if not config.is_admin(message.from_user.id):
+        if not is_admin:
             await message.answer("⛔ دسترسی ممنوع!")
             return
         
@@ -428,7 +466,9 @@ class AdminHandlers:
             f"📊 **حداکثر درخواست:** {security.max_requests_per_minute} در دقیقه\n"
             f"📅 **حداکثر درخواست روزانه:** {security.max_requests_per_day}\n"
             f"🚫 **ضد اسپم:** {'✅ فعال' if security.enable_anti_spam else '❌ غیرفعال'}\n"
-            f"⛔ **پسوندهای مسدود:** {', '.join(security.blocked_extensions)}\n\n"
+            f"⛔ **پسوندهای مسدود:** {', '.join(security.blocked_extensions)}\n"
+            f"🌐 **میزبان‌ها:** {len(security.blocked_hosts)} مسدود، "
+            f"{len(security.allowed_hosts) or 'همه'} مجاز\n\n"
             f"📈 **آمار فعلی:**\n"
             f"• 👥 کاربران فعال: {len(config.user_sessions)}\n"
             f"• ⏰ آخرین درخواست: {config.statistics.last_active}\n\n"
@@ -437,3 +477,347 @@ class AdminHandlers:
         )
         
         await message.answer(security_text, parse_mode=ParseMode.MARKDOWN)
+    
+    async def handle_block_host(self, message: Message, is_admin: bool = False, command_args: str = ""):
+        """مسدود کردن دامنه (و زیردامنه‌هایش)"""
+        await self._add_host(message, 'blocked_hosts', "/blockhost", is_admin, command_args)
+    
+    async def handle_allow_host(self, message: Message, is_admin: bool = False, command_args: str = ""):
+        """اضافه کردن دامنه به لیست مجاز (با وجود لیست مجاز فقط همین دامنه‌ها دانلود می‌شوند)"""
+        await self._add_host(message, 'allowed_hosts', "/allowhost", is_admin, command_args)
+    
+    async def _add_host(self, message: Message, list_name: str, command: str, is_admin: bool, command_args: str):
+        config = await get_config()
+        
+        if not is_admin:
+            await message.answer("⛔ دسترسی ممنوع!")
+            return
+        
+        args = command_args.split()
+        if not args:
+            await message.answer(f"⚠️ لطفاً دامنه را وارد کنید\nمثال: {command} example.com")
+            return
+        
+        host = normalize_host(args[0])
+        if not host or '/' in host or ':' in host:
+            await message.answer("⚠️ دامنه نامعتبر است")
+            return
+        
+        hosts = getattr(config.security, list_name)
+        if host in hosts:
+            await message.answer("⚠️ این دامنه قبلاً اضافه شده است")
+            return
+        
+        hosts.append(host)
+        config.publish()
+        await config.save()
+        title = "مسدود" if list_name == 'blocked_hosts' else "مجاز"
+        await message.answer(f"✅ دامنه {host} (با زیردامنه‌ها) به لیست {title} اضافه شد")
+    
+    async def handle_remove_host(self, message: Message, is_admin: bool = False, command_args: str = ""):
+        """حذف دامنه از لیست‌های مجاز و مسدود"""
+        config = await get_config()
+        
+        if not is_admin:
+            await message.answer("⛔ دسترسی ممنوع!")
+            return
+        
+        args = command_args.split()
+        if not args:
+            await message.answer("⚠️ لطفاً دامنه را وارد کنید\nمثال: /removehost example.com")
+            return
+        
+        host = normalize_host(args[0])
+        removed = False
+        for hosts in (config.security.blocked_hosts, config.security.allowed_hosts):
+            if host in hosts:
+                hosts.remove(host)
+                removed = True
+        
+        if removed:
+            config.publish()
+            await config.save()
+            await message.answer(f"✅ دامنه {host} از لیست حذف شد")
+        else:
+            await message.answer("⚠️ این دامنه در لیست وجود ندارد")
+    
+    async def handle_list_hosts(self, message: Message, is_admin: bool = False):
+        """لیست دامنه‌های مجاز و مسدود"""
+        config = await get_config()
+        
+        if not is_admin:
+            await message.answer("⛔ دسترسی ممنوع!")
+            return
+        
+        blocked = config.security.blocked_hosts
+        allowed = config.security.allowed_hosts
+        if not blocked and not allowed:
+            await message.answer("📭 هیچ دامنه‌ای تنظیم نشده است (دانلود از همه سایت‌ها مجاز است)")
+            return
+        
+        text = "🌐 فیلتر دامنه‌ها:\n\n⛔ مسدود:\n"
+        text += "\n".join(f"• {host}" for host in blocked) if blocked else "—"
+        text += "\n\n✅ مجاز:\n"
+        text += "\n".join(f"• {host}" for host in allowed) if allowed else "همه دامنه‌ها"
+        await message.answer(text)
+    
+    async def handle_set_quota(self, message: Message, is_admin: bool = False, command_args: str = ""):
+        """تنظیم سهمیه اختصاصی کاربر"""
+        config = await get_config()
+        
+        if not is_admin:
+            await message.answer("⛔ دسترسی ممنوع!")
+            return
+        
+        args = command_args.split()
+        if len(args) < 3:
+            await message.answer(
+                "⚠️ لطفاً آیدی کاربر و سهمیه را وارد کنید\n"
+                "مثال: /setquota 123456789 [روزانه MB] [ساعتی MB] [دقیقه اسلات روزانه] [دقیقه اسلات ساعتی]\n"
+                "/setquota 123456789 20000 5000"
+            )
+            return
+        
+        try:
+            user_id = int(args[0])
+            values = [int(part) for part in args[1:5]]
+        except ValueError:
+            await message.answer("⚠️ مقادیر باید عدد صحیح باشند")
+            return
+        
+        keys = [
+            ('daily_bytes', 1024 * 1024),
+            ('hourly_bytes', 1024 * 1024),
+            ('daily_slot_seconds', 60),
+            ('hourly_slot_seconds', 60),
+        ]
+        override = config.quota.user_overrides.setdefault(str(user_id), {})
+        for (key, unit), value in zip(keys, values):
+            override[key] = value * unit
+        await config.save()
+        
+        await message.answer(f"✅ سهمیه اختصاصی کاربر {user_id} تنظیم شد\n\n" + self._format_quota(config, user_id))
+    
+    async def handle_reset_quota(self, message: Message, is_admin: bool = False, command_args: str = ""):
+        """حذف سهمیه اختصاصی کاربر"""
+        config = await get_config()
+        
+        if not is_admin:
+            await message.answer("⛔ دسترسی ممنوع!")
+            return
+        
+        args = command_args.split()
+        if not args:
+            await message.answer("⚠️ لطفاً آیدی کاربر را وارد کنید\nمثال: /resetquota 123456789")
+            return
+        
+        user_id_str = args[0]
+        if config.quota.user_overrides.pop(user_id_str, None) is not None:
+            await config.save()
+            await message.answer(f"✅ سهمیه کاربر {user_id_str} به پیش‌فرض بازگشت")
+        else:
+            await message.answer("⚠️ این کاربر سهمیه اختصاصی ندارد")
+    
+    async def handle_quota(self, message: Message, is_admin: bool = False, command_args: str = ""):
+        """نمایش سهمیه و مصرف کاربر"""
+        config = await get_config()
+        
+        if not is_admin:
+            await message.answer("⛔ دسترسی ممنوع!")
+            return
+        
+        args = command_args.split()
+        if not args:
+            quota = config.quota
+            await message.answer(
+                f"📦 سهمیه پیش‌فرض ({'✅ فعال' if quota.enable_quota else '❌ غیرفعال'}):\n\n"
+                f"• روزانه: {quota.daily_bytes / 1024 / 1024:.0f} MB\n"
+                f"• ساعتی: {quota.hourly_bytes / 1024 / 1024:.0f} MB\n"
+                f"• اسلات روزانه: {quota.daily_slot_seconds / 60:.0f} دقیقه\n"
+                f"• اسلات ساعتی: {quota.hourly_slot_seconds / 60:.0f} دقیقه\n"
+                f"• کاربران با سهمیه اختصاصی: {len(quota.user_overrides)}"
+            )
+            return
+        
+        try:
+            user_id = int(args[0])
+        except ValueError:
+            await message.answer("⚠️ آیدی نامعتبر است")
+            return
+        
+        await message.answer(self._format_quota(config, user_id))
+    
+    def _format_quota(self, config, user_id: int) -> str:
+        """متن سهمیه و مصرف یک کاربر"""
+        limits = config.get_quota_limits(user_id)
+        usage = config.get_quota_usage(user_id)
+        override = "✅" if str(user_id) in config.quota.user_overrides else "❌"
+        return (
+            f"📦 سهمیه کاربر {user_id} (اختصاصی: {override})\n\n"
+            f"• امروز: {usage['daily_bytes'] / 1024 / 1024:.1f}/{limits['daily_bytes'] / 1024 / 1024:.0f} MB\n"
+            f"• این ساعت: {usage['hourly_bytes'] / 1024 / 1024:.1f}/{limits['hourly_bytes'] / 1024 / 1024:.0f} MB\n"
+            f"• اسلات امروز: {usage['daily_slot_seconds'] / 60:.1f}/{limits['daily_slot_seconds'] / 60:.0f} دقیقه\n"
+            f"• اسلات این ساعت: {usage['hourly_slot_seconds'] / 60:.1f}/{limits['hourly_slot_seconds'] / 60:.0f} دقیقه"
+        )
+
+    async def handle_set_tier(self, message: Message, is_admin: bool = False, command_args: str = ""):
+        """تعیین سطح کاربر (تعداد آپلود همزمان و عمق صف)"""
+        config = await get_config()
+
+        if not is_admin:
+            await message.answer("⛔ دسترسی ممنوع!")
+            return
+
+        scheduler = config.scheduler
+        args = command_args.split()
+        if len(args) < 2:
+            tiers = "\n".join(
+                f"• {name}: {limits.get('concurrency', 1)} همزمان، {limits.get('queue_depth', 0)} در صف"
+                f" ({sum(1 for tier in scheduler.user_tiers.values() if tier == name)} کاربر)"
+                for name, limits in scheduler.tiers.items()
+            )
+            await message.answer(
+                f"🎚 سطح‌های کاربران (پیش‌فرض: {scheduler.default_tier}، ادمین‌ها: {scheduler.admin_tier}):\n\n"
+                f"{tiers}\n\n"
+                "مثال: /settier 123456789 power"
+            )
+            return
+
+        try:
+            user_id = int(args[0])
+        except ValueError:
+            await message.answer("⚠️ آیدی نامعتبر است")
+            return
+
+        tier = args[1]
+        if tier not in scheduler.tiers:
+            await message.answer(f"⚠️ سطح {tier} تعریف نشده است\nسطح‌ها: {', '.join(scheduler.tiers)}")
+            return
+
+        if tier == scheduler.default_tier:
+            scheduler.user_tiers.pop(str(user_id), None)
+        else:
+            scheduler.user_tiers[str(user_id)] = tier
+        await config.save()
+        # کارهای منتظر کاربر با سقف جدید دوباره بررسی می‌شوند
+        self.bot.jobs.refresh()
+
+        concurrency, queue_depth = config.get_job_limits(user_id)
+        await message.answer(
+            f"✅ سطح کاربر {user_id}: {config.get_user_tier(user_id)}\n"
+            f"• آپلود همزمان: {concurrency}\n"
+            f"• صف: {queue_depth}"
+        )
+
+    async def handle_delivery_mode(self, message: Message, is_admin: bool = False, command_args: str = ""):
+        """تعیین روش تحویل فایل: آپلود در تلگرام یا لینک CDN"""
+        config = await get_config()
+
+        if not is_admin:
+            await message.answer("⛔ دسترسی ممنوع!")
+            return
+
+        delivery = config.delivery
+        args = command_args.split()
+        if not args:
+            cdn = self.bot.cdn
+            storage = (
+                f"{cdn.stored_objects} فایل، {cdn.stored_bytes / 1024 ** 3:.2f}/{cdn.max_bytes / 1024 ** 3:.0f} GB"
+                if cdn else "غیرفعال (ENABLE_CDN)"
+            )
+            await message.answer(
+                f"🌐 روش تحویل فایل: {delivery.mode}\n"
+                f"• سقف آپلود تلگرام: {delivery.upload_limit / 1024 / 1024:.0f} MB\n"
+                f"• فضای CDN: {storage}\n\n"
+                "telegram: همیشه آپلود در تلگرام\n"
+                "auto: لینک CDN برای فایل‌های بزرگ‌تر از سقف آپلود\n"
+                "cdn: همیشه لینک CDN\n\n"
+                "مثال: /deliverymode auto 50"
+            )
+            return
+
+        mode = args[0].lower()
+        if mode not in DELIVERY_MODES:
+            await message.answer(f"⚠️ روش نامعتبر است\nروش‌ها: {', '.join(DELIVERY_MODES)}")
+            return
+
+        if len(args) > 1:
+            try:
+                upload_limit = int(args[1]) * 1024 * 1024
+            except ValueError:
+                await message.answer("⚠️ سقف آپلود باید عدد (مگابایت) باشد")
+                return
+            if upload_limit < 1:
+                await message.answer("⚠️ سقف آپلود باید مثبت باشد")
+                return
+            delivery.upload_limit = upload_limit
+
+        delivery.mode = mode
+        await config.save()
+
+        warning = ""
+        if mode != "telegram" and not self.bot.cdn:
+            warning = "\n⚠️ CDN غیرفعال است؛ تا فعال شدن ENABLE_CDN فایل‌ها در تلگرام آپلود می‌شوند"
+        await message.answer(
+            f"✅ روش تحویل فایل: {delivery.mode}\n"
+            f"• سقف آپلود تلگرام: {delivery.upload_limit / 1024 / 1024:.0f} MB{warning}"
+        )
+
+    async def handle_latency(self, message: Message, is_admin: bool = False, command_args: str = ""):
+        """نمایش صدک‌های تأخیر هر مرحله پردازش"""
+        if not is_admin:
+            await message.answer("⛔ دسترسی ممنوع!")
+            return
+        
+        windows = {'5m': 300, '15m': 900, '1h': 3600, 'all': None}
+        args = command_args.split()
+        window_name = args[0].lower() if args else '15m'
+        if window_name not in windows:
+            await message.answer("⚠️ فرمت: /latency [5m|15m|1h|all]")
+            return
+        
+        histograms = latency.window(windows[window_name])
+        if not histograms:
+            await message.answer(f"⏱ داده‌ای برای بازه {window_name} ثبت نشده است")
+            return
+        
+        lines = [f"⏱ تأخیر مراحل ({window_name}) — تعداد | p50 / p95 / p99 / max (ms):\n"]
+        for stage in sorted(histograms):
+            histogram = histograms[stage]
+            lines.append(
+                f"• {stage}: {histogram.count} | "
+                f"{histogram.percentile(50) * 1000:.0f} / "
+                f"{histogram.percentile(95) * 1000:.0f} / "
+                f"{histogram.percentile(99) * 1000:.0f} / "
+                f"{histogram.max * 1000:.0f}"
+            )
+        await message.answer("\n".join(lines))
+    
+    async def handle_profile(self, message: Message, is_admin: bool = False, command_args: str = ""):
+        """پروفایل حلقه رویداد در بار واقعی به مدت N ثانیه"""
+        if not is_admin:
+            await message.answer("⛔ دسترسی ممنوع!")
+            return
+        
+        args = command_args.split()
+        try:
+            seconds = int(args[0]) if args else 10
+        except ValueError:
+            await message.answer("⚠️ فرمت: /profile [ثانیه]")
+            return
+        if not 1 <= seconds <= 120:
+            await message.answer("⚠️ مدت پروفایل باید بین ۱ تا ۱۲۰ ثانیه باشد")
+            return
+        
+        if profiler.is_running():
+            await message.answer("⏳ یک پروفایل دیگر در حال اجراست")
+            return
+        
+        await message.answer(f"🔬 پروفایل حلقه رویداد به مدت {seconds} ثانیه شروع شد...")
+        report = await profiler.profile_loop(seconds)
+        
+        await message.answer(profiler.format_report(report)[:4000])
+        await message.answer_document(
+            BufferedInputFile(report.full_text.encode('utf-8'), filename="profile.txt"),
+            caption="📄 گزارش کامل cProfile (مرتب بر اساس زمان تجمعی)"
+        )
@@ -3,31 +3,71 @@ User command handlers with i18n support
 """
 
 import re
+import time
+import asyncio
 import logging
 import aiofiles
-from typing import Optional
+from typing import List, Optional
 from pathlib import Path
+from datetime import datetime, timezone
+from urllib.parse import urlparse
 
-from aiogram.types import Message
+from aiogram.types import (
+    Message, ChatMemberUpdated, CallbackQuery, InlineKeyboardMarkup, InlineKeyboardButton,
+    FSInputFile, InputMediaPhoto, InputMediaVideo, InputMediaDocument
+)
 from aiogram.enums import ParseMode
 
-from config import get_config, env_config
+from config import get_config, get_snapshot, env_config
 from config.i18n import translator, Language
 from utils.shortlink import ShortLinkService
+from utils.timeseries import throughput
+from utils.histogram import latency
+from utils.metrics import metrics
+from utils.tracing import tracer
+from utils.loop_monitor import loop_monitor
+from utils.dedupe import recent_requests, request_key
+from utils.job_queue import Job, DONE, DELIVERING, FAILED, QUEUED
+from utils.album import AlbumItem, Batch
+from utils.downloader import ProbeResult
 
 logger = logging.getLogger(__name__)
 
+URL_PATTERN = re.compile(r'^https?://[^\s/$.?#].[^\s]*$', re.IGNORECASE)
+URL_FIND_PATTERN = re.compile(r'https?://[^\s<>"\']+', re.IGNORECASE)
+URL_TRAILING = '.,;:!?)]}»'  # Punctuation after a link in running text
+
+# Files Telegram fetches by URL itself (Bot API limits for sending by URL)
+URL_FETCH_PHOTO_LIMIT = 5 * 1024 * 1024
+URL_FETCH_PHOTO_EXTENSIONS = ('.jpg', '.jpeg', '.png', '.webp')
+URL_FETCH_DOCUMENT_LIMIT = 20 * 1024 * 1024
+URL_FETCH_DOCUMENT_EXTENSIONS = ('.pdf', '.zip', '.gif')  # sendDocument by URL only works for these
+
+url_fetches = metrics.counter("url_fetch_total", "Files offered to Telegram by URL", label="result")
+
+MAX_BATCH_URLS = 100  # Links taken from one message or file
+MAX_URL_FILE_SIZE = 256 * 1024  # .txt attachment with links
+
+CANCEL_PREFIX = "cancel:"  # callback data of the cancel button: cancel:<job_id or batch_id>
+
+def extract_urls(text: str, entities=None) -> List[str]:
+    """All http(s) links in a text (including hidden text links), in order and without repeats"""
+    urls = [match.group(0).rstrip(URL_TRAILING) for match in URL_FIND_PATTERN.finditer(text)]
+    for entity in entities or ():
+        if entity.type == "text_link" and entity.url:
+            urls.append(entity.url)
+    return list(dict.fromkeys(url for url in urls if URL_PATTERN.match(url)))
+
 class UserHandlers:
     """User command handlers with i18n support"""
     
     def __init__(self, bot):
         self.bot = bot
     
-    async def handle_start(self, message: Message):
+    async def handle_start(self, message: Message, user_lang: Language = Language.ENGLISH):
         """Handler for /start command"""
-        config = await get_config()
-        display = config.display_settings
-        user_lang = config.get_user_language(message.from_user.id)
+        snapshot = get_snapshot()
+        display = snapshot.display
         
         short_link_status = "✅ active" if display.enable_short_link else "❌ inactive"
         if user_lang == Language.PERSIAN:
@@ -41,11 +81,10 @@ class UserHandlers:
         
         await message.answer(welcome, parse_mode=ParseMode.MARKDOWN)
     
-    async def handle_help(self, message: Message):
+    async def handle_help(self, message: Message, user_lang: Language = Language.ENGLISH):
         """Handler for /help command"""
-        config = await get_config()
-        display = config.display_settings
-        user_lang = config.get_user_language(message.from_user.id)
+        snapshot = get_snapshot()
+        display = snapshot.display
         
         # Prepare status indicators
         filename_status = "✅" if display.show_filename else "❌"
@@ -66,21 +105,17 @@ class UserHandlers:
             copyright_status=copyright_status,
             short_link_note=short_link_note,
             max_size=env_config.max_file_size / 1024 / 1024,
-            max_per_minute=config.security.max_requests_per_minute,
-            max_per_day=config.security.max_requests_per_day,
+            max_per_minute=snapshot.security.max_requests_per_minute,
+            max_per_day=snapshot.security.max_requests_per_day,
             support_username=env_config.support_username
         )
         
         await message.answer(help_text, parse_mode=ParseMode.MARKDOWN)
     
-    async def handle_upload(self, message: Message):
+    async def handle_upload(self, message: Message, user_lang: Language = Language.ENGLISH, command_args: str = ""):
         """Handler for /upload command"""
-        config = await get_config()
-        user_lang = config.get_user_language(message.from_user.id)
-        
         # Extract URL from command
-        command_parts = message.text.split()
-        if len(command_parts) < 2:
+        if not command_args.strip():
             error_msg = translator.get("invalid_url", user_lang)
             await message.answer(
                 f"⚠️ {error_msg}\n"
@@ -89,28 +124,341 @@ class UserHandlers:
             )
             return
         
-        url = command_parts[1]
-        await self._process_upload(message, url)
+        urls = extract_urls(message.text, message.entities)
+        if not urls:
+            await message.answer(translator.get("invalid_url", user_lang))
+            return
+        
+        await self._process_urls(message, urls, user_lang)
+    
+    async def handle_direct_link(self, message: Message, user_lang: Language = Language.ENGLISH):
+        """Handler for messages with links (a single link or a batch anywhere in the text)"""
+        urls = extract_urls(message.text or "", message.entities)
+        if urls:
+            await self._process_urls(message, urls, user_lang)
+    
+    async def handle_url_file(self, message: Message, user_lang: Language = Language.ENGLISH):
+        """Handler for .txt attachments: every link in the file is queued as one batch"""
+        document = message.document
+        if not (document.file_name or "").lower().endswith(".txt") and document.mime_type != "text/plain":
+            return
+        
+        if (document.file_size or 0) > MAX_URL_FILE_SIZE:
+            await message.answer(translator.get("url_file_too_large", user_lang, max_kb=MAX_URL_FILE_SIZE // 1024))
+            return
+        
+        with latency.time("url_file"):
+            data = await self.bot.bot.download(document)
+        text = data.getvalue().decode('utf-8', errors='replace')
+        urls = extract_urls(message.caption or "", message.caption_entities) + extract_urls(text)
+        if not urls:
+            await message.answer(translator.get("no_urls_found", user_lang))
+            return
+        
+        await self._process_urls(message, list(dict.fromkeys(urls)), user_lang)
+    
+    async def _process_urls(self, message: Message, urls: List[str], user_lang: Language):
+        """Queue one link as a single upload, several as a batch"""
+        if len(urls) > 1:
+            await self._process_batch(message, urls, user_lang)
+            return
+        
+        # Reject filtered hosts before any network work
+        url = urls[0]
+        if not get_snapshot().is_host_allowed(url):
+            await message.answer(translator.get("host_blocked", user_lang))
+            return
+        await self._process_upload(message, url, user_lang)
+    
+    async def _process_batch(self, message: Message, urls: List[str], user_lang: Language):
+        """Queue several links as one batch: one status message, files delivered as albums"""
+        user_id = message.from_user.id
+        snapshot = get_snapshot()
+        jobs = self.bot.jobs
+        
+        # Links beyond the user's free running + queued slots are skipped, not queued
+        room = jobs.room(user_id)
+        accepted = []
+        skipped = max(0, len(urls) - MAX_BATCH_URLS)
+        for url in urls[:MAX_BATCH_URLS]:
+            key = None
+            if len(accepted) < room and snapshot.is_host_allowed(url):
+                key = recent_requests.claim(user_id, url)
+            if key is None:
+                skipped += 1
+            else:
+                accepted.append((url, key))
+        
+        if not accepted:
+            if room:
+                await message.answer(translator.get("batch_empty", user_lang))
+            else:
+                config = await get_config()
+                concurrency, queue_depth = config.get_job_limits(user_id)
+                await message.answer(translator.get("queue_full", user_lang, limit=concurrency + queue_depth))
+            return
+        
+        try:
+            batch_id = jobs.new_job_id()
+            status_text = translator.get("batch_queued", user_lang, count=len(accepted))
+            if skipped:
+                status_text += "\n" + translator.get("batch_skipped", user_lang, count=skipped)
+            status_msg = await message.answer(status_text, reply_markup=self._cancel_markup(batch_id, user_lang))
+        except Exception:
+            for _, key in accepted:
+                recent_requests.release(key, False)
+            raise
+        
+        self.bot.albums.open(batch_id, user_id, message.chat.id, status_msg.message_id, len(accepted))
+        for url, _ in accepted:
+            jobs.submit(user_id, message.chat.id, status_msg.message_id, url, batch_id=batch_id)
+    
+    async def _process_upload(self, message: Message, url: str, user_lang: Optional[Language] = None):
+        """Queue file upload (a link already queued or running for this user is dropped before any API call)"""
+        user_id = message.from_user.id
+        key = recent_requests.claim(user_id, url)
+        if key is None:
+            return
+        
+        try:
+            config = await get_config()
+            if user_lang is None:
+                user_lang = config.get_user_language(user_id)
+            jobs = self.bot.jobs
+            
+            # Per-tier limit on running + queued jobs
+            if not jobs.can_submit(user_id):
+                recent_requests.release(key, False)
+                concurrency, queue_depth = config.get_job_limits(user_id)
+                await message.answer(translator.get("queue_full", user_lang, limit=concurrency + queue_depth))
+                return
+            
+            # Send status message (with cancel button), then hand the job to the persistent queue
+            job_id = jobs.new_job_id()
+            position = jobs.position_for_new(user_id)
+            if position:
+                status_text = translator.get("upload_queued", user_lang, position=position)
+            else:
+                status_text = translator.get("upload_started", user_lang)
+            status_msg = await message.answer(status_text, reply_markup=self._cancel_markup(job_id, user_lang))
+            jobs.submit(user_id, message.chat.id, status_msg.message_id, url, job_id=job_id)
+            if position:
+                jobs.queued_notices.add(job_id)
+        except Exception:
+            recent_requests.release(key, False)
+            raise
+    
+    async def run_job(self, job: Job) -> str:
+        """Run one queued upload job; returns its final state"""
+        state = FAILED
+        try:
+            state = await self._run_upload(job)
+        except asyncio.CancelledError:
+            # Download slot, HTTP response and disk reservation are already released here
+            if self.bot.jobs.is_cancelling(job.job_id):
+                await self._finish_cancelled(job)
+            raise
+        finally:
+            recent_requests.release(request_key(job.user_id, job.url), state != FAILED)
+        return state
     
-    async def handle_direct_link(self, message: Message):
-        """Handler for direct links"""
-        url = message.text.strip()
-        
-        # Check if text is a valid URL
-        url_pattern = re.compile(r'^https?://[^\s/$.?#].[^\s]*$', re.IGNORECASE)
-        if url_pattern.match(url):
-            await self._process_upload(message, url)
+    async def deliver_album(self, batch: Batch, items: List[AlbumItem]):
+        """
+        Send ready files of a batch: one sendMediaGroup call per album (a single file goes alone).
+        If the album is rejected, its files are sent one by one so one bad file does not fail the rest.
+        """
+        config = await get_config()
+        if len(items) > 1:
+            upload_started = time.monotonic()
+            try:
+                with tracer.span("telegram_send_album", items=len(items)):
+                    await self.bot.send_media_group(batch.chat_id, [self._input_media(item) for item in items])
+            except asyncio.CancelledError:
+                raise  # Shutdown: files stay on disk and the jobs are delivered after restart
+            except Exception as e:
+                metrics.count_error("telegram")
+                logger.warning("Album error for batch %s (%s files), sending them one by one: %s",
+                               batch.batch_id, len(items), e)
+            else:
+                self._album_sent(batch, items, config, time.monotonic() - upload_started)
+                await config.save()
+                logger.info("Album sent for batch %s: %s files", batch.batch_id, len(items))
+                return
+        
+        for item in items:
+            upload_started = time.monotonic()
+            try:
+                await self._send_file(batch.chat_id, item.filepath, item.caption, item.file_type)
+            except asyncio.CancelledError:
+                raise  # Files not sent yet are delivered after restart
+            except Exception as e:
+                throughput.record(failed=1)
+                metrics.count_error("job")
+                batch.failures.append((item.job.url, str(e)))
+                self.bot.jobs.finish(item.job, FAILED)
+                if item.filepath.exists():
+                    item.filepath.unlink()
+                logger.error("Delivery error [%s] for batch %s: %s", item.job.job_id, batch.batch_id, e)
+                continue
+            self._album_sent(batch, [item], config, time.monotonic() - upload_started)
+        await config.save()
     
-    async def _process_upload(self, message: Message, url: str):
-        """Process file upload"""
+    def _album_sent(self, batch: Batch, items: List[AlbumItem], config, upload_time: float):
+        """Record delivered batch files: statistics, job state and temporary files"""
+        latency.observe("upload", upload_time)
+        sizes = [item.filepath.stat().st_size for item in items]
+        throughput.record(finished=len(items), bytes_out=sum(sizes), upload_time=upload_time, uploads=len(items))
+        for item, size in zip(items, sizes):
+            config.increment_statistics(item.job.user_id, size)
+            self.bot.jobs.finish(item.job, DONE)
+            if item.filepath.exists():
+                item.filepath.unlink()
+        batch.delivered += len(items)
+    
+    async def complete_batch(self, batch: Batch):
+        """Replace the batch status message with a summary of sent and failed links"""
+        config = await get_config()
+        user_lang = config.get_user_language(batch.user_id)
+        total = max(batch.total, batch.delivered + len(batch.failures))
+        lines = [translator.get("batch_done", user_lang, delivered=batch.delivered, total=total)]
+        lines.extend(f"• {urlparse(url).hostname}: {error}" for url, error in batch.failures[:10])
+        await self.bot.edit_message(
+            chat_id=batch.chat_id,
+            message_id=batch.status_message_id,
+            text="\n".join(lines)
+        )
+    
+    @staticmethod
+    def _input_media(item: AlbumItem):
+        """Album entry for a downloaded file (sent from disk under its original name)"""
+        name = item.filepath.name
+        media = FSInputFile(str(item.filepath), filename='_'.join(name.split('_')[2:]) or name)
+        if item.file_type == 'image':
+            return InputMediaPhoto(media=media, caption=item.caption, parse_mode=ParseMode.MARKDOWN, has_spoiler=True)
+        if item.file_type == 'video':
+            return InputMediaVideo(media=media, caption=item.caption, parse_mode=ParseMode.MARKDOWN, has_spoiler=True)
+        return InputMediaDocument(media=media, caption=item.caption, parse_mode=ParseMode.MARKDOWN)
+    
+    async def handle_cancel(self, message: Message, user_lang: Language = Language.ENGLISH):
+        """Handler for /cancel command: cancel all queued and running uploads of the user"""
+        cancelled = 0
+        for job in self.bot.jobs.user_jobs(message.from_user.id):
+            if await self._cancel_job(job):
+                cancelled += 1
+        
+        if cancelled:
+            await message.answer(translator.get("jobs_cancelled", user_lang, count=cancelled))
+        else:
+            await message.answer(translator.get("no_active_jobs", user_lang))
+    
+    async def handle_queue(self, message: Message, user_lang: Language = Language.ENGLISH):
+        """Handler for /queue command: show the user's running and queued uploads"""
         user_id = message.from_user.id
-        chat_id = message.chat.id
         config = await get_config()
+        
+        running, waiting = self.bot.jobs.user_queue(user_id)
+        if not running and not waiting:
+            await message.answer(translator.get("no_active_jobs", user_lang))
+            return
+        
+        lines = [translator.get("queue_running", user_lang, host=urlparse(job.url).hostname) for job in running]
+        lines.extend(
+            translator.get("queue_waiting", user_lang, position=position, host=urlparse(job.url).hostname)
+            for position, job in enumerate(waiting, 1)
+        )
+        concurrency, queue_depth = config.get_job_limits(user_id)
+        await message.answer(translator.get(
+            "queue_status", user_lang,
+            tier=config.get_user_tier(user_id),
+            concurrency=concurrency,
+            queue_depth=queue_depth,
+            jobs="\n".join(lines)
+        ))
+    
+    async def handle_cancel_callback(self, callback: CallbackQuery):
+        """Handler for the cancel button on a status message"""
+        config = await get_config()
+        user_id = callback.from_user.id
         user_lang = config.get_user_language(user_id)
         
-        # Send status message
-        status_text = translator.get("upload_started", user_lang)
-        status_msg = await message.answer(status_text)
+        # The button cancels one job, or every remaining job of a batch
+        target = callback.data[len(CANCEL_PREFIX):]
+        job = self.bot.jobs.pending.get(target)
+        targets = [job] if job is not None else self.bot.jobs.batch_jobs(target)
+        is_admin = get_snapshot().is_admin(user_id)
+        cancelled = 0
+        for job in targets:
+            if (job.user_id == user_id or is_admin) and await self._cancel_job(job):
+                cancelled += 1
+        if not cancelled:
+            await callback.answer(translator.get("no_active_jobs", user_lang))
+            return
+        await callback.answer(translator.get("upload_cancelled", user_lang))
+    
+    async def _cancel_job(self, job: Job) -> bool:
+        """Cancel a job; running jobs clean up in run_job, queued ones here"""
+        outcome = self.bot.jobs.cancel(job.job_id)
+        if outcome == QUEUED:
+            recent_requests.release(request_key(job.user_id, job.url), False)
+            await self._finish_cancelled(job)
+        return outcome is not None
+    
+    async def _finish_cancelled(self, job: Job):
+        """Delete the partial file, count the cancellation and update the status message"""
+        if job.filepath and Path(job.filepath).exists():
+            Path(job.filepath).unlink()
+        
+        config = await get_config()
+        config.increment_cancelled()
+        logger.info("Upload cancelled [%s] by user %s", job.job_id, job.user_id)
+        if job.batch_id:
+            return  # The batch summary replaces the shared status message
+        try:
+            await self.bot.edit_message(
+                chat_id=job.chat_id,
+                message_id=job.status_message_id,
+                text=translator.get("upload_cancelled", config.get_user_language(job.user_id))
+            )
+        except Exception:
+            pass  # Already logged by edit_message
+    
+    @staticmethod
+    def _cancel_markup(job_id: str, user_lang: Language) -> InlineKeyboardMarkup:
+        return InlineKeyboardMarkup(inline_keyboard=[[
+            InlineKeyboardButton(text=translator.get("cancel_button", user_lang), callback_data=CANCEL_PREFIX + job_id)
+        ]])
+    
+    async def _run_upload(self, job: Job) -> str:
+        """
+        Download and send one file; returns the job state: DONE, FAILED or
+        DELIVERING (batch file handed to the album buffer, marked done once sent)
+        """
+        user_id = job.user_id
+        chat_id = job.chat_id
+        url = job.url
+        config = await get_config()
+        user_lang = config.get_user_language(user_id)
+        
+        # Batches share one status message, replaced once by complete_batch
+        if not job.batch_id and job.attempts > 1:
+            # Picked up again after a restart
+            await self.bot.edit_message(
+                chat_id=chat_id,
+                message_id=job.status_message_id,
+                text=translator.get("upload_resumed", user_lang),
+                reply_markup=self._cancel_markup(job.job_id, user_lang)
+            )
+        elif job.job_id in self.bot.jobs.queued_notices:
+            # Waited in the user's queue; the status message still shows its position
+            await self.bot.edit_message(
+                chat_id=chat_id,
+                message_id=job.status_message_id,
+                text=translator.get("upload_started", user_lang),
+                reply_markup=self._cancel_markup(job.job_id, user_lang)
+            )
+        throughput.record(started=1)
+        job_started = time.monotonic()
+        trace = tracer.start("upload", user_id=user_id, host=urlparse(url).hostname, queue_job=job.job_id)
         
         try:
             # Check URL
@@ -118,27 +466,205 @@ class UserHandlers:
                 error_msg = translator.get("invalid_url", user_lang)
                 raise Exception(error_msg)
             
-            # Check rate limit
-            allowed, error_message = config.check_rate_limit(user_id)
+            # Check required channels (cached, usually no API call)
+            snapshot = get_snapshot()
+            if snapshot.required_channels and not snapshot.is_admin(user_id):
+                with latency.time("membership"), tracer.span("membership"):
+                    missing = await self.bot.membership.missing_channels(user_id, snapshot.required_channels)
+                if missing:
+                    raise Exception(translator.get("join_required", user_lang, channels=", ".join(missing)))
+            
+            # Check quota (message rate limit is already applied by middleware)
+            with latency.time("quota"), tracer.span("quota"):
+                allowed, error_message = config.check_quota(user_id)
             if not allowed:
                 raise Exception(error_message)
             
+            # Small photos and documents: Telegram fetches the URL itself
+            probe = None
+            if env_config.enable_url_fetch and not job.batch_id:
+                with tracer.span("probe"):
+                    probe = await self.bot.download_manager.probe(url)
+                file_size = await self._send_by_url(job, config, probe)
+                if file_size is not None:
+                    throughput.record(finished=1)
+                    config.increment_statistics(user_id, file_size)
+                    await config.save()
+                    await self.bot.delete_message(chat_id, job.status_message_id)
+                    latency.observe("job", time.monotonic() - job_started)
+                    trace.set(bytes=file_size, url_fetch=True)
+                    tracer.finish(trace)
+                    logger.info("Successful upload by URL [%s] by user %s", trace.job_id, user_id)
+                    return DONE
+            
             # Download file
-            filepath = await self.bot.download_manager.download_file(url, user_id)
+            filepath = await self.bot.download_manager.download_file(
+                url, user_id, job_id=job.job_id,
+                on_progress=lambda path, size, validator: self.bot.jobs.checkpoint(job, size, str(path), validator),
+                probe=probe,
+                validator=job.validator
+            )
             
             if not filepath:
                 error_msg = translator.get("network_error", user_lang)
                 raise Exception(error_msg)
             
             # Generate caption
-            caption = await self._generate_caption(filepath.name, url, user_id)
+            with latency.time("caption"), tracer.span("generate_caption"):
+                caption = await self._generate_caption(filepath.name, url, user_id)
             
             # Determine file type
             file_type = self._get_file_type(filepath.name)
+            file_size = filepath.stat().st_size
+            
+            # Over the Telegram upload limit (or CDN mode): reply with a signed, expiring link
+            cdn = self.bot.cdn
+            if cdn and config.use_cdn(file_size) and cdn.accepts(file_size):
+                await self._send_cdn_link(job, filepath, caption, user_lang)
+                throughput.record(finished=1)
+                config.increment_statistics(user_id, file_size)
+                await config.save()
+                if job.batch_id:
+                    self.bot.albums.sent_alone(job)
+                else:
+                    await self.bot.delete_message(chat_id, job.status_message_id)
+                latency.observe("job", time.monotonic() - job_started)
+                trace.set(bytes=file_size, cdn=True)
+                tracer.finish(trace)
+                logger.info("Successful CDN delivery [%s]: file %s by user %s", trace.job_id, filepath.name, user_id)
+                return DONE
+            
+            if job.batch_id:
+                # Sent later with the rest of the batch, up to 10 files per album
+                self.bot.albums.add(AlbumItem(job, filepath, caption, file_type))
+                latency.observe("job", time.monotonic() - job_started)
+                tracer.finish(trace)
+                return DELIVERING
             
             # Send file based on type
+            upload_started = time.monotonic()
+            await self._send_file(chat_id, filepath, caption, file_type)
+            
+            upload_time = time.monotonic() - upload_started
+            latency.observe("upload", upload_time)
+            
+            # Update statistics
+            throughput.record(
+                finished=1,
+                bytes_out=file_size,
+                upload_time=upload_time,
+                uploads=1
+            )
+            with tracer.span("stat_update"):
+                config.increment_statistics(user_id, file_size)
+                await config.save()
+            
+            with latency.time("cleanup"), tracer.span("cleanup"):
+                # Delete status message
+                await self.bot.delete_message(chat_id, job.status_message_id)
+                
+                # Delete temporary file
+                filepath.unlink()
+            
+            latency.observe("job", time.monotonic() - job_started)
+            trace.set(bytes=file_size)
+            tracer.finish(trace)
+            logger.info("Successful upload [%s]: file %s by user %s", trace.job_id, filepath.name, user_id)
+            return DONE
+            
+        except asyncio.CancelledError:
+            # /cancel or shutdown; the trace is kept like a failure
+            tracer.finish(trace, status="cancelled")
+            raise
+        except Exception as e:
+            throughput.record(failed=1)
+            metrics.count_error("job")
+            latency.observe("job_failed", time.monotonic() - job_started)
+            tracer.finish(trace, error=e)
+            
+            # Failed jobs are not resumed: drop the partial file
+            if job.filepath and Path(job.filepath).exists():
+                Path(job.filepath).unlink()
+            
+            if job.batch_id:
+                self.bot.albums.fail(job, str(e))
+            else:
+                # Edit status message to error
+                await self.bot.edit_message(
+                    chat_id=chat_id,
+                    message_id=job.status_message_id,
+                    text=f"❌ {str(e)}"
+                )
+            logger.error("Upload error [%s] for user %s: %s", trace.job_id, user_id, e)
+            return FAILED
+    
+    async def _send_by_url(self, job: Job, config, probe: ProbeResult) -> Optional[int]:
+        """
+        Send a small photo or PDF/ZIP/GIF document by URL so Telegram downloads it
+        instead of us. Returns the file size when sent, None to use the normal path.
+        """
+        extension = probe.filename.lower()[probe.filename.rfind('.'):]
+        if probe.size and extension in URL_FETCH_PHOTO_EXTENSIONS and probe.size <= URL_FETCH_PHOTO_LIMIT:
+            send, file_type = self.bot.send_photo, 'image'
+        elif probe.size and extension in URL_FETCH_DOCUMENT_EXTENSIONS and probe.size <= URL_FETCH_DOCUMENT_LIMIT:
+            send, file_type = self.bot.send_document, 'document'
+        else:
+            return None
+        
+        # Reserve the bytes before sending (like a download) so concurrent jobs cannot overshoot the quota
+        allowed, error_message = config.check_quota(job.user_id, probe.size)
+        if not allowed:
+            raise Exception(error_message)
+        config.reserve_quota(job.user_id, probe.size)
+        try:
+            with latency.time("caption"), tracer.span("generate_caption"):
+                caption = await self._generate_caption(
+                    f"{job.user_id}_{job.job_id}_{probe.filename}", job.url, job.user_id, file_size=probe.size
+                )
+            extra = {'has_spoiler': True} if file_type == 'image' else {}
+            started = time.monotonic()
+            try:
+                with tracer.span("telegram_send_url", file_type=file_type, bytes=probe.size):
+                    await send(job.chat_id, job.url, caption=caption, parse_mode=ParseMode.MARKDOWN, **extra)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                # Telegram could not fetch or accept the URL: download and upload it ourselves
+                url_fetches.inc("fallback")
+                logger.info("Telegram rejected URL fetch [%s], falling back to download: %s", job.job_id, e)
+                return None
+        finally:
+            config.release_quota(job.user_id, probe.size)
+        
+        latency.observe("url_fetch", time.monotonic() - started)
+        url_fetches.inc("sent")
+        # Counts toward the byte quota like a normal upload, without using a download slot
+        config.charge_quota(job.user_id, probe.size, 0)
+        return probe.size
+    
+    async def _send_cdn_link(self, job: Job, filepath: Path, caption: str, user_lang: Language):
+        """Move the downloaded file to CDN storage and send its signed link"""
+        name = filepath.name
+        with latency.time("cdn_publish"), tracer.span("cdn_publish"):
+            link = await self.bot.cdn.publish(filepath, '_'.join(name.split('_')[2:]) or name)
+        expires = datetime.fromtimestamp(link.expires, timezone.utc).strftime("%Y-%m-%d %H:%M")
+        text = translator.get("cdn_link", user_lang, expires=expires)
+        markup = InlineKeyboardMarkup(inline_keyboard=[[
+            InlineKeyboardButton(text=translator.get("cdn_download", user_lang), url=link.url)
+        ]])
+        await self.bot.send_message(
+            job.chat_id,
+            f"{caption}\n\n{text}" if caption else text,
+            parse_mode=ParseMode.MARKDOWN,
+            reply_markup=markup
+        )
+    
+    async def _send_file(self, chat_id: int, filepath: Path, caption: str, file_type: str):
+        """Send one downloaded file based on its type"""
+        with tracer.span("telegram_send", file_type=file_type) as span:
             async with aiofiles.open(filepath, 'rb') as file:
                 file_data = await file.read()
+                span.set(bytes=len(file_data))
                 
                 if file_type == 'image':
                     await self.bot.send_photo(
@@ -163,34 +689,12 @@ class UserHandlers:
                         caption=caption,
                         parse_mode=ParseMode.MARKDOWN
                     )
-            
-            # Update statistics
-            file_size = filepath.stat().st_size
-            config.increment_request_count(user_id)
-            config.increment_statistics(user_id, file_size)
-            await config.save()
-            
-            # Delete status message
-            await self.bot.delete_message(chat_id, status_msg.message_id)
-            
-            # Delete temporary file
-            filepath.unlink()
-            
-            logger.info(f"Successful upload: file {filepath.name} by user {user_id}")
-            
-        except Exception as e:
-            # Edit status message to error
-            await self.bot.edit_message_text(
-                chat_id=chat_id,
-                message_id=status_msg.message_id,
-                text=f"❌ {str(e)}"
-            )
-            logger.error(f"Upload error: {e}")
     
-    async def _generate_caption(self, filename: str, url: str, user_id: int) -> str:
-        """Generate caption for file"""
+    async def _generate_caption(self, filename: str, url: str, user_id: int,
+                                file_size: Optional[int] = None) -> str:
+        """Generate caption for file (size from file_size or the temp file)"""
         config = await get_config()
-        display = config.display_settings
+        display = get_snapshot().display
         user_lang = config.get_user_language(user_id)
         
         # Extract original filename
@@ -199,7 +703,8 @@ class UserHandlers:
         # Shorten link if needed
         source_url = url
         if display.enable_short_link and display.show_source_url:
-            source_url = await self.bot.shortlink_service.shorten_url(url)
+            with latency.time("shortlink"), tracer.span("shortlink", service=display.short_link_service):
+                source_url = await self.bot.shortlink_service.shorten_url(url)
         
         caption_parts = []
         
@@ -212,8 +717,8 @@ class UserHandlers:
             # Calculate file size
             try:
                 filepath = Path("temp") / filename
-                if filepath.exists():
-                    size_mb = filepath.stat().st_size / (1024 * 1024)
+                if file_size is not None or filepath.exists():
+                    size_mb = (filepath.stat().st_size if file_size is None else file_size) / (1024 * 1024)
                     caption_parts.append(f"💾 **Size:** {size_mb:.2f} MB")
                     if user_lang == Language.PERSIAN:
                         caption_parts[-1] = f"💾 **حجم فایل:** {size_mb:.2f} مگابایت"
@@ -238,11 +743,8 @@ class UserHandlers:
         
         return "\n".join(caption_parts)
     
-    async def handle_support(self, message: Message):
+    async def handle_support(self, message: Message, user_lang: Language = Language.ENGLISH):
         """Handler for /support command"""
-        config = await get_config()
-        user_lang = config.get_user_language(message.from_user.id)
-        
         support_text = (
             f"📞 **Support**\n\n"
             f"👤 **Support:** {env_config.support_username}\n\n"
@@ -274,21 +776,21 @@ class UserHandlers:
         
         await message.answer(support_text, parse_mode=ParseMode.MARKDOWN)
     
-    async def handle_status(self, message: Message):
+    async def handle_status(self, message: Message, user_lang: Language = Language.ENGLISH, is_admin: bool = False):
         """Handler for /status command"""
         config = await get_config()
-        display = config.display_settings
+        snapshot = get_snapshot()
+        display = snapshot.display
         stats = config.statistics
-        user_lang = config.get_user_language(message.from_user.id)
         
         channels_status = "❌ inactive"
-        if config.required_channels:
-            channels_status = f"✅ {len(config.required_channels)} channels"
+        if snapshot.required_channels:
+            channels_status = f"✅ {len(snapshot.required_channels)} channels"
         
         if user_lang == Language.PERSIAN:
             channels_status = "❌ غیرفعال"
-            if config.required_channels:
-                channels_status = f"✅ {len(config.required_channels)} کانال"
+            if snapshot.required_channels:
+                channels_status = f"✅ {len(snapshot.required_channels)} کانال"
         
         status_text = (
             f"📊 **Bot Status**\n\n"
@@ -341,21 +843,50 @@ class UserHandlers:
                 status_text += f"• متن کپی رایت: {display.copyright_text}\n"
         
         # If user is admin
-        if config.is_admin(message.from_user.id):
+        if is_admin:
             status_text += "\n👑 **You are admin**\nUse admin commands"
             if user_lang == Language.PERSIAN:
                 status_text += "\n👑 **شما ادمین هستید**\nاز دستورات مدیریتی استفاده کنید"
+            
+            lag = loop_monitor.lag_summary(900)
+            lag_values = (
+                f"{lag['p50'] * 1000:.0f} / {lag['p95'] * 1000:.0f} / "
+                f"{lag['p99'] * 1000:.0f} / {lag['max'] * 1000:.0f} ms"
+            )
+            if user_lang == Language.PERSIAN:
+                status_text += (
+                    f"\n\n⏱ **تأخیر حلقه رویداد (۱۵ دقیقه، p50/p95/p99/max):** {lag_values}\n"
+                    f"🧱 **مسدود شدن‌ها:** {loop_monitor.blocked_count}"
+                )
+            else:
+                status_text += (
+                    f"\n\n⏱ **Event loop lag (15m, p50/p95/p99/max):** {lag_values}\n"
+                    f"🧱 **Loop blocks:** {loop_monitor.blocked_count}"
+                )
         
         await message.answer(status_text, parse_mode=ParseMode.MARKDOWN)
     
-    async def handle_user_stats(self, message: Message):
+    async def handle_chat_member(self, update: ChatMemberUpdated):
+        """Keep the membership cache in sync with join/leave updates from required channels"""
+        chat = update.chat
+        channel = f"@{chat.username}" if chat.username else str(chat.id)
+        member = update.new_chat_member
+        self.bot.membership.on_member_update(
+            channel,
+            member.user.id,
+            str(getattr(member.status, 'value', member.status)),
+            getattr(member, 'is_member', None)
+        )
+    
+    async def handle_user_stats(self, message: Message, user_lang: Language = Language.ENGLISH):
         """Handler for /mystats command"""
         user_id = message.from_user.id
         config = await get_config()
         stats = config.statistics
-        user_lang = config.get_user_language(user_id)
         
         user_downloads = stats.user_activity.get(str(user_id), 0)
+        position = config.leaderboard.rank(str(user_id))
+        position_text = f"#{position} / {len(config.leaderboard)}" if position else "-"
         
         # Determine rank
         if user_downloads > 10:
@@ -377,12 +908,21 @@ class UserHandlers:
             else:
                 rank = "👶 تازه‌وارد"
         
+        # Quota usage
+        limits = config.get_quota_limits(user_id)
+        usage = config.get_quota_usage(user_id)
+        quota_today = f"{usage['daily_bytes'] / 1024 / 1024:.1f}/{limits['daily_bytes'] / 1024 / 1024:.0f} MB"
+        quota_hour = f"{usage['hourly_bytes'] / 1024 / 1024:.1f}/{limits['hourly_bytes'] / 1024 / 1024:.0f} MB"
+        
         user_stats = (
             f"📈 **Your Statistics**\n\n"
             f"👤 **Your ID:** `{user_id}`\n"
             f"📥 **Downloads:** {user_downloads}\n"
             f"🏆 **Your rank:** {rank}\n"
+            f"📊 **Leaderboard position:** {position_text}\n"
             f"📅 **Last activity:** {stats.last_active}\n"
+            f"📦 **Quota today:** {quota_today}\n"
+            f"⏱ **Quota this hour:** {quota_hour}\n"
             f"🤖 **Bot:** @irprolinkbot\n\n"
             f"💡 **Tip:**\n"
             f"Use /status for full bot statistics"
@@ -394,7 +934,10 @@ class UserHandlers:
                 f"👤 **آیدی شما:** `{user_id}`\n"
                 f"📥 **تعداد دانلودها:** {user_downloads}\n"
                 f"🏆 **رتبه شما:** {rank}\n"
+                f"📊 **جایگاه در جدول کاربران:** {position_text}\n"
                 f"📅 **آخرین فعالیت:** {stats.last_active}\n"
+                f"📦 **سهمیه امروز:** {quota_today}\n"
+                f"⏱ **سهمیه این ساعت:** {quota_hour}\n"
                 f"🤖 **ربات:** @irprolinkbot\n\n"
                 f"💡 **نکته:**\n"
                 f"برای مشاهده آمار کامل ربات از /status استفاده کنید"
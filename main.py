@@ -22,17 +22,18 @@ except Exception:
 sys.path.insert(0, str(Path(__file__).parent))
 
 from bot.bot import TelegramBot
+from bot.supervisor import Supervisor
 from config import env_config
+from utils.logging_setup import setup_logging, stop_logging
 from version import get_version, get_release_year
 
-# Logging configuration
-logging.basicConfig(
-    level=logging.INFO,
-    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
-    handlers=[
-        logging.FileHandler('logs/bot.log', encoding='utf-8'),
-        logging.StreamHandler()
-    ]
+# Logging configuration (records are written by a background thread)
+setup_logging(
+    level=env_config.log_level,
+    enable_file_logging=env_config.enable_file_logging,
+    max_bytes=env_config.log_max_bytes,
+    backup_count=env_config.log_backup_count,
+    rotate_when=env_config.log_rotate_when
 )
 
 logger = logging.getLogger(__name__)
@@ -53,6 +54,10 @@ async def main():
     if not env_config.validate():
         sys.exit(1)
     
+    if env_config.workers > 1:
+        await run_supervisor()
+        return
+    
     bot = None
     try:
         # Create bot instance
@@ -65,7 +70,7 @@ async def main():
         logger.info("Bot setup completed successfully")
         
         # Run bot
-        logger.info("Bot starting polling...")
+        logger.info("Bot starting (%s)...", env_config.bot_mode)
         await bot.run()
         
     except KeyboardInterrupt:
@@ -94,6 +99,18 @@ async def main():
             except Exception as e:
                 logger.error(f"Error during shutdown: {e}")
 
+async def run_supervisor():
+    """Run N worker processes and route updates to them by user ID"""
+    supervisor = Supervisor(env_config, env_config.workers, queue_size=env_config.worker_queue_size)
+    try:
+        logger.info("Starting %s workers (%s)...", env_config.workers, env_config.bot_mode)
+        await supervisor.run()
+    except (KeyboardInterrupt, asyncio.CancelledError):
+        logger.info("Supervisor stopped.")
+    finally:
+        logger.info("Shutting down workers...")
+        await supervisor.shutdown()
+
 if __name__ == "__main__":
     # Create necessary directories
     Path("logs").mkdir(exist_ok=True)
@@ -107,3 +124,4 @@ if __name__ == "__main__":
         pass
     finally:
         loop.close()
+        stop_logging()
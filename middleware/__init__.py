@@ -2,7 +2,10 @@
 ماژول middleware
 """
 
-from .rate_limit import RateLimitMiddleware
-from .admin import AdminMiddleware
+from .dispatch import PreDispatchMiddleware, COMMAND_TABLE, parse_command
+from .outbound import OutboundGovernor, outbound_priority, INTERACTIVE, DELIVERY, PROGRESS, BULK
 
-__all__ = ['RateLimitMiddleware', 'AdminMiddleware']
+__all__ = [
+    'PreDispatchMiddleware', 'COMMAND_TABLE', 'parse_command',
+    'OutboundGovernor', 'outbound_priority', 'INTERACTIVE', 'DELIVERY', 'PROGRESS', 'BULK',
+]
@@ -0,0 +1,112 @@
+"""
+Middleware یکپارچه پیش از dispatch: update تکراری، محدودیت نرخ، تشخیص دستور و دسترسی ادمین در یک مرحله
+
+نتیجه در data قرار می‌گیرد و هندلرها آن را به صورت پارامتر (هم‌نام) دریافت می‌کنند:
+    is_admin      ادمین بودن کاربر
+    command       نام دستور بدون / و @bot (None برای پیام غیر دستوری)
+    command_args  متن بعد از نام دستور ("" اگر نباشد)
+    user_lang     زبان کاربر (Language)؛ فقط برای هندلرهایی که این پارامتر را دارند
+
+بنچمارک: benchmarks/dispatch.py
+"""
+
+from collections import namedtuple
+from types import MappingProxyType
+from typing import Callable, Dict, Any, Awaitable, Mapping, Optional, Tuple
+from aiogram import BaseMiddleware
+from aiogram.types import Message
+
+from config import get_config, get_snapshot
+from utils.histogram import latency
+from utils.dedupe import recent_requests
+
+CommandInfo = namedtuple('CommandInfo', ['name', 'admin_only'])
+
+USER_COMMANDS = (
+    'start', 'help', 'upload', 'support', 'status', 'mystats', 'cancel', 'queue',
+)
+
+ADMIN_COMMANDS = (
+    'addchannel', 'removechannel', 'listchannels',
+    'addadmin', 'removeadmin', 'listadmins',
+    'displayconfig', 'togglefilename', 'togglefilesize',
+    'togglesourceurl', 'toggleuserid', 'togglecopyright',
+    'toggleshortlink', 'setcopyright', 'setshortlinkservice',
+    'saveconfig', 'broadcast', 'fullstats', 'resetstats',
+    'security', 'blockhost', 'allowhost', 'removehost', 'listhosts',
+    'setquota', 'resetquota', 'quota', 'settier', 'deliverymode',
+    'latency', 'profile',
+)
+
+# جدول ثابت دستورات (یک جستجوی dict به جای پیمایش لیست)
+COMMAND_TABLE: Mapping[str, CommandInfo] = MappingProxyType({
+    **{name: CommandInfo(name, False) for name in USER_COMMANDS},
+    **{name: CommandInfo(name, True) for name in ADMIN_COMMANDS},
+})
+
+def parse_command(text: Optional[str]) -> Tuple[Optional[str], str]:
+    """استخراج (نام دستور، آرگومان‌ها) از متن پیام؛ برای پیام غیر دستوری (None, "")"""
+    if not text or text[0] != '/':
+        return None, ""
+    parts = text[1:].split(maxsplit=1)
+    if not parts:
+        return None, ""
+    name = parts[0].split('@', 1)[0].lower()
+    return name, parts[1] if len(parts) > 1 else ""
+
+class PreDispatchMiddleware(BaseMiddleware):
+    """یک مرحله برای هر پیام: محدودیت نرخ، دستور، ادمین و زبان کاربر"""
+
+    async def __call__(
+        self,
+        handler: Callable[[Message, Dict[str, Any]], Awaitable[Any]],
+        event: Message,
+        data: Dict[str, Any]
+    ) -> Any:
+        # بررسی اینکه آیا پیام از کاربر است
+        if not event.from_user:
+            return await handler(event, data)
+
+        # update تکراری (ارسال مجدد توسط تلگرام) قبل از هر کاری حذف می‌شود
+        update = data.get('event_update')
+        if update is not None and recent_requests.seen_update(update.update_id):
+            return
+        
+        user_id = event.from_user.id
+        snapshot = get_snapshot()
+        # تنظیمات قابل تغییر فقط برای محدودیت نرخ و زبان کاربر لازم است
+        config = None
+
+        # بررسی محدودیت نرخ
+        if snapshot.security.enable_rate_limit:
+            config = await get_config()
+            with latency.time("rate_limit"):
+                allowed, error_message = config.check_rate_limit(user_id)
+            if not allowed:
+                await event.answer(error_message)
+                return
+            config.increment_request_count(user_id)
+
+        command, command_args = parse_command(event.text)
+        is_admin = snapshot.is_admin(user_id)
+
+        # بررسی دسترسی فقط برای دستورات ادمین
+        if command is not None:
+            info = COMMAND_TABLE.get(command)
+            if info is not None and info.admin_only and not is_admin:
+                await event.answer("⛔ دسترسی ممنوع! این دستور فقط برای ادمین‌ها قابل استفاده است.")
+                return
+
+        data['is_admin'] = is_admin
+        data['command'] = command
+        data['command_args'] = command_args
+
+        handler_object = data.get('handler')
+        if handler_object is None or 'user_lang' in handler_object.params:
+            if config is None:
+                config = await get_config()
+            data['user_lang'] = config.get_user_language(user_id)
+
+        # ادامه پردازش
+        return await handler(event, data)
+
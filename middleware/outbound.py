@@ -0,0 +1,281 @@
+"""
+زمان‌بند درخواست‌های خروجی به API تلگرام (request middleware روی session ربات)
+
+همه فراخوانی‌های API از اینجا می‌گذرند:
+- ارسال و ویرایش پیام از دو token bucket رد می‌شود: سراسری (~۳۰ پیام در ثانیه) و هر چت
+  (~۱ پیام در ثانیه در چت خصوصی، ۲۰ در دقیقه در گروه)؛ آلبوم (sendMediaGroup) به تعداد فایل‌هایش توکن می‌گیرد
+- درخواست‌های منتظر به ترتیب اولویت توکن می‌گیرند: پاسخ به کاربر، ارسال فایل،
+  ویرایش پیام وضعیت، پیام همگانی و گزارش آمار
+- خطای TelegramRetryAfter (429) باعث توقف همان چت و تلاش دوباره می‌شود، نه شکست آپلود؛
+  اگر درخواست چت ندارد یا زمان انتظار از فاصله پیام‌های چت بیشتر است، bucket سراسری هم متوقف می‌شود
+- ویرایش‌های متوالی یک پیام که هنوز ارسال نشده‌اند یکی می‌شوند (فقط آخرین متن ارسال می‌شود)
+
+اولویت با outbound_priority برای یک بخش کد (و تسک‌های ساخته شده در آن) تعیین می‌شود:
+
+    with outbound_priority(DELIVERY):
+        await bot.send_document(...)
+"""
+
+import asyncio
+import heapq
+import itertools
+import logging
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Any, Dict, List, Optional, Tuple
+
+from aiogram.client.session.middlewares.base import BaseRequestMiddleware
+from aiogram.exceptions import TelegramRetryAfter
+
+from utils.histogram import latency
+
+logger = logging.getLogger(__name__)
+
+# سطوح اولویت (عدد کمتر = زودتر)
+INTERACTIVE = 0  # پاسخ به دستور یا پیام کاربر
+DELIVERY = 1  # ارسال فایل‌های آپلود
+PROGRESS = 2  # ویرایش پیام وضعیت
+BULK = 3  # پیام همگانی و گزارش‌های حجیم ادمین
+
+PRIORITY_NAMES = {INTERACTIVE: 'interactive', DELIVERY: 'delivery', PROGRESS: 'progress', BULK: 'bulk'}
+
+# متدهایی که در محدودیت پیام تلگرام حساب می‌شوند
+GOVERNED_PREFIXES = ('send', 'edit', 'copy', 'forward')
+
+CHAT_BURST = 3  # پیام پشت سر هم در یک چت پیش از اعمال نرخ
+MAX_CHAT_BUCKETS = 1000  # بالاتر از این، bucket چت‌های بیکار حذف می‌شوند
+
+_priority: ContextVar[int] = ContextVar('outbound_priority', default=INTERACTIVE)
+
+@contextmanager
+def outbound_priority(level: int):
+    """اولویت درخواست‌های API در این بخش کد"""
+    token = _priority.set(level)
+    try:
+        yield
+    finally:
+        _priority.reset(token)
+
+class PriorityBucket:
+    """
+    token bucket با صف اولویت‌دار؛ منتظرها به ترتیب (اولویت، زمان ورود) توکن می‌گیرند
+    درخواست با هزینه بیشتر از ظرفیت با ظرفیت کامل پذیرفته می‌شود و بقیه هزینه را بدهکار می‌ماند
+    """
+
+    def __init__(self, rate: float, burst: float):
+        self.rate = rate
+        self.capacity = burst
+        self.paused_until = 0.0
+        self._tokens = burst
+        self._updated = time.monotonic()
+        self._waiters: List[Tuple[int, int, asyncio.Future, float]] = []
+        self._seq = itertools.count()
+        self._pump: Optional[asyncio.Task] = None
+
+    @property
+    def waiting(self) -> int:
+        return len(self._waiters)
+
+    def waiting_by_priority(self) -> Dict[int, int]:
+        counts: Dict[int, int] = {}
+        for priority, _, future, _ in self._waiters:
+            if not future.done():
+                counts[priority] = counts.get(priority, 0) + 1
+        return counts
+
+    def idle(self) -> bool:
+        """بدون منتظر و با توکن کامل (قابل حذف)"""
+        return not self._waiters and self._refill() >= self.capacity
+
+    def pause(self, seconds: float):
+        """توقف تا پایان retry_after تلگرام (توکن‌ها از آن زمان دوباره پر می‌شوند)"""
+        self.paused_until = max(self.paused_until, time.monotonic() + seconds)
+        self._tokens = 0
+        self._updated = self.paused_until
+
+    async def acquire(self, priority: int, cost: float = 1):
+        """برداشتن `cost` توکن؛ در صورت نیاز به ترتیب اولویت صبر می‌کند"""
+        if not self._waiters and self._take(cost):
+            return
+        future = asyncio.get_event_loop().create_future()
+        heapq.heappush(self._waiters, (priority, next(self._seq), future, cost))
+        if self._pump is None or self._pump.done():
+            self._pump = asyncio.ensure_future(self._run())
+        await future
+
+    def _refill(self) -> float:
+        now = time.monotonic()
+        if now > self._updated:
+            self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+            self._updated = now
+        return self._tokens
+
+    def _take(self, cost: float = 1) -> bool:
+        if time.monotonic() < self.paused_until:
+            return False
+        if self._refill() >= min(cost, self.capacity):
+            self._tokens -= cost
+            return True
+        return False
+
+    async def _run(self):
+        """دادن توکن به منتظرها به ترتیب اولویت تا خالی شدن صف"""
+        while self._waiters:
+            _, _, future, cost = self._waiters[0]
+            if future.done():  # درخواست لغو شده
+                heapq.heappop(self._waiters)
+            elif self._take(cost):
+                heapq.heappop(self._waiters)
+                future.set_result(None)
+            else:
+                now = time.monotonic()
+                needed = min(cost, self.capacity) - self._tokens
+                await asyncio.sleep(max(self.paused_until - now, needed / self.rate, 0.001))
+
+class PendingEdit:
+    """ویرایش در انتظار توکن؛ ویرایش‌های بعدی همان پیام متن آن را جایگزین می‌کنند"""
+
+    __slots__ = ('method', 'future', 'sent')
+
+    def __init__(self, method, future: asyncio.Future):
+        self.method = method
+        self.future = future
+        self.sent = False
+
+class OutboundGovernor(BaseRequestMiddleware):
+    """نرخ سراسری و هر چت، اولویت، retry_after و یکی کردن ویرایش‌ها برای همه درخواست‌های ربات"""
+
+    def __init__(self, global_rate: float = 30, chat_rate: float = 1, group_rate: float = 20,
+                 max_retries: int = 3):
+        self.global_bucket = PriorityBucket(global_rate, global_rate)
+        self.chat_rate = chat_rate
+        self.group_rate = group_rate  # در دقیقه
+        self.max_retries = max_retries
+        self.retried = 0
+        self.coalesced = 0
+        self.throttled = 0
+        self._chats: Dict[Any, PriorityBucket] = {}
+        self._edits: Dict[tuple, PendingEdit] = {}
+
+    def configure(self, global_rate: float, chat_rate: float, group_rate: float, max_retries: int):
+        """اعمال نرخ‌های جدید (bucket چت‌ها با نرخ جدید از نو ساخته می‌شوند)"""
+        self.global_bucket.rate = self.global_bucket.capacity = global_rate
+        self.chat_rate = chat_rate
+        self.group_rate = group_rate
+        self.max_retries = max_retries
+        self._prune(force=True)
+
+    def waiting(self) -> Dict[str, int]:
+        """درخواست‌های منتظر توکن سراسری به تفکیک اولویت"""
+        counts = self.global_bucket.waiting_by_priority()
+        return {name: counts.get(level, 0) for level, name in PRIORITY_NAMES.items()}
+
+    async def __call__(self, make_request, bot, method):
+        api_method = method.__api_method__
+        chat_id = getattr(method, 'chat_id', None)
+        if not api_method.startswith(GOVERNED_PREFIXES):
+            return await self._send(make_request, bot, method, None)
+
+        priority = _priority.get()
+        if api_method.startswith('edit'):
+            priority = max(priority, PROGRESS)
+            message_id = getattr(method, 'message_id', None)
+            inline_id = getattr(method, 'inline_message_id', None)
+            if message_id is not None or inline_id is not None:
+                return await self._edit(make_request, bot, method, (api_method, chat_id, message_id, inline_id),
+                                        priority)
+
+        return await self._send(make_request, bot, method, priority)
+
+    async def _edit(self, make_request, bot, method, key: tuple, priority: int):
+        """ویرایش پیام؛ اگر ویرایش قبلی همین پیام هنوز منتظر است، جایگزین آن می‌شود"""
+        while True:
+            pending = self._edits.get(key)
+            if pending is None or pending.sent:
+                break
+            pending.method = method
+            self.coalesced += 1
+            try:
+                return await asyncio.shield(pending.future)
+            except asyncio.CancelledError:
+                if not pending.future.cancelled():
+                    raise  # خود این درخواست لغو شده است
+                # درخواست صاحب ویرایش پیش از ارسال لغو شد: این درخواست جای آن را می‌گیرد
+
+        pending = PendingEdit(method, asyncio.get_event_loop().create_future())
+        self._edits[key] = pending
+        try:
+            result = await self._send(make_request, bot, method, priority, pending)
+        except asyncio.CancelledError:
+            pending.future.cancel()
+            raise
+        except Exception as e:
+            pending.future.set_exception(e)
+            pending.future.exception()  # بدون منتظر هم هشدار "exception never retrieved" ندهد
+            raise
+        else:
+            pending.future.set_result(result)
+            return result
+        finally:
+            if self._edits.get(key) is pending:
+                del self._edits[key]
+
+    async def _send(self, make_request, bot, method, priority: Optional[int], pending: Optional[PendingEdit] = None):
+        """گرفتن توکن (چت و سراسری)، ارسال و تلاش دوباره پس از retry_after"""
+        chat = None
+        cost = 1
+        if priority is not None:
+            chat_id = getattr(method, 'chat_id', None)
+            chat = self._chat_bucket(chat_id) if chat_id is not None else None
+            if method.__api_method__ == 'sendMediaGroup':
+                cost = max(1, len(method.media))  # هر فایل آلبوم یک پیام حساب می‌شود
+
+        for attempt in range(self.max_retries + 1):
+            if priority is not None:
+                started = time.monotonic()
+                if chat is not None:
+                    await chat.acquire(priority, cost)
+                await self.global_bucket.acquire(priority, cost)
+                waited = time.monotonic() - started
+                if waited > 0.001:
+                    self.throttled += 1
+                    latency.observe("tg.outbound_wait", waited)
+            if pending is not None:
+                pending.sent = True
+                method = pending.method  # آخرین متن درخواست شده
+            try:
+                return await make_request(bot, method)
+            except TelegramRetryAfter as e:
+                if attempt >= self.max_retries:
+                    raise
+                self.retried += 1
+                logger.warning("محدودیت تلگرام در %s (چت %s): %s ثانیه صبر",
+                               method.__api_method__, getattr(method, 'chat_id', None), e.retry_after)
+                if priority is None:
+                    await asyncio.sleep(e.retry_after)
+                else:
+                    if chat is not None:
+                        chat.pause(e.retry_after)
+                    # 429 بدون چت، یا طولانی‌تر از فاصله پیام‌های چت، یعنی محدودیت سراسری ربات
+                    if chat is None or e.retry_after > 1 / chat.rate:
+                        self.global_bucket.pause(e.retry_after)
+                if pending is not None:
+                    pending.sent = False  # ویرایش‌های جدیدتر دوباره جایگزین می‌شوند
+
+    def _chat_bucket(self, chat_id) -> PriorityBucket:
+        bucket = self._chats.get(chat_id)
+        if bucket is None:
+            if len(self._chats) >= MAX_CHAT_BUCKETS:
+                self._prune()
+            is_group = isinstance(chat_id, str) or chat_id < 0
+            rate = self.group_rate / 60 if is_group else self.chat_rate
+            bucket = self._chats[chat_id] = PriorityBucket(rate, CHAT_BURST)
+        return bucket
+
+    def _prune(self, force: bool = False):
+        """حذف bucket چت‌های بیکار (با force همه bucket های بدون منتظر)"""
+        stale = [chat_id for chat_id, bucket in self._chats.items()
+                 if not bucket.waiting and (force or bucket.idle())]
+        for chat_id in stale:
+            del self._chats[chat_id]
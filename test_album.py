@@ -0,0 +1,100 @@
+#!/usr/bin/env python3
+"""
+Unit tests for batch albums (utils/album.py)
+"""
+
+import asyncio
+import sys
+import unittest
+from pathlib import Path
+from types import SimpleNamespace
+
+# Add project path to sys.path
+sys.path.insert(0, str(Path(__file__).parent))
+
+from utils.album import DOCUMENT, MAX_ALBUM_ITEMS, VISUAL, AlbumBuffer, AlbumItem, album_kind
+
+
+def _item(number, file_type, batch_id="b1"):
+    job = SimpleNamespace(job_id=f"j{number}", batch_id=batch_id, user_id=1, chat_id=1, status_message_id=10,
+                          url=f"https://example.com/{number}", created_at=float(number))
+    return AlbumItem(job, Path(f"{number}.bin"), f"caption {number}", file_type)
+
+
+class AlbumBufferTest(unittest.IsolatedAsyncioTestCase):
+    async def asyncSetUp(self):
+        self.events = []
+        self.completed = asyncio.Event()
+
+        async def deliver(batch, items):
+            await asyncio.sleep(0.01)  # complete must still wait for this
+            self.events.append(("deliver", [item.job.job_id for item in items]))
+            batch.delivered += len(items)
+
+        async def complete(batch):
+            self.events.append(("complete", batch.delivered, batch.failures))
+            self.completed.set()
+
+        self.albums = AlbumBuffer(deliver, complete)
+
+    def test_album_kind(self):
+        self.assertEqual([album_kind(file_type) for file_type in ('image', 'video', 'document', 'audio')],
+                         [VISUAL, VISUAL, DOCUMENT, DOCUMENT])
+
+    async def test_photos_and_videos_share_an_album_documents_do_not(self):
+        self.albums.open("b1", 1, 1, 10, total=4)
+        for number, file_type in enumerate(('image', 'document', 'video', 'document')):
+            self.albums.add(_item(number, file_type))
+        self.assertEqual(self.albums.buffered, 4)
+        self.assertEqual(self.albums.files(), {"0.bin", "1.bin", "2.bin", "3.bin"})
+
+        self.albums.close("b1")
+        await asyncio.wait_for(self.completed.wait(), 5)
+        self.assertCountEqual(self.events[:2], [("deliver", ["j0", "j2"]), ("deliver", ["j1", "j3"])])
+        self.assertEqual(self.events[2], ("complete", 4, []))
+        self.assertEqual(self.albums.buffered, 0)
+
+    async def test_full_album_is_sent_at_once(self):
+        self.albums.open("b1", 1, 1, 10, total=MAX_ALBUM_ITEMS + 1)
+        # added out of order: the album keeps the order of the links
+        for number in reversed(range(MAX_ALBUM_ITEMS)):
+            self.albums.add(_item(number, 'image'))
+        self.assertEqual(self.albums.buffered, 0)
+        await asyncio.sleep(0.05)
+        self.assertEqual(self.events, [("deliver", [f"j{number}" for number in range(MAX_ALBUM_ITEMS)])])
+
+        self.albums.add(_item(MAX_ALBUM_ITEMS, 'image'))
+        self.assertEqual(self.albums.buffered, 1)
+        self.albums.close("b1")
+        await asyncio.wait_for(self.completed.wait(), 5)
+        self.assertEqual(self.events[1:], [("deliver", [f"j{MAX_ALBUM_ITEMS}"]),
+                                           ("complete", MAX_ALBUM_ITEMS + 1, [])])
+
+    async def test_summary_counts_failures_and_files_sent_alone(self):
+        self.albums.open("b1", 1, 1, 10, total=3)
+        first, second, third = _item(0, 'image'), _item(1, 'image'), _item(2, 'document')
+        self.albums.add(first)
+        self.albums.fail(second.job, "too big")
+        self.albums.sent_alone(third.job)
+
+        self.albums.close("b1")
+        await asyncio.wait_for(self.completed.wait(), 5)
+        self.assertEqual(self.events, [("deliver", ["j0"]), ("complete", 2, [("https://example.com/1", "too big")])])
+
+    async def test_batch_recovered_after_restart(self):
+        # no open(): the batch is rebuilt from the job
+        self.albums.add(_item(0, 'document', batch_id="old"))
+        self.albums.close("old")
+        await asyncio.wait_for(self.completed.wait(), 5)
+        self.assertEqual(self.events, [("deliver", ["j0"]), ("complete", 1, [])])
+
+    async def test_stop_cancels_pending_deliveries(self):
+        self.albums.open("b1", 1, 1, 10, total=1)
+        self.albums.add(_item(0, 'image'))
+        self.albums.close("b1")
+        await self.albums.stop()
+        self.assertEqual(self.events, [])
+
+
+if __name__ == "__main__":
+    unittest.main()
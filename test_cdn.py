@@ -0,0 +1,100 @@
+#!/usr/bin/env python3
+"""
+Unit tests for CDN delivery links and storage cleanup (utils/cdn.py)
+"""
+
+import os
+import sys
+import tempfile
+import time
+import unittest
+from pathlib import Path
+from urllib.parse import parse_qs, unquote, urlsplit
+
+# Add project path to sys.path
+sys.path.insert(0, str(Path(__file__).parent))
+
+from utils.cdn import CDNDelivery, LocalStorage
+
+
+def _parse(link):
+    parts = urlsplit(link.url)
+    query = parse_qs(parts.query)
+    return unquote(parts.path.lstrip('/')), query['expires'][0], query['sig'][0]
+
+
+class CDNTestCase(unittest.TestCase):
+    def setUp(self):
+        self._tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self._tmp.cleanup)
+        self.root = Path(self._tmp.name) / "cdn"
+        self.storage = LocalStorage(str(self.root))
+        self.delivery = CDNDelivery(self.storage, "https://cdn.example.com/", "secret", link_ttl=100, max_bytes=100)
+
+    def _store(self, key, size, age):
+        path = self.root / key
+        path.parent.mkdir(parents=True, exist_ok=True)
+        path.write_bytes(b"x" * size)
+        mtime = time.time() - age
+        os.utime(path, (mtime, mtime))
+
+
+class SignedLinkTest(CDNTestCase):
+    def test_valid_link_verifies(self):
+        link = self.delivery.sign("abc/file.zip")
+        self.assertTrue(link.url.startswith("https://cdn.example.com/abc/file.zip?"))
+        self.assertTrue(self.delivery.verify(*_parse(link)))
+
+    def test_tampered_link_fails(self):
+        key, expires, sig = _parse(self.delivery.sign("abc/file.zip"))
+        self.assertFalse(self.delivery.verify(key, expires, sig[:-1] + ("0" if sig[-1] != "0" else "1")))
+        self.assertFalse(self.delivery.verify("abc/other.zip", expires, sig))
+        self.assertFalse(self.delivery.verify(key, str(int(expires) + 3600), sig))
+        self.assertFalse(self.delivery.verify(key, "never", sig))
+        # same secret is required
+        other = CDNDelivery(self.storage, "https://cdn.example.com", "other-secret")
+        self.assertFalse(other.verify(key, expires, sig))
+
+    def test_expired_link_fails(self):
+        expires = int(time.time()) - 1
+        # correctly signed, but past its expiry
+        self.assertFalse(self.delivery.verify("abc/file.zip", str(expires), self.delivery._signature("abc/file.zip", expires)))
+
+
+class LocalStorageTest(CDNTestCase):
+    def test_path_stays_inside_root(self):
+        self._store("abc/file.zip", 1, 0)
+        (Path(self._tmp.name) / "x").write_bytes(b"secret")
+        self.assertEqual(self.storage.path("abc/file.zip"), (self.root / "abc/file.zip").resolve())
+        self.assertIsNone(self.storage.path("../x"))
+        self.assertIsNone(self.storage.path("abc/../../x"))
+        self.assertIsNone(self.storage.path("abc/missing.zip"))
+        self.assertIsNone(self.storage.path("abc"))
+
+
+class CollectTest(CDNTestCase):
+    def test_expired_objects_go_first_then_oldest_over_limit(self):
+        self._store("old/expired.bin", 10, 200)
+        self._store("a/first.bin", 40, 50)
+        self._store("b/second.bin", 40, 30)
+        self._store("c/third.bin", 40, 10)
+
+        removed, freed = self.delivery._collect()
+
+        # expired file plus the oldest live one to get under 100 bytes
+        self.assertEqual((removed, freed), (2, 50))
+        self.assertCountEqual([obj.key for obj in self.storage.objects()], ["b/second.bin", "c/third.bin"])
+        self.assertEqual((self.delivery.stored_bytes, self.delivery.stored_objects, self.delivery.evicted), (80, 2, 2))
+        # empty per-file directories are removed as well
+        self.assertFalse((self.root / "old").exists())
+        self.assertFalse((self.root / "a").exists())
+
+    def test_nothing_removed_under_limit(self):
+        self._store("a/first.bin", 40, 50)
+        self._store("b/second.bin", 40, 30)
+        self.assertEqual(self.delivery._collect(), (0, 0))
+        self.assertEqual(len(self.storage.objects()), 2)
+
+
+if __name__ == "__main__":
+    unittest.main()
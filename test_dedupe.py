@@ -0,0 +1,63 @@
+#!/usr/bin/env python3
+"""
+Unit tests for duplicate update/link filtering (utils/dedupe.py)
+"""
+
+import sys
+import unittest
+from pathlib import Path
+from unittest import mock
+
+# Add project path to sys.path
+sys.path.insert(0, str(Path(__file__).parent))
+
+from utils.dedupe import RecentRequestFilter
+
+
+class RecentRequestFilterTest(unittest.TestCase):
+    def test_claim_blocks_same_link_while_active(self):
+        requests = RecentRequestFilter()
+        key = requests.claim(1, "https://example.com/file.zip")
+        self.assertIsNotNone(key)
+        self.assertIsNone(requests.claim(1, "https://EXAMPLE.com/file.zip"))
+        self.assertIsNotNone(requests.claim(2, "https://example.com/file.zip"))
+        self.assertEqual(requests.dropped_urls, 1)
+
+    def test_release_after_failure_allows_retry(self):
+        requests = RecentRequestFilter()
+        key = requests.claim(1, "https://example.com/a")
+        requests.release(key, succeeded=False)
+        self.assertIsNotNone(requests.claim(1, "https://example.com/a"))
+
+    def test_release_after_success_blocks_until_ttl(self):
+        requests = RecentRequestFilter(completed_ttl=30)
+        with mock.patch('utils.dedupe.time.monotonic', return_value=100.0):
+            key = requests.claim(1, "https://example.com/a")
+            requests.release(key, succeeded=True)
+            self.assertIsNone(requests.claim(1, "https://example.com/a"))
+        with mock.patch('utils.dedupe.time.monotonic', return_value=131.0):
+            self.assertIsNotNone(requests.claim(1, "https://example.com/a"))
+
+    def test_prune_keeps_active_entries(self):
+        requests = RecentRequestFilter(completed_ttl=1, max_entries=2)
+        with mock.patch('utils.dedupe.time.monotonic', return_value=10.0):
+            active = requests.claim(1, "https://example.com/active")
+            done = requests.claim(1, "https://example.com/done")
+            requests.release(done, succeeded=True)
+        with mock.patch('utils.dedupe.time.monotonic', return_value=20.0):
+            self.assertIsNotNone(requests.claim(1, "https://example.com/new"))
+            self.assertIsNone(requests.claim(1, "https://example.com/active"))
+        self.assertIsNotNone(active)
+
+    def test_seen_update_window(self):
+        requests = RecentRequestFilter(update_window=2)
+        self.assertFalse(requests.seen_update(1))
+        self.assertTrue(requests.seen_update(1))
+        self.assertFalse(requests.seen_update(2))
+        self.assertFalse(requests.seen_update(3))  # evicts 1
+        self.assertFalse(requests.seen_update(1))
+        self.assertEqual(requests.dropped_updates, 1)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,154 @@
+#!/usr/bin/env python3
+"""
+Unit tests for the download helpers (utils/downloader.py)
+"""
+
+import asyncio
+import sys
+import unittest
+from pathlib import Path
+
+# Add project path to sys.path
+sys.path.insert(0, str(Path(__file__).parent))
+
+from utils.downloader import DownloadManager, ResizableSemaphore
+
+
+class ResizableSemaphoreTest(unittest.IsolatedAsyncioTestCase):
+    async def test_waiters_are_served_in_order(self):
+        semaphore = ResizableSemaphore(1)
+        order = []
+
+        async def worker(name):
+            async with semaphore:
+                order.append(name)
+                await asyncio.sleep(0)
+
+        await asyncio.gather(*(worker(name) for name in "abc"))
+        self.assertEqual(order, ["a", "b", "c"])
+        self.assertEqual(semaphore.active, 0)
+
+    async def test_grow_wakes_waiters(self):
+        semaphore = ResizableSemaphore(1)
+        await semaphore.acquire()
+        waiters = [asyncio.ensure_future(semaphore.acquire()) for _ in range(2)]
+        await asyncio.sleep(0)
+        self.assertEqual(semaphore.waiting, 2)
+
+        semaphore.resize(3)
+        await asyncio.gather(*waiters)
+        self.assertEqual(semaphore.active, 3)
+        self.assertEqual(semaphore.waiting, 0)
+
+    async def test_shrink_keeps_running_slots(self):
+        semaphore = ResizableSemaphore(3)
+        for _ in range(3):
+            await semaphore.acquire()
+        semaphore.resize(1)
+        waiter = asyncio.ensure_future(semaphore.acquire())
+
+        semaphore.release()
+        semaphore.release()
+        await asyncio.sleep(0)
+        self.assertFalse(waiter.done())  # still one running, limit is 1
+
+        semaphore.release()
+        await waiter
+        self.assertEqual(semaphore.active, 1)
+
+    async def test_cancelled_waiter_does_not_leak_slot(self):
+        semaphore = ResizableSemaphore(1)
+        await semaphore.acquire()
+        waiter = asyncio.ensure_future(semaphore.acquire())
+        await asyncio.sleep(0)
+        waiter.cancel()
+        with self.assertRaises(asyncio.CancelledError):
+            await waiter
+        self.assertEqual(semaphore.waiting, 0)
+
+        semaphore.release()
+        self.assertEqual(semaphore.active, 0)
+
+    async def test_cancel_after_grant_releases_slot(self):
+        semaphore = ResizableSemaphore(1)
+        await semaphore.acquire()
+        waiter = asyncio.ensure_future(semaphore.acquire())
+        await asyncio.sleep(0)
+        semaphore.release()  # slot handed to the waiter
+        waiter.cancel()  # ...which is cancelled before it runs
+        with self.assertRaises(asyncio.CancelledError):
+            await waiter
+        self.assertEqual(semaphore.active, 0)
+
+
+class _Response:
+    def __init__(self, status, headers=None):
+        self.status = status
+        self.headers = headers or {}
+        self.released = False
+
+    def release(self):
+        self.released = True
+
+
+class _Session:
+    """Answers GET requests from a list of responses and records the request headers"""
+
+    def __init__(self, *responses):
+        self.responses = list(responses)
+        self.requests = []
+
+    async def get(self, url, headers=None, timeout=None):
+        self.requests.append(headers)
+        return self.responses.pop(0)
+
+
+class ResumeTest(unittest.IsolatedAsyncioTestCase):
+    def setUp(self):
+        # no temp directory or session needed for _get_stream
+        self.manager = DownloadManager.__new__(DownloadManager)
+        self.manager.request_timeout = 30
+        self.manager.session = None
+
+    async def _stream(self, session, resumed_from=100, validator='"v1"', file_size=1000):
+        return await self.manager._get_stream(session, "https://example.com/a", "a", resumed_from,
+                                              validator, file_size)
+
+    async def test_matching_range_resumes(self):
+        partial = _Response(206, {'Content-Range': 'bytes 100-999/1000'})
+        session = _Session(partial)
+        self.assertEqual(await self._stream(session), (partial, 100))
+        self.assertEqual(session.requests, [{'Range': 'bytes=100-', 'If-Range': '"v1"'}])
+
+    async def test_changed_file_restarts_with_full_body(self):
+        full = _Response(200)
+        session = _Session(full)
+        self.assertEqual(await self._stream(session), (full, 0))
+        self.assertFalse(full.released)
+
+    async def test_mismatched_content_range_restarts(self):
+        for header in ('bytes 0-999/1000', 'bytes 100-1999/2000', ''):
+            partial, full = _Response(206, {'Content-Range': header}), _Response(200)
+            session = _Session(partial, full)
+            self.assertEqual(await self._stream(session), (full, 0))
+            self.assertTrue(partial.released)
+            self.assertEqual(session.requests[1], None)
+
+    async def test_unsatisfiable_range_restarts(self):
+        full = _Response(200)
+        session = _Session(_Response(416), full)
+        self.assertEqual(await self._stream(session), (full, 0))
+
+    async def test_unknown_total_is_accepted(self):
+        partial = _Response(206, {'Content-Range': 'bytes 100-999/*'})
+        self.assertEqual(await self._stream(_Session(partial), validator=""), (partial, 100))
+
+    async def test_new_download_sends_no_range(self):
+        full = _Response(200)
+        session = _Session(full)
+        self.assertEqual(await self._stream(session, resumed_from=0), (full, 0))
+        self.assertEqual(session.requests, [None])
+
+
+if __name__ == "__main__":
+    unittest.main()
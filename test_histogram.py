@@ -0,0 +1,84 @@
+#!/usr/bin/env python3
+"""
+Unit tests for the latency histograms (utils/histogram.py)
+"""
+
+import sys
+import unittest
+from pathlib import Path
+from unittest import mock
+
+# Add project path to sys.path
+sys.path.insert(0, str(Path(__file__).parent))
+
+from utils.histogram import LatencyHistogram, LatencyRecorder, bucket_bounds, bucket_index
+
+
+class BucketTest(unittest.TestCase):
+    def test_value_falls_inside_its_bucket(self):
+        for micros in (0, 1, 15, 16, 17, 31, 32, 1000, 123_456, 10 ** 9):
+            lower, upper = bucket_bounds(bucket_index(micros))
+            self.assertLessEqual(lower, micros)
+            self.assertLess(micros, upper)
+
+    def test_relative_error_is_bounded(self):
+        for micros in (100, 5_000, 777_777, 3 * 10 ** 8):
+            lower, upper = bucket_bounds(bucket_index(micros))
+            self.assertLessEqual((upper - lower) / lower, 1 / 16)
+
+    def test_indexes_are_monotonic(self):
+        indexes = [bucket_index(micros) for micros in range(0, 5000, 7)]
+        self.assertEqual(indexes, sorted(indexes))
+
+
+class LatencyHistogramTest(unittest.TestCase):
+    def test_percentiles(self):
+        histogram = LatencyHistogram()
+        for millis in range(1, 101):
+            histogram.record(millis / 1000)
+        self.assertEqual(histogram.count, 100)
+        self.assertAlmostEqual(histogram.mean, 0.0505)
+        self.assertAlmostEqual(histogram.percentile(50), 0.050, delta=0.050 * 0.07)
+        self.assertAlmostEqual(histogram.percentile(99), 0.099, delta=0.099 * 0.07)
+        self.assertEqual(histogram.percentile(100), 0.1)
+
+    def test_empty_histogram(self):
+        histogram = LatencyHistogram()
+        self.assertEqual(histogram.percentile(50), 0.0)
+        self.assertEqual(histogram.mean, 0.0)
+        self.assertEqual(histogram.cumulative(), [])
+
+    def test_merge(self):
+        first, second = LatencyHistogram(), LatencyHistogram()
+        first.record(0.001)
+        second.record(0.002)
+        second.record(2.0)
+        first.merge(second)
+        self.assertEqual(first.count, 3)
+        self.assertEqual(first.max, 2.0)
+        self.assertEqual(first.cumulative()[-1][1], 3)
+
+
+class LatencyRecorderTest(unittest.TestCase):
+    def test_window_keeps_recent_minutes(self):
+        recorder = LatencyRecorder(window_minutes=5)
+        with mock.patch('utils.histogram.time.time', return_value=600.0):
+            recorder.observe("download", 1.0)
+        with mock.patch('utils.histogram.time.time', return_value=780.0):
+            recorder.observe("download", 2.0)
+            self.assertEqual(recorder.window(60)["download"].count, 1)
+            self.assertEqual(recorder.window(300)["download"].count, 2)
+        with mock.patch('utils.histogram.time.time', return_value=2000.0):
+            self.assertNotIn("download", recorder.window(300))
+        self.assertEqual(recorder.window()["download"].count, 2)
+
+    def test_time_records_on_error(self):
+        recorder = LatencyRecorder()
+        with self.assertRaises(ValueError):
+            with recorder.time("upload"):
+                raise ValueError
+        self.assertEqual(recorder.lifetime["upload"].count, 1)
+
+
+if __name__ == "__main__":
+    unittest.main()
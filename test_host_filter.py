@@ -0,0 +1,57 @@
+#!/usr/bin/env python3
+"""
+Unit tests for the host allow/deny lists (utils/host_filter.py)
+"""
+
+import sys
+import unittest
+from pathlib import Path
+
+# Add project path to sys.path
+sys.path.insert(0, str(Path(__file__).parent))
+
+from utils.host_filter import HostFilter, SuffixTrie, normalize_host, url_host
+
+
+class NormalizeTest(unittest.TestCase):
+    def test_normalize_host(self):
+        self.assertEqual(normalize_host(" Example.COM. "), "example.com")
+        self.assertEqual(normalize_host("*.example.com"), "example.com")
+        self.assertEqual(normalize_host("bücher.de"), "xn--bcher-kva.de")
+
+    def test_url_host(self):
+        self.assertEqual(url_host("https://User@CDN.Example.com:8443/a?b"), "cdn.example.com")
+        self.assertIsNone(url_host("not a url"))
+        self.assertIsNone(url_host("http://[::1"))
+
+
+class SuffixTrieTest(unittest.TestCase):
+    def test_matches_domain_and_subdomains_only(self):
+        trie = SuffixTrie(["example.com", "*.example.com", "files.org"])
+        self.assertEqual(len(trie), 2)
+        self.assertTrue(trie.matches("example.com"))
+        self.assertTrue(trie.matches("a.b.example.com"))
+        self.assertFalse(trie.matches("badexample.com"))
+        self.assertFalse(trie.matches("com"))
+        self.assertFalse(trie.matches("org"))
+
+
+class HostFilterTest(unittest.TestCase):
+    def test_empty_filter_allows_everything(self):
+        self.assertTrue(HostFilter().check_url("https://anything.example/file"))
+
+    def test_allow_list(self):
+        hosts = HostFilter(allowed_hosts=["example.com"])
+        self.assertTrue(hosts.check_url("https://dl.example.com/file"))
+        self.assertFalse(hosts.check_url("https://example.net/file"))
+        self.assertFalse(hosts.check_url("not a url"))
+
+    def test_block_list_wins_over_allow_list(self):
+        hosts = HostFilter(allowed_hosts=["example.com"], blocked_hosts=["ads.example.com"])
+        self.assertTrue(hosts.check_url("https://example.com/file"))
+        self.assertFalse(hosts.check_url("https://x.ads.example.com/file"))
+        self.assertFalse(hosts.check_url("https://ADS.example.com./file"))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,271 @@
+#!/usr/bin/env python3
+"""
+Unit tests for the persistent upload queue (utils/job_queue.py)
+"""
+
+import asyncio
+import sqlite3
+import sys
+import tempfile
+import unittest
+from pathlib import Path
+
+# Add project path to sys.path
+sys.path.insert(0, str(Path(__file__).parent))
+
+from utils.job_queue import CANCELLED, DONE, FAILED, QUEUED, RUNNING, JobQueue, JobStore
+
+
+class JobStoreTest(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.path = str(Path(self.tmp.name) / "jobs.sqlite3")
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def test_changes_survive_reopen(self):
+        store = JobStore(self.path)
+        queue = JobQueue(store, handler=None)
+        job = queue.submit(1, 1, 10, "https://example.com/a")
+        store.update(job, state=RUNNING, offset=512, validator='"v1"')
+        store.close()
+
+        store = JobStore(self.path)
+        [restored] = store.unfinished()
+        store.close()
+        self.assertEqual((restored.job_id, restored.state, restored.offset, restored.validator),
+                         (job.job_id, RUNNING, 512, '"v1"'))
+
+    def test_unfinished_sees_pending_writes(self):
+        store = JobStore(self.path)
+        queue = JobQueue(store, handler=None)
+        jobs = [queue.submit(1, 1, 10, f"https://example.com/{n}") for n in range(3)]
+        store.update(jobs[1], state=DONE)
+        self.assertEqual([job.job_id for job in store.unfinished()], [jobs[0].job_id, jobs[2].job_id])
+        store.close()
+
+    def test_old_database_gets_new_columns(self):
+        db = sqlite3.connect(self.path)
+        db.execute(
+            "CREATE TABLE jobs (job_id TEXT PRIMARY KEY, user_id INTEGER, chat_id INTEGER, "
+            "status_message_id INTEGER, url TEXT, state TEXT, offset INTEGER, filepath TEXT, "
+            "attempts INTEGER, error TEXT, created_at REAL, updated_at REAL)"
+        )
+        db.execute("INSERT INTO jobs VALUES ('old', 1, 1, 10, 'https://example.com/a', 'queued', 0, '', 0, '', 1, 1)")
+        db.commit()
+        db.close()
+
+        store = JobStore(self.path)
+        [job] = store.unfinished()
+        store.close()
+        self.assertEqual((job.job_id, job.batch_id, job.validator), ('old', '', ''))
+
+
+class JobQueueRecoveryTest(unittest.IsolatedAsyncioTestCase):
+    async def asyncSetUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.path = str(Path(self.tmp.name) / "jobs.sqlite3")
+
+    async def asyncTearDown(self):
+        self.tmp.cleanup()
+
+    async def test_start_requeues_unfinished_jobs(self):
+        store = JobStore(self.path)
+        queue = JobQueue(store, handler=None)
+        running = queue.submit(1, 1, 10, "https://example.com/running")
+        store.update(running, state=RUNNING, attempts=1, offset=100)
+        exhausted = queue.submit(2, 2, 20, "https://example.com/exhausted")
+        store.update(exhausted, state=RUNNING, attempts=3)
+        finished = queue.submit(3, 3, 30, "https://example.com/finished")
+        store.update(finished, state=DONE)
+        store.close()
+
+        seen = []
+
+        async def handler(job):
+            seen.append((job.job_id, job.attempts, job.offset))
+            return DONE
+
+        store = JobStore(self.path)
+        queue = JobQueue(store, handler, workers=2)
+        self.assertEqual(queue.start(), 1)
+        while queue.pending:
+            await asyncio.sleep(0.01)
+        await queue.stop()
+        self.assertEqual(seen, [(running.job_id, 2, 100)])
+
+        db = sqlite3.connect(self.path)
+        states = dict(db.execute("SELECT job_id, state FROM jobs"))
+        db.close()
+        self.assertEqual(states, {running.job_id: DONE, exhausted.job_id: FAILED, finished.job_id: DONE})
+
+    async def test_stop_leaves_running_job_for_restart(self):
+        started = asyncio.Event()
+
+        async def handler(job):
+            started.set()
+            await asyncio.sleep(60)
+            return DONE
+
+        queue = JobQueue(JobStore(self.path), handler)
+        queue.start()
+        job = queue.submit(1, 1, 10, "https://example.com/a")
+        await started.wait()
+        await queue.stop()
+
+        store = JobStore(self.path)
+        [restored] = store.unfinished()
+        store.close()
+        self.assertEqual((restored.job_id, restored.state), (job.job_id, RUNNING))
+
+
+class JobQueueCancelTest(unittest.IsolatedAsyncioTestCase):
+    async def asyncSetUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.started = asyncio.Event()
+        self.finished = []
+
+        async def handler(job):
+            self.started.set()
+            await asyncio.sleep(60 if job.url.endswith("slow") else 0)
+            self.finished.append(job.url)
+            return DONE
+
+        self.queue = JobQueue(JobStore(str(Path(self.tmp.name) / "jobs.sqlite3")), handler, workers=1)
+        self.queue.start()
+
+    async def asyncTearDown(self):
+        await self.queue.stop()
+        self.tmp.cleanup()
+
+    async def _drain(self):
+        for _ in range(500):
+            if not self.queue.pending:
+                return
+            await asyncio.sleep(0.01)
+        self.fail("jobs still pending")
+
+    async def test_cancel_queued_job(self):
+        running = self.queue.submit(1, 1, 10, "https://example.com/slow")
+        queued = self.queue.submit(1, 1, 11, "https://example.com/next")
+        await self.started.wait()
+        self.assertEqual(self.queue.cancel(queued.job_id), QUEUED)
+        self.assertEqual(queued.state, CANCELLED)
+        self.assertEqual(self.queue.user_jobs(1), [running])
+        self.assertIsNone(self.queue.cancel(queued.job_id))
+
+    async def test_cancel_running_job(self):
+        job = self.queue.submit(1, 1, 10, "https://example.com/slow")
+        await self.started.wait()
+        self.assertEqual(self.queue.cancel(job.job_id), RUNNING)
+        self.assertTrue(self.queue.is_cancelling(job.job_id))
+        await self._drain()
+        self.assertEqual(job.state, CANCELLED)
+        self.assertFalse(self.queue.is_cancelling(job.job_id))
+
+    async def test_stray_cancellation_fails_job_and_keeps_worker(self):
+        job = self.queue.submit(1, 1, 10, "https://example.com/slow")
+        await self.started.wait()
+        self.queue._job_tasks[job.job_id].cancel()  # not requested through cancel()
+        await self._drain()
+        self.assertEqual((job.state, job.error), (FAILED, "cancelled unexpectedly"))
+
+        self.queue.submit(1, 1, 11, "https://example.com/next")
+        await self._drain()
+        self.assertEqual(self.finished, ["https://example.com/next"])
+
+
+class JobQueueSchedulingTest(unittest.IsolatedAsyncioTestCase):
+    async def asyncSetUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.store = JobStore(str(Path(self.tmp.name) / "jobs.sqlite3"))
+        self.limits = {1: (1, 5), 2: (1, 5), 3: (2, 1)}
+
+    async def asyncTearDown(self):
+        self.tmp.cleanup()
+
+    def _queue(self, handler, workers):
+        return JobQueue(self.store, handler, workers=workers, limits=lambda user_id: self.limits[user_id])
+
+    async def test_users_take_turns(self):
+        order = []
+
+        async def handler(job):
+            order.append(job.user_id)
+            await asyncio.sleep(0)
+            return DONE
+
+        queue = self._queue(handler, workers=1)
+        queue.start()
+        for _ in range(3):
+            queue.submit(1, 1, 10, "https://example.com/a")
+        queue.submit(2, 2, 20, "https://example.com/b")
+        while queue.pending:
+            await asyncio.sleep(0.01)
+        await queue.stop()
+        self.assertEqual(order, [1, 2, 1, 1])
+
+    async def test_tier_concurrency_limit(self):
+        release = asyncio.Event()
+        running = []
+        peak = {}
+
+        async def handler(job):
+            running.append(job.user_id)
+            peak[job.user_id] = max(peak.get(job.user_id, 0), running.count(job.user_id))
+            await release.wait()
+            running.remove(job.user_id)
+            return DONE
+
+        queue = self._queue(handler, workers=8)
+        queue.start()
+        for user_id in (1, 1, 3, 3, 3):
+            queue.submit(user_id, user_id, 10, "https://example.com/a")
+        await asyncio.sleep(0.05)
+        self.assertEqual(sorted(running), [1, 3, 3])
+        self.assertEqual(queue.depth, 2)
+        self.assertEqual(queue.position_for_new(3), 2)
+
+        release.set()
+        while queue.pending:
+            await asyncio.sleep(0.01)
+        await queue.stop()
+        self.assertEqual(peak, {1: 1, 3: 2})
+
+    async def test_room_counts_running_and_queued(self):
+        queue = self._queue(None, workers=1)
+        self.assertEqual(queue.room(3), 3)
+        for _ in range(3):
+            queue.submit(3, 3, 10, "https://example.com/a")
+        self.assertEqual(queue.room(3), 0)
+        self.assertFalse(queue.can_submit(3))
+        self.assertTrue(queue.can_submit(1))
+        self.store.close()
+
+    async def test_refresh_applies_raised_limit(self):
+        release = asyncio.Event()
+        running = []
+
+        async def handler(job):
+            running.append(job.job_id)
+            await release.wait()
+            return DONE
+
+        queue = self._queue(handler, workers=4)
+        queue.start()
+        for _ in range(2):
+            queue.submit(1, 1, 10, "https://example.com/a")
+        await asyncio.sleep(0.05)
+        self.assertEqual(len(running), 1)
+
+        self.limits[1] = (2, 5)
+        queue.refresh()
+        await asyncio.sleep(0.05)
+        self.assertEqual(len(running), 2)
+        release.set()
+        await queue.stop()
+
+
+if __name__ == "__main__":
+    unittest.main()
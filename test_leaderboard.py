@@ -0,0 +1,72 @@
+#!/usr/bin/env python3
+"""
+Unit tests for the incremental leaderboard (utils/leaderboard.py)
+"""
+
+import random
+import sys
+import unittest
+from pathlib import Path
+
+# Add project path to sys.path
+sys.path.insert(0, str(Path(__file__).parent))
+
+from utils.leaderboard import Leaderboard
+
+
+class LeaderboardTest(unittest.TestCase):
+    def test_top_orders_by_score_descending(self):
+        board = Leaderboard({"a": 3, "b": 10, "c": 1, "d": 7})
+        self.assertEqual(board.top(3), [("b", 10), ("d", 7), ("a", 3)])
+        self.assertEqual(board.top(10), [("b", 10), ("d", 7), ("a", 3), ("c", 1)])
+
+    def test_ties_keep_arrival_order_and_share_rank(self):
+        board = Leaderboard()
+        for user_id in ("x", "y", "z"):
+            board.increment(user_id, 5)
+        board.increment("w", 9)
+        self.assertEqual(board.top(4), [("w", 9), ("x", 5), ("y", 5), ("z", 5)])
+        self.assertEqual(board.rank("w"), 1)
+        self.assertEqual([board.rank(user_id) for user_id in ("x", "y", "z")], [2, 2, 2])
+
+    def test_rank_follows_increments(self):
+        board = Leaderboard({"a": 2, "b": 2, "c": 1})
+        self.assertEqual(board.rank("c"), 3)
+        board.increment("c", 2)
+        self.assertEqual(board.rank("c"), 1)
+        self.assertEqual(board.rank("a"), 2)
+        self.assertEqual(board.top(1), [("c", 3)])
+
+    def test_zero_score_removes_user(self):
+        board = Leaderboard({"a": 4, "b": 2})
+        board.set("a", 0)
+        self.assertNotIn("a", board)
+        self.assertIsNone(board.rank("a"))
+        self.assertEqual(board.rank("b"), 1)
+        self.assertEqual(board.top(), [("b", 2)])
+
+    def test_scores_above_initial_capacity(self):
+        board = Leaderboard({"a": 1})
+        board.set("b", 1000)
+        board.increment("a", 500)
+        self.assertEqual(board.top(), [("b", 1000), ("a", 501)])
+        self.assertEqual(board.rank("a"), 2)
+
+    def test_matches_full_sort(self):
+        rng = random.Random(1386)
+        scores = {str(user_id): rng.randint(0, 50) for user_id in range(500)}
+        board = Leaderboard(scores)
+        for _ in range(2000):
+            user_id = str(rng.randrange(500))
+            board.increment(user_id)
+            scores[user_id] += 1
+
+        active = {user_id: score for user_id, score in scores.items() if score > 0}
+        expected = sorted(active.values(), reverse=True)[:25]
+        self.assertEqual([score for _, score in board.top(25)], expected)
+        for user_id, score in active.items():
+            self.assertEqual(board.rank(user_id), sum(1 for other in active.values() if other > score) + 1)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,145 @@
+#!/usr/bin/env python3
+"""
+Unit tests for the outbound Bot API scheduler (middleware/outbound.py)
+"""
+
+import asyncio
+import importlib.util
+import sys
+import time
+import unittest
+from pathlib import Path
+
+# Add project path to sys.path
+sys.path.insert(0, str(Path(__file__).parent))
+
+from aiogram.exceptions import TelegramRetryAfter
+
+# loaded from its file: middleware/__init__ also imports the dispatch middleware and the bot config
+_spec = importlib.util.spec_from_file_location("outbound", Path(__file__).parent / "middleware" / "outbound.py")
+outbound = importlib.util.module_from_spec(_spec)
+_spec.loader.exec_module(outbound)
+
+BULK, DELIVERY, INTERACTIVE, PROGRESS = outbound.BULK, outbound.DELIVERY, outbound.INTERACTIVE, outbound.PROGRESS
+OutboundGovernor, PriorityBucket, outbound_priority = outbound.OutboundGovernor, outbound.PriorityBucket, outbound.outbound_priority
+
+
+class _Method:
+    def __init__(self, api_method, **fields):
+        self.__api_method__ = api_method
+        self.__dict__.update(fields)
+
+
+class _Requests:
+    """make_request replacement: records sent methods, optionally failing with retry_after first"""
+
+    def __init__(self, retry_after=()):
+        self.sent = []
+        self.retry_after = list(retry_after)
+
+    async def __call__(self, bot, method):
+        if self.retry_after:
+            raise TelegramRetryAfter(method=method, message="Too Many Requests", retry_after=self.retry_after.pop(0))
+        self.sent.append(method)
+        return len(self.sent)
+
+
+class PriorityBucketTest(unittest.IsolatedAsyncioTestCase):
+    async def test_waiters_served_by_priority(self):
+        bucket = PriorityBucket(rate=100, burst=1)
+        await bucket.acquire(PROGRESS)
+        order = []
+
+        async def take(priority, name):
+            await bucket.acquire(priority)
+            order.append(name)
+
+        await asyncio.gather(take(BULK, "broadcast"), take(PROGRESS, "edit"), take(DELIVERY, "file"),
+                             take(INTERACTIVE, "reply"))
+        self.assertEqual(order, ["reply", "file", "edit", "broadcast"])
+
+    async def test_cost_above_capacity_is_charged_in_full(self):
+        bucket = PriorityBucket(rate=100, burst=3)
+        await bucket.acquire(DELIVERY, cost=10)  # full bucket is enough to start
+        started = time.monotonic()
+        await bucket.acquire(DELIVERY)  # ...but the next call waits for the debt
+        self.assertGreater(time.monotonic() - started, 0.07)
+
+
+class OutboundGovernorTest(unittest.IsolatedAsyncioTestCase):
+    async def test_ungoverned_methods_pass_through(self):
+        governor = OutboundGovernor(global_rate=1)
+        requests = _Requests()
+        for _ in range(5):
+            await governor(requests, None, _Method("getMe"))
+        self.assertEqual(len(requests.sent), 5)
+        self.assertEqual(governor.throttled, 0)
+
+    async def test_waiting_edits_are_coalesced(self):
+        governor = OutboundGovernor(global_rate=1000, chat_rate=100)
+        governor._chat_bucket(1).pause(0.05)
+        requests = _Requests()
+
+        def edit(text):
+            return governor(requests, None, _Method("editMessageText", chat_id=1, message_id=7, text=text))
+
+        results = await asyncio.gather(edit("10%"), edit("20%"), edit("30%"))
+        self.assertEqual([method.text for method in requests.sent], ["30%"])
+        self.assertEqual(results, [1, 1, 1])
+        self.assertEqual(governor.coalesced, 2)
+
+    async def test_retry_after_pauses_chat_and_retries(self):
+        governor = OutboundGovernor(global_rate=1000, chat_rate=100)
+        requests = _Requests(retry_after=[0.05])
+        started = time.monotonic()
+        with outbound_priority(DELIVERY):
+            result = await governor(requests, None, _Method("sendDocument", chat_id=1))
+        self.assertEqual(result, 1)
+        self.assertEqual(governor.retried, 1)
+        self.assertGreaterEqual(time.monotonic() - started, 0.05)
+        # longer than the chat interval: the whole bot is held back
+        self.assertGreater(governor.global_bucket.paused_until, 0)
+
+    async def test_short_retry_after_pauses_only_the_chat(self):
+        governor = OutboundGovernor(global_rate=1000, chat_rate=1)
+        requests = _Requests(retry_after=[0.05])
+        await governor(requests, None, _Method("sendMessage", chat_id=1))
+        self.assertEqual(len(requests.sent), 1)
+        self.assertGreater(governor._chat_bucket(1).paused_until, 0)
+        self.assertEqual(governor.global_bucket.paused_until, 0)
+
+    async def test_retry_after_without_chat_pauses_global_bucket(self):
+        governor = OutboundGovernor(global_rate=1000, chat_rate=100)
+        requests = _Requests(retry_after=[0.05])
+        started = time.monotonic()
+        await governor(requests, None, _Method("sendMessage"))
+        self.assertEqual(len(requests.sent), 1)
+        self.assertGreaterEqual(governor.global_bucket.paused_until, started + 0.05)
+        self.assertGreaterEqual(time.monotonic() - started, 0.05)
+
+    async def test_retry_after_gives_up_after_max_retries(self):
+        governor = OutboundGovernor(global_rate=1000, chat_rate=1000, max_retries=1)
+        requests = _Requests(retry_after=[0.01, 0.01])
+        with self.assertRaises(TelegramRetryAfter):
+            await governor(requests, None, _Method("sendMessage", chat_id=1))
+        self.assertEqual(requests.sent, [])
+
+    async def test_media_group_takes_token_per_file(self):
+        governor = OutboundGovernor(global_rate=20, chat_rate=1000)
+        requests = _Requests()
+        await governor(requests, None, _Method("sendMediaGroup", chat_id=-100, media=[object()] * 10))
+        self.assertAlmostEqual(governor.global_bucket._refill(), 10, delta=0.5)
+
+    async def test_waiting_counts_by_priority(self):
+        governor = OutboundGovernor(global_rate=100, chat_rate=1000)
+        governor.global_bucket.pause(0.05)
+        requests = _Requests()
+        with outbound_priority(DELIVERY):
+            task = asyncio.ensure_future(governor(requests, None, _Method("sendDocument", chat_id=1)))
+        await asyncio.sleep(0.01)
+        self.assertEqual(governor.waiting(), {'interactive': 0, 'delivery': 1, 'progress': 0, 'bulk': 0})
+        await task
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,103 @@
+#!/usr/bin/env python3
+"""
+Unit tests for update routing and shared download slots (bot/supervisor.py)
+"""
+
+import asyncio
+import multiprocessing
+import sys
+import unittest
+from collections import Counter
+from pathlib import Path
+from types import SimpleNamespace
+
+# Add project path to sys.path
+sys.path.insert(0, str(Path(__file__).parent))
+
+from bot.supervisor import GlobalSlots, HashRing, Supervisor, update_user_id
+
+KEYS = range(100_000, 120_000)
+
+
+class HashRingTest(unittest.TestCase):
+    def test_keys_spread_evenly(self):
+        ring = HashRing(4)
+        counts = Counter(ring.node_for(key) for key in KEYS)
+        self.assertEqual(set(counts), {0, 1, 2, 3})
+        for count in counts.values():
+            self.assertLess(abs(count - len(KEYS) / 4), len(KEYS) / 4 * 0.2)
+
+    def test_routing_is_stable(self):
+        self.assertEqual([HashRing(4).node_for(key) for key in KEYS[:100]],
+                         [HashRing(4).node_for(key) for key in KEYS[:100]])
+
+    def test_adding_worker_moves_few_keys(self):
+        before, after = HashRing(4), HashRing(5)
+        moved = [key for key in KEYS if before.node_for(key) != after.node_for(key)]
+        # only keys taken over by the new worker move (about a fifth)
+        self.assertTrue(all(after.node_for(key) == 4 for key in moved))
+        self.assertLess(len(moved), len(KEYS) * 0.3)
+
+
+class UpdateUserIdTest(unittest.TestCase):
+    def test_sender_or_chat(self):
+        self.assertEqual(update_user_id({'update_id': 1, 'message': {'from': {'id': 7}, 'chat': {'id': -5}}}), 7)
+        self.assertEqual(update_user_id({'update_id': 1, 'channel_post': {'chat': {'id': -5}}}), None)
+        self.assertEqual(update_user_id({'update_id': 1, 'edited_message': {'chat': {'id': -5}}}), -5)
+
+
+class GlobalSlotsTest(unittest.TestCase):
+    def test_reclaim_frees_slots_of_crashed_worker(self):
+        context = multiprocessing.get_context("spawn")
+        semaphore = context.Semaphore(2)
+        held = context.Array('i', 2)
+        slots = GlobalSlots(semaphore, held, 1)
+
+        async def crash_holding_slots():
+            await slots.__aenter__()
+            await slots.__aenter__()  # never released, as if the worker died
+
+        asyncio.run(crash_holding_slots())
+        self.assertFalse(semaphore.acquire(False))
+        self.assertEqual(list(held), [0, 2])
+
+        self.assertEqual(GlobalSlots.reclaim(semaphore, held, 1), 2)
+        self.assertEqual(list(held), [0, 0])
+        self.assertTrue(semaphore.acquire(False))
+        self.assertTrue(semaphore.acquire(False))
+
+    def test_release_updates_held_count(self):
+        context = multiprocessing.get_context("spawn")
+        semaphore = context.Semaphore(1)
+        held = context.Array('i', 1)
+        slots = GlobalSlots(semaphore, held, 0)
+
+        async def download():
+            async with slots:
+                self.assertEqual(held[0], 1)
+
+        asyncio.run(download())
+        self.assertEqual(held[0], 0)
+        self.assertEqual(GlobalSlots.reclaim(semaphore, held, 0), 0)
+
+
+class SupervisorRoutingTest(unittest.TestCase):
+    def test_updates_of_a_user_go_to_one_worker(self):
+        supervisor = Supervisor(SimpleNamespace(parallel_downloads=2), workers=3)
+
+        async def route():
+            for update_id, user_id in enumerate((11, 22, 11, 33, 11), start=1):
+                await supervisor.feed_raw_update(None, {'update_id': update_id, 'message': {'from': {'id': user_id}}})
+
+        asyncio.run(route())
+        index = supervisor.ring.node_for(11)
+        received = []
+        while len(received) < supervisor.routed[index]:
+            received.append(supervisor._queues[index].get(timeout=5))
+        self.assertEqual([update['update_id'] for update in received if update['message']['from']['id'] == 11],
+                         [1, 3, 5])
+        self.assertEqual(sum(supervisor.routed), 5)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,98 @@
+#!/usr/bin/env python3
+"""
+Unit tests for the fixed-memory throughput rollups (utils/timeseries.py)
+"""
+
+import json
+import sys
+import tempfile
+import unittest
+from pathlib import Path
+
+# Add project path to sys.path
+sys.path.insert(0, str(Path(__file__).parent))
+
+from utils.timeseries import RollupRing, ThroughputRollups
+
+DAY = 86400
+START = 1_700_000_000 // DAY * DAY  # aligned to a day boundary
+
+
+class RollupRingTest(unittest.TestCase):
+    def test_totals_sum_recent_buckets(self):
+        ring = RollupRing(60, 10)
+        ring.add(START, 0, 1)
+        ring.add(START + 30, 0, 2)
+        ring.add(START + 60, 0, 4)
+        self.assertEqual(ring.totals(START + 60, 1)[0], 4)
+        self.assertEqual(ring.totals(START + 60, 2)[0], 7)
+        self.assertEqual(ring.totals(START + 60, 1, offset=1)[0], 3)
+
+    def test_reused_slot_is_reset(self):
+        ring = RollupRing(60, 10)
+        ring.add(START, 0, 5)
+        ring.add(START + 600, 0, 1)  # same slot, one lap later
+        self.assertEqual(ring.totals(START + 600, 10)[0], 1)
+
+    def test_values_older_than_ring_are_dropped(self):
+        ring = RollupRing(60, 10)
+        ring.add(START + 600, 0, 1)
+        ring.add(START, 0, 5)
+        self.assertEqual(ring.totals(START + 600, 10)[0], 1)
+
+
+class ThroughputRollupsTest(unittest.TestCase):
+    def test_totals_pick_ring_covering_span(self):
+        rollups = ThroughputRollups()
+        rollups.record(now=START, finished=1, bytes_out=100)
+        rollups.record(now=START + 3 * 3600, finished=2, bytes_out=300)
+        now = START + 3 * 3600 + 10
+
+        self.assertEqual(rollups.totals(60, now=now)['finished'], 2)
+        self.assertEqual(rollups.totals(3600, now=now)['finished'], 2)
+        self.assertEqual(rollups.totals(4 * 3600, now=now)['finished'], 3)
+        self.assertEqual(rollups.totals(DAY, now=now)['bytes_out'], 400)
+        self.assertEqual(rollups.lifetime['finished'], 3)
+
+    def test_summary_rates_and_averages(self):
+        rollups = ThroughputRollups()
+        rollups.record(now=START, finished=3, bytes_in=600, queued=2, queue_wait=5)
+        summary = rollups.summary(60, now=START + 1)
+        self.assertEqual(summary['jobs_per_minute'], 3)
+        self.assertEqual(summary['bytes_in_per_second'], 10)
+        self.assertEqual(summary['avg_queue_wait'], 2.5)
+        self.assertEqual(summary['avg_upload_time'], 0.0)
+
+    def test_trend_against_previous_span(self):
+        rollups = ThroughputRollups()
+        rollups.record(now=START, finished=2)
+        rollups.record(now=START + 3600, finished=3)
+        self.assertEqual(rollups.trend('finished', 3600, now=START + 3600), 50)
+        self.assertIsNone(rollups.trend('failed', 3600, now=START + 3600))
+
+    def test_save_and_load_round_trip(self):
+        rollups = ThroughputRollups()
+        rollups.record(now=START, finished=4, bytes_out=2048)
+        with tempfile.TemporaryDirectory() as tmp:
+            path = Path(tmp) / "throughput.json"
+            path.write_text(rollups.dumps(), encoding='utf-8')
+            restored = ThroughputRollups()
+            restored.load(str(path))
+        self.assertEqual(restored.totals(DAY, now=START + 60), rollups.totals(DAY, now=START + 60))
+
+    def test_load_ignores_changed_fields(self):
+        rollups = ThroughputRollups()
+        rollups.record(now=START, finished=1)
+        data = rollups.to_dict()
+        data['fields'] = ['finished']
+        with tempfile.TemporaryDirectory() as tmp:
+            path = Path(tmp) / "throughput.json"
+            path.write_text(json.dumps(data), encoding='utf-8')
+            restored = ThroughputRollups()
+            with self.assertLogs('utils.timeseries', 'WARNING'):
+                restored.load(str(path))
+        self.assertEqual(restored.totals(DAY, now=START)['finished'], 0)
+
+
+if __name__ == "__main__":
+    unittest.main()
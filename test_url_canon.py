@@ -0,0 +1,63 @@
+#!/usr/bin/env python3
+"""
+Unit tests for the URL canonicalizer (utils/url_canon.py)
+"""
+
+import sys
+import unittest
+from pathlib import Path
+
+# Add project path to sys.path
+sys.path.insert(0, str(Path(__file__).parent))
+
+from utils import url_canon
+from utils.url_canon import canonicalize, url_key
+
+
+class CanonicalizeTest(unittest.TestCase):
+    def tearDown(self):
+        url_canon.configure()
+
+    def test_already_canonical_is_unchanged(self):
+        url = "https://example.com/files/a.zip"
+        self.assertEqual(canonicalize(url), url)
+
+    def test_scheme_host_port_and_fragment(self):
+        self.assertEqual(canonicalize("HTTPS://Example.COM:443/a#top"), "https://example.com/a")
+        self.assertEqual(canonicalize("http://example.com:80"), "http://example.com/")
+        self.assertEqual(canonicalize("http://example.com:8080/a"), "http://example.com:8080/a")
+
+    def test_trailing_dot_host(self):
+        self.assertEqual(canonicalize("https://example.com./a"), "https://example.com/a")
+        self.assertEqual(url_key("https://example.com./a"), url_key("https://example.com/a"))
+
+    def test_idna_host(self):
+        self.assertEqual(canonicalize("https://Bücher.de/x"), "https://xn--bcher-kva.de/x")
+
+    def test_percent_encoding(self):
+        self.assertEqual(canonicalize("https://example.com/%7euser/%2fa%2Fb"),
+                         "https://example.com/~user/%2Fa%2Fb")
+        self.assertEqual(canonicalize("https://example.com/a b"), "https://example.com/a%20b")
+
+    def test_tracking_params_removed(self):
+        self.assertEqual(canonicalize("https://example.com/a?id=1&utm_source=x&FBCLID=y"),
+                         "https://example.com/a?id=1")
+        self.assertEqual(canonicalize("https://example.com/a?utm_medium=x"), "https://example.com/a")
+
+    def test_configure_tracking_params(self):
+        url_canon.configure(["session*"])
+        self.assertEqual(canonicalize("https://example.com/a?sessionid=1&utm_source=x"),
+                         "https://example.com/a?utm_source=x")
+
+    def test_invalid_url_is_returned_as_is(self):
+        self.assertEqual(canonicalize("not a url"), "not a url")
+        self.assertEqual(canonicalize("http://example.com:99999/"), "http://example.com:99999/")
+
+    def test_url_key_sizes(self):
+        self.assertLess(url_key("https://example.com/a"), 1 << 64)
+        self.assertLess(url_key("https://example.com/a", 128), 1 << 128)
+        self.assertNotEqual(url_key("https://example.com/a"), url_key("https://example.com/b"))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,349 @@
+#!/usr/bin/env python3
+"""
+Unit tests for upload jobs, sending by URL and batch delivery in the user handlers (handlers/user_handlers.py)
+"""
+
+import asyncio
+import importlib.util
+import os
+import sys
+import tempfile
+import unittest
+from pathlib import Path
+from types import SimpleNamespace
+
+# Add project path to sys.path
+ROOT = Path(__file__).parent
+sys.path.insert(0, str(ROOT))
+
+# The config/ package shadows config.py; expose the module's names on the package like config/__init__ intends
+import config
+
+_spec = importlib.util.spec_from_file_location("config._module", ROOT / "config.py")
+config_module = importlib.util.module_from_spec(_spec)
+_spec.loader.exec_module(config_module)
+for _name in config.__all__:
+    setattr(config, _name, getattr(config_module, _name))
+
+from config.i18n import Language, translator
+from handlers.user_handlers import UserHandlers
+from utils.album import AlbumItem, Batch
+from utils.downloader import DownloadManager, ProbeResult
+from utils.job_queue import CANCELLED, DONE, FAILED, JobQueue, JobStore
+from utils.tracing import tracer
+
+FILE_SIZE = 1000
+
+
+class _Stream:
+    """GET response: sends the first chunk, then blocks (until the download is cancelled) or the rest"""
+
+    def __init__(self, streaming: asyncio.Event, block: bool):
+        self.status = 200
+        self.headers = {}
+        self.content = self
+        self.streaming = streaming
+        self.block = block
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        return False
+
+    def raise_for_status(self):
+        pass
+
+    async def iter_chunked(self, size):
+        yield b"x" * 100
+        self.streaming.set()
+        if self.block:
+            await asyncio.Event().wait()
+        yield b"x" * (FILE_SIZE - 100)
+
+
+class _Session:
+    closed = False
+
+    def __init__(self, content_type='application/zip', block=True):
+        self.content_type = content_type
+        self.block = block
+        self.streaming = asyncio.Event()
+
+    def head(self, url, **kwargs):
+        return _Head({'Content-Length': str(FILE_SIZE), 'Content-Type': self.content_type})
+
+    async def get(self, url, headers=None, timeout=None):
+        return _Stream(self.streaming, self.block)
+
+
+class _Head:
+    status = 200
+
+    def __init__(self, headers):
+        self.headers = headers
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        return False
+
+
+class _Recorder:
+    """Async stand-in for a bot or message method; records its calls and raises error if set"""
+
+    def __init__(self, result=None, error=None):
+        self.calls = []
+        self.result = result
+        self.error = error
+
+    async def __call__(self, *args, **kwargs):
+        self.calls.append((args, kwargs))
+        if self.error is not None:
+            raise self.error
+        return self.result
+
+
+class HandlerTestCase(unittest.IsolatedAsyncioTestCase):
+    """Fresh AppConfig and a bot whose Telegram methods only record their calls"""
+
+    async def asyncSetUp(self):
+        # config.save() and the download manager write relative to the working directory
+        self.tmp = tempfile.TemporaryDirectory()
+        self.cwd = os.getcwd()
+        os.chdir(self.tmp.name)
+
+        self.config = config_module.AppConfig()
+        self.config.publish()
+        config_module.app_config = self.config
+        self.url_fetch = config_module.env_config.enable_url_fetch
+
+        self.bot = SimpleNamespace(
+            shortlink_service=SimpleNamespace(shorten_url=self._shorten_url),
+            edit_message=_Recorder(),
+            delete_message=_Recorder(),
+            send_photo=_Recorder(),
+            send_document=_Recorder(),
+            send_video=_Recorder(),
+            send_media_group=_Recorder(),
+            cdn=None,
+        )
+        self.handlers = UserHandlers(self.bot)
+
+    @staticmethod
+    async def _shorten_url(url):
+        return url
+
+    async def asyncTearDown(self):
+        config_module.env_config.enable_url_fetch = self.url_fetch
+        config_module.app_config = None
+        os.chdir(self.cwd)
+        self.tmp.cleanup()
+
+
+class UploadJobTest(HandlerTestCase):
+    async def asyncSetUp(self):
+        await super().asyncSetUp()
+        config_module.env_config.enable_url_fetch = False
+        self.session = _Session()
+        self.bot.download_manager = DownloadManager(max_file_size=10 * FILE_SIZE, parallel_downloads=1,
+                                                    config=self.config)
+        self.bot.download_manager.session = self.session
+        self.bot.jobs = JobQueue(JobStore("jobs.sqlite3"), self.handlers.run_job, workers=1)
+        self.bot.jobs.start()
+
+    async def asyncTearDown(self):
+        await self.bot.jobs.stop()
+        self.bot.download_manager.session = None
+        await super().asyncTearDown()
+
+    async def _wait_until(self, condition):
+        for _ in range(500):
+            if condition():
+                return
+            await asyncio.sleep(0.01)
+        self.fail("timed out")
+
+    async def test_cancel_releases_download_and_removes_partial_file(self):
+        traces = []
+        start, enabled = tracer.start, tracer.enabled
+        tracer.enabled = True  # no writer configured: traces are only kept in memory
+        tracer.start = lambda name, **attrs: traces.append(start(name, **attrs)) or traces[-1]
+        try:
+            job = self.bot.jobs.submit(1, 1, 10, "https://example.com/a.zip")
+            await asyncio.wait_for(self.session.streaming.wait(), 5)
+            manager = self.bot.download_manager
+            partial = Path(job.filepath)
+            self.assertTrue(partial.exists())
+            self.assertEqual((manager.semaphore.active, manager.reserved_disk), (1, FILE_SIZE))
+            self.assertEqual(self.config.quota_reserved, {'1': FILE_SIZE})
+
+            message = SimpleNamespace(from_user=SimpleNamespace(id=1), answer=_Recorder())
+            await self.handlers.handle_cancel(message, Language.ENGLISH)
+            await self._wait_until(lambda: not self.bot.jobs.pending)
+        finally:
+            tracer.start, tracer.enabled = start, enabled
+
+        self.assertEqual(message.answer.calls, [((translator.get("jobs_cancelled", Language.ENGLISH, count=1),), {})])
+        self.assertEqual(job.state, CANCELLED)
+        self.assertFalse(partial.exists())
+        self.assertEqual(manager.semaphore.active, 0)
+        self.assertEqual(manager.reserved_disk, 0)
+        self.assertEqual(manager.active_downloads, {})
+        self.assertEqual(self.config.quota_reserved, {})
+        self.assertEqual(self.config.statistics.total_cancelled, 1)
+        self.assertEqual(self.bot.edit_message.calls[-1][1]['text'],
+                         translator.get("upload_cancelled", Language.ENGLISH))
+        self.assertEqual([trace.status for trace in traces], ["cancelled"])
+
+
+class SendByUrlTest(HandlerTestCase):
+    async def asyncSetUp(self):
+        await super().asyncSetUp()
+        self.job = SimpleNamespace(job_id="j1", user_id=1, chat_id=5, url="https://example.com/file")
+
+    async def _send(self, filename, size):
+        return await self.handlers._send_by_url(self.job, self.config, ProbeResult(filename, size, "", ""))
+
+    def _sent_bytes(self):
+        return self.config.get_quota_usage(1)['daily_bytes']
+
+    async def test_small_photo_is_fetched_by_telegram(self):
+        reserved = []
+        send = self.bot.send_photo
+
+        async def send_photo(*args, **kwargs):
+            reserved.append(dict(self.config.quota_reserved))
+            return await send(*args, **kwargs)
+        self.bot.send_photo = send_photo
+
+        self.assertEqual(await self._send("Photo.JPG", 4096), 4096)
+        [(args, kwargs)] = send.calls
+        self.assertEqual(args, (5, "https://example.com/file"))
+        self.assertTrue(kwargs['has_spoiler'])
+        self.assertEqual(reserved, [{'1': 4096}])  # reserved while Telegram fetches it
+        self.assertEqual(self.config.quota_reserved, {})
+        self.assertEqual(self._sent_bytes(), 4096)
+
+    async def test_document_types_and_limits(self):
+        self.assertEqual(await self._send("report.pdf", 6 * 1024 * 1024), 6 * 1024 * 1024)
+        [(args, kwargs)] = self.bot.send_document.calls
+        self.assertNotIn('has_spoiler', kwargs)
+
+        for filename, size in (("big.png", 6 * 1024 * 1024),  # over the photo limit
+                               ("huge.zip", 21 * 1024 * 1024),  # over the document limit
+                               ("video.mp4", 1024),  # not fetched by URL
+                               ("photo.jpg", 0)):  # size unknown
+            self.assertIsNone(await self._send(filename, size), filename)
+        self.assertEqual(len(self.bot.send_photo.calls) + len(self.bot.send_document.calls), 1)
+        self.assertEqual(self._sent_bytes(), 6 * 1024 * 1024)
+
+    async def test_rejected_url_releases_reservation(self):
+        self.bot.send_photo.error = Exception("Bad Request: wrong file identifier/HTTP URL specified")
+        self.assertIsNone(await self._send("photo.jpg", 4096))
+        self.assertEqual(self.config.quota_reserved, {})
+        self.assertEqual(self._sent_bytes(), 0)
+
+    async def test_quota_is_checked_before_sending(self):
+        self.config.quota.user_overrides['1'] = {'daily_bytes': 1024}
+        with self.assertRaises(Exception):
+            await self._send("photo.jpg", 4096)
+        self.assertEqual(self.bot.send_photo.calls, [])
+        self.assertEqual(self.config.quota_reserved, {})
+
+
+class UrlFetchFallbackTest(HandlerTestCase):
+    async def asyncSetUp(self):
+        await super().asyncSetUp()
+        config_module.env_config.enable_url_fetch = True
+        self.bot.download_manager = DownloadManager(max_file_size=10 * FILE_SIZE, parallel_downloads=1,
+                                                    config=self.config)
+        self.bot.download_manager.session = _Session('image/jpeg', block=False)
+        self.bot.jobs = JobQueue(JobStore("jobs.sqlite3"), self.handlers.run_job)
+
+    async def asyncTearDown(self):
+        self.bot.jobs.store.close()
+        self.bot.download_manager.session = None
+        await super().asyncTearDown()
+
+    async def test_rejected_url_is_downloaded_and_uploaded(self):
+        send = self.bot.send_photo
+
+        async def send_photo(*args, **kwargs):
+            await send(*args, **kwargs)
+            if args:  # by URL
+                raise Exception("Bad Request: failed to get HTTP URL content")
+        self.bot.send_photo = send_photo
+
+        job = self.bot.jobs.submit(1, 5, 10, "https://example.com/a.jpg")
+        self.assertEqual(await self.handlers.run_job(job), DONE)
+
+        by_url, upload = send.calls
+        self.assertEqual(by_url[0], (5, "https://example.com/a.jpg"))
+        self.assertEqual(len(upload[1]['photo']), FILE_SIZE)
+        self.assertEqual(self.bot.delete_message.calls, [((5, 10), {})])
+        self.assertEqual(self.config.quota_reserved, {})
+        self.assertEqual(self.config.get_quota_usage(1)['daily_bytes'], FILE_SIZE)  # charged once
+        self.assertEqual(list(Path("temp").iterdir()), [])
+
+
+class DeliverAlbumTest(HandlerTestCase):
+    async def asyncSetUp(self):
+        await super().asyncSetUp()
+        self.finished = []
+        self.bot.jobs = SimpleNamespace(finish=lambda job, state: self.finished.append((job.job_id, state)))
+        self.batch = Batch("b1", user_id=1, chat_id=5, status_message_id=10, total=3)
+
+    def _items(self, *file_types):
+        items = []
+        for number, file_type in enumerate(file_types):
+            path = Path(f"1_j{number}_file{number}.bin")
+            path.write_bytes(b"x" * (number + 1))
+            job = SimpleNamespace(job_id=f"j{number}", user_id=1, url=f"https://example.com/{number}")
+            items.append(AlbumItem(job, path, f"caption {number}", file_type))
+        return items
+
+    async def test_album_is_sent_in_one_call(self):
+        items = self._items('image', 'video')
+        await self.handlers.deliver_album(self.batch, items)
+
+        [(args, _)] = self.bot.send_media_group.calls
+        self.assertEqual(args[0], 5)
+        self.assertEqual([media.type for media in args[1]], ['photo', 'video'])
+        self.assertEqual(self.finished, [("j0", DONE), ("j1", DONE)])
+        self.assertEqual(self.batch.delivered, 2)
+        self.assertFalse(any(item.filepath.exists() for item in items))
+        self.assertEqual(self.config.statistics.total_downloads, 2)
+
+    async def test_rejected_album_falls_back_to_single_sends(self):
+        items = self._items('document', 'document', 'document')
+        self.bot.send_media_group.error = Exception("Bad Request: wrong file")
+        sends = self.bot.send_document
+
+        async def send_document(**kwargs):
+            await sends(**kwargs)
+            if kwargs['caption'] == "caption 1":
+                raise Exception("Bad Request: file too big")
+        self.bot.send_document = send_document
+
+        await self.handlers.deliver_album(self.batch, items)
+
+        self.assertEqual([kwargs['caption'] for _, kwargs in sends.calls], ["caption 0", "caption 1", "caption 2"])
+        self.assertEqual(self.finished, [("j0", DONE), ("j1", FAILED), ("j2", DONE)])
+        self.assertEqual(self.batch.delivered, 2)
+        self.assertEqual(self.batch.failures, [("https://example.com/1", "Bad Request: file too big")])
+        self.assertFalse(any(item.filepath.exists() for item in items))
+
+    async def test_single_file_is_sent_without_album(self):
+        [item] = self._items('image')
+        await self.handlers.deliver_album(self.batch, [item])
+
+        self.assertEqual(self.bot.send_media_group.calls, [])
+        [(_, kwargs)] = self.bot.send_photo.calls
+        self.assertEqual((kwargs['chat_id'], kwargs['photo'], kwargs['caption']), (5, b"x", "caption 0"))
+        self.assertEqual(self.finished, [("j0", DONE)])
+
+
+if __name__ == "__main__":
+    unittest.main()
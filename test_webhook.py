@@ -0,0 +1,101 @@
+#!/usr/bin/env python3
+"""
+Unit tests for the webhook server (bot/webhook.py)
+"""
+
+import asyncio
+import sys
+import unittest
+from pathlib import Path
+
+# Add project path to sys.path
+sys.path.insert(0, str(Path(__file__).parent))
+
+from aiohttp.test_utils import TestClient, TestServer
+
+from bot.webhook import SECRET_HEADER, WebhookServer
+
+SECRET = "test-secret"
+
+FIXTURE_UPDATE = {
+    "update_id": 1,
+    "message": {
+        "message_id": 1,
+        "date": 1700000000,
+        "chat": {"id": 123456789, "type": "private"},
+        "from": {"id": 123456789, "is_bot": False, "first_name": "Test"},
+        "text": "/start",
+    },
+}
+
+
+class _Dispatcher:
+    """feed_raw_update replacement: records updates, blocks while release is clear"""
+
+    def __init__(self):
+        self.updates = []
+        self.release = asyncio.Event()
+        self.release.set()
+
+    async def feed_raw_update(self, bot, update):
+        self.updates.append(update)
+        await self.release.wait()
+
+
+class WebhookServerTest(unittest.IsolatedAsyncioTestCase):
+    async def asyncSetUp(self):
+        self.dispatcher = _Dispatcher()
+        self.server = WebhookServer(self.dispatcher, bot=None, path="/webhook", secret_token=SECRET,
+                                    max_concurrent=2)
+        self.client = TestClient(TestServer(self.server.make_app()))
+        await self.client.start_server()
+
+    async def asyncTearDown(self):
+        self.dispatcher.release.set()
+        await self.client.close()
+        await self.server.stop()
+
+    async def _post(self, update=FIXTURE_UPDATE, secret=SECRET):
+        headers = {SECRET_HEADER: secret} if secret is not None else {}
+        return await self.client.post("/webhook", json=update, headers=headers)
+
+    async def test_wrong_or_missing_secret_is_rejected(self):
+        for secret in ("wrong", None):
+            response = await self._post(secret=secret)
+            self.assertEqual(response.status, 401)
+        self.assertEqual(self.server.in_flight, 0)
+        self.assertEqual(self.dispatcher.updates, [])
+
+    async def test_update_is_answered_before_processing(self):
+        self.dispatcher.release.clear()
+        response = await self._post()
+        self.assertEqual(response.status, 200)
+        self.assertEqual(self.server.in_flight, 1)  # Still running in the background
+
+        self.dispatcher.release.set()
+        await self.server.stop()
+        self.assertEqual(self.dispatcher.updates, [FIXTURE_UPDATE])
+        self.assertEqual(self.server.in_flight, 0)
+
+    async def test_busy_server_asks_for_retry(self):
+        self.dispatcher.release.clear()
+        for update_id in (1, 2):
+            response = await self._post({**FIXTURE_UPDATE, "update_id": update_id})
+            self.assertEqual(response.status, 200)
+
+        response = await self._post({**FIXTURE_UPDATE, "update_id": 3})
+        self.assertEqual(response.status, 503)
+        self.assertEqual(response.headers["Retry-After"], "1")
+        self.assertEqual(self.server.rejected, 1)
+
+        self.dispatcher.release.set()
+        await self.server.stop()
+        self.assertEqual([update["update_id"] for update in self.dispatcher.updates], [1, 2])
+
+    async def test_malformed_update_is_rejected(self):
+        response = await self._post({"message": {}})
+        self.assertEqual(response.status, 400)
+
+
+if __name__ == "__main__":
+    unittest.main()
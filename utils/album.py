@@ -0,0 +1,134 @@
+"""
+ارسال گروهی فایل‌های یک دسته لینک (sendMediaGroup)
+
+وقتی کاربر چند لینک را یک‌جا می‌فرستد، فایل‌های دانلود شده بر اساس نوع گروه‌بندی
+می‌شوند (عکس و ویدیو با هم، بقیه به صورت سند) و هر ۱۰ فایل، یا وقتی کار دیگری از
+دسته باقی نمانده، با یک درخواست ارسال می‌شوند.
+"""
+
+import asyncio
+import logging
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Any, Awaitable, Callable, Dict, List, Set, Tuple
+
+logger = logging.getLogger(__name__)
+
+MAX_ALBUM_ITEMS = 10  # سقف sendMediaGroup
+
+VISUAL = "visual"  # عکس و ویدیو در یک آلبوم
+DOCUMENT = "document"
+
+def album_kind(file_type: str) -> str:
+    """نوع آلبومی که فایل می‌تواند در آن قرار بگیرد"""
+    return VISUAL if file_type in ('image', 'video') else DOCUMENT
+
+@dataclass
+class AlbumItem:
+    job: Any  # utils.job_queue.Job
+    filepath: Path
+    caption: str
+    file_type: str
+
+@dataclass
+class Batch:
+    batch_id: str
+    user_id: int
+    chat_id: int
+    status_message_id: int
+    total: int = 0
+    delivered: int = 0
+    failures: List[Tuple[str, str]] = field(default_factory=list)  # (url, خطا)
+    groups: Dict[str, List[AlbumItem]] = field(default_factory=dict)
+    tasks: List[asyncio.Task] = field(default_factory=list)
+
+Deliver = Callable[[Batch, List[AlbumItem]], Awaitable[None]]
+Complete = Callable[[Batch], Awaitable[None]]
+
+class AlbumBuffer:
+    """
+    نگهداری فایل‌های آماده هر دسته تا پر شدن آلبوم یا پایان دسته
+    deliver: ارسال یک گروه (حداکثر MAX_ALBUM_ITEMS فایل)
+    complete: پس از ارسال همه گروه‌های دسته (برای پیام خلاصه)
+    """
+
+    def __init__(self, deliver: Deliver, complete: Complete, max_items: int = MAX_ALBUM_ITEMS):
+        self.deliver = deliver
+        self.complete = complete
+        self.max_items = max_items
+        self._batches: Dict[str, Batch] = {}
+        self._tasks: Set[asyncio.Task] = set()
+
+    @property
+    def buffered(self) -> int:
+        """تعداد فایل‌های منتظر ارسال"""
+        return sum(len(items) for batch in self._batches.values() for items in batch.groups.values())
+
+    def files(self) -> Set[str]:
+        """فایل‌های منتظر ارسال (پس از ری‌استارت دوباره ارسال می‌شوند)"""
+        return {str(item.filepath) for batch in self._batches.values()
+                for items in batch.groups.values() for item in items}
+
+    def open(self, batch_id: str, user_id: int, chat_id: int, status_message_id: int, total: int) -> Batch:
+        batch = Batch(batch_id, user_id, chat_id, status_message_id, total)
+        self._batches[batch_id] = batch
+        return batch
+
+    def add(self, item: AlbumItem):
+        """افزودن فایل آماده؛ آلبوم پر شده فوراً ارسال می‌شود"""
+        batch = self._batch(item.job)
+        kind = album_kind(item.file_type)
+        group = batch.groups.setdefault(kind, [])
+        group.append(item)
+        if len(group) >= self.max_items:
+            self._send(batch, batch.groups.pop(kind))
+
+    def fail(self, job, error: str):
+        """ثبت خطای یک لینک برای پیام خلاصه دسته"""
+        self._batch(job).failures.append((job.url, error))
+
+    def sent_alone(self, job):
+        """ثبت فایلی از دسته که خارج از آلبوم (با لینک CDN) ارسال شد"""
+        self._batch(job).delivered += 1
+
+    def close(self, batch_id: str):
+        """کار دیگری از دسته باقی نمانده: ارسال بقیه گروه‌ها و سپس پیام خلاصه"""
+        batch = self._batches.pop(batch_id, None)
+        if batch is None:
+            return
+        for items in batch.groups.values():
+            self._send(batch, items)
+        batch.groups.clear()
+        self._track(self._finish(batch))
+
+    async def stop(self):
+        """لغو ارسال‌های در جریان (کارها در وضعیت delivering می‌مانند و پس از ری‌استارت دوباره ارسال می‌شوند)"""
+        for task in self._tasks:
+            task.cancel()
+        if self._tasks:
+            await asyncio.gather(*self._tasks, return_exceptions=True)
+
+    def _batch(self, job) -> Batch:
+        batch = self._batches.get(job.batch_id)
+        if batch is None:
+            # دسته‌ای که پس از ری‌استارت از صف بازیابی شده است
+            batch = self.open(job.batch_id, job.user_id, job.chat_id, job.status_message_id, 0)
+        return batch
+
+    def _send(self, batch: Batch, items: List[AlbumItem]):
+        items.sort(key=lambda item: item.job.created_at)  # ترتیب لینک‌ها در پیام کاربر
+        batch.tasks.append(self._track(self.deliver(batch, items)))
+
+    async def _finish(self, batch: Batch):
+        if batch.tasks:
+            await asyncio.gather(*batch.tasks, return_exceptions=True)
+        try:
+            await self.complete(batch)
+        except Exception as e:
+            logger.error("خطا در پایان دسته %s: %s", batch.batch_id, e)
+
+    def _track(self, coro) -> asyncio.Task:
+        task = asyncio.ensure_future(coro)
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+        return task
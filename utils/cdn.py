@@ -0,0 +1,258 @@
+"""
+تحویل فایل‌ها با لینک CDN به جای آپلود در تلگرام
+
+فایل دانلود شده به پوشه ذخیره‌سازی منتقل می‌شود (روی همان دیسک فقط rename، بدون کپی)
+و کاربر یک لینک امضا شده با زمان انقضا دریافت می‌کند:
+
+    {CDN_URL}/{key}?expires=<unix time>&sig=<HMAC-SHA256(key:expires)>
+
+سرور فایل داخلی امضا و انقضا را بررسی می‌کند و فایل را (با پشتیبانی از Range) برمی‌گرداند؛
+CDN جلوی این سرور قرار می‌گیرد و پاسخ را تا زمان انقضای لینک کش می‌کند.
+فایل‌های منقضی، و اگر حجم کل از سقف بیشتر شود قدیمی‌ترین فایل‌ها، به صورت دوره‌ای حذف می‌شوند.
+"""
+
+import asyncio
+import hashlib
+import hmac
+import logging
+import os
+import re
+import secrets
+import shutil
+import time
+from abc import ABC, abstractmethod
+from collections import namedtuple
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple, Type
+from urllib.parse import quote
+
+from aiohttp import web
+
+logger = logging.getLogger(__name__)
+
+StoredObject = namedtuple('StoredObject', ['key', 'size', 'mtime'])
+CDNLink = namedtuple('CDNLink', ['url', 'expires'])
+
+UNSAFE_NAME = re.compile(r'[^\w.\-]+')
+
+class StorageBackend(ABC):
+    """
+    ذخیره‌سازی فایل‌های CDN
+    متدها در thread pool اجرا می‌شوند و می‌توانند مسدودکننده باشند.
+    """
+
+    @abstractmethod
+    def put(self, source: Path, key: str) -> int:
+        """انتقال فایل به ذخیره‌سازی؛ حجم ذخیره شده را برمی‌گرداند"""
+
+    @abstractmethod
+    def path(self, key: str) -> Optional[Path]:
+        """مسیر محلی فایل برای سرور داخلی (None = موجود نیست)"""
+
+    @abstractmethod
+    def delete(self, key: str):
+        """حذف فایل (نبود فایل خطا نیست)"""
+
+    @abstractmethod
+    def objects(self) -> List[StoredObject]:
+        """همه فایل‌های ذخیره شده"""
+
+class LocalStorage(StorageBackend):
+    """ذخیره در پوشه محلی (پیاده‌سازی مرجع، سرو شده با CDNServer)"""
+
+    def __init__(self, root: str):
+        self.root = Path(root).resolve()
+        self.root.mkdir(parents=True, exist_ok=True)
+
+    def put(self, source: Path, key: str) -> int:
+        target = self.root / key
+        target.parent.mkdir(parents=True, exist_ok=True)
+        shutil.move(str(source), str(target))
+        os.utime(target)  # عمر فایل از زمان انتشار حساب می‌شود
+        return target.stat().st_size
+
+    def path(self, key: str) -> Optional[Path]:
+        target = (self.root / key).resolve()
+        if self.root not in target.parents or not target.is_file():
+            return None
+        return target
+
+    def delete(self, key: str):
+        target = self.root / key
+        try:
+            target.unlink()
+        except FileNotFoundError:
+            pass
+        if target.parent != self.root:
+            try:
+                target.parent.rmdir()
+            except OSError:
+                pass
+
+    def objects(self) -> List[StoredObject]:
+        result = []
+        for dirpath, _, filenames in os.walk(self.root):
+            for name in filenames:
+                path = Path(dirpath) / name
+                try:
+                    stat = path.stat()
+                except FileNotFoundError:
+                    continue
+                result.append(StoredObject(path.relative_to(self.root).as_posix(), stat.st_size, stat.st_mtime))
+        return result
+
+STORAGE_BACKENDS: Dict[str, Type[StorageBackend]] = {
+    'local': LocalStorage,
+}
+
+def create_storage(name: str, root: str) -> StorageBackend:
+    """ساخت backend ذخیره‌سازی از نام آن در CDN_STORAGE"""
+    backend = STORAGE_BACKENDS.get(name)
+    if backend is None:
+        raise ValueError(f"unknown CDN storage backend: {name}")
+    return backend(root)
+
+class CDNDelivery:
+    """انتشار فایل، ساخت و بررسی لینک امضا شده و حذف دوره‌ای فایل‌های قدیمی"""
+
+    def __init__(self, storage: StorageBackend, base_url: str, secret: str, link_ttl: int = 86400,
+                 max_bytes: int = 50 * 1024 ** 3, gc_interval: float = 600):
+        self.storage = storage
+        self.base_url = base_url.rstrip('/')
+        self.secret = secret.encode()
+        self.link_ttl = link_ttl
+        self.max_bytes = max_bytes
+        self.gc_interval = gc_interval
+        self.stored_bytes = 0
+        self.stored_objects = 0
+        self.published = 0
+        self.evicted = 0
+        self._gc_task: Optional[asyncio.Task] = None
+
+    def accepts(self, size: int) -> bool:
+        """فایل در سقف حجم ذخیره‌سازی جا می‌شود"""
+        return size <= self.max_bytes
+
+    async def publish(self, filepath: Path, filename: str) -> CDNLink:
+        """انتقال فایل دانلود شده به ذخیره‌سازی و ساخت لینک آن"""
+        name = UNSAFE_NAME.sub('_', filename).strip('._') or "file"
+        key = f"{secrets.token_urlsafe(12)}/{name}"
+        loop = asyncio.get_event_loop()
+        size = await loop.run_in_executor(None, self.storage.put, filepath, key)
+        self.published += 1
+        self.stored_bytes += size
+        self.stored_objects += 1
+        if self.stored_bytes > self.max_bytes:
+            await self.collect()
+        return self.sign(key)
+
+    def sign(self, key: str) -> CDNLink:
+        expires = int(time.time()) + self.link_ttl
+        url = f"{self.base_url}/{quote(key)}?expires={expires}&sig={self._signature(key, expires)}"
+        return CDNLink(url, expires)
+
+    def verify(self, key: str, expires: str, signature: str) -> bool:
+        """بررسی امضا و انقضای لینک"""
+        try:
+            expires_at = int(expires)
+        except ValueError:
+            return False
+        if expires_at < time.time():
+            return False
+        return hmac.compare_digest(self._signature(key, expires_at), signature)
+
+    def _signature(self, key: str, expires: int) -> str:
+        return hmac.new(self.secret, f"{key}:{expires}".encode(), hashlib.sha256).hexdigest()
+
+    async def collect(self) -> Tuple[int, int]:
+        """حذف فایل‌های منقضی و در صورت نیاز قدیمی‌ترین فایل‌ها؛ (تعداد، حجم) حذف شده"""
+        loop = asyncio.get_event_loop()
+        return await loop.run_in_executor(None, self._collect)
+
+    def _collect(self) -> Tuple[int, int]:
+        now = time.time()
+        evict, live = [], []
+        for obj in self.storage.objects():
+            (evict if now - obj.mtime > self.link_ttl else live).append(obj)
+        live.sort(key=lambda obj: obj.mtime)
+        total = sum(obj.size for obj in live)
+        while live and total > self.max_bytes:
+            obj = live.pop(0)
+            total -= obj.size
+            evict.append(obj)
+        for obj in evict:
+            self.storage.delete(obj.key)
+        self.stored_bytes = total
+        self.stored_objects = len(live)
+        self.evicted += len(evict)
+        return len(evict), sum(obj.size for obj in evict)
+
+    def start(self):
+        """شروع حذف دوره‌ای"""
+        if self._gc_task is None:
+            self._gc_task = asyncio.ensure_future(self._gc_loop())
+
+    async def stop(self):
+        if self._gc_task:
+            self._gc_task.cancel()
+            try:
+                await self._gc_task
+            except asyncio.CancelledError:
+                pass
+            self._gc_task = None
+
+    async def _gc_loop(self):
+        while True:
+            try:
+                removed, freed = await self.collect()
+                if removed:
+                    logger.info("حذف %s فایل CDN (%.1f MB)", removed, freed / (1024 * 1024))
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error("خطا در پاکسازی فایل‌های CDN: %s", e)
+            await asyncio.sleep(self.gc_interval)
+
+class CDNServer:
+    """سرور فایل پشت CDN: فقط لینک‌های امضا شده و منقضی نشده سرو می‌شوند"""
+
+    def __init__(self, delivery: CDNDelivery, host: str = "0.0.0.0", port: int = 8090):
+        self.delivery = delivery
+        self.host = host
+        self.port = port
+        self.served = 0
+        self.rejected = 0
+        self._runner: Optional[web.AppRunner] = None
+
+    async def start(self):
+        """شروع سرور"""
+        app = web.Application()
+        app.router.add_get("/{key:.+}", self._handle_file)
+        self._runner = web.AppRunner(app, access_log=None)
+        await self._runner.setup()
+        await web.TCPSite(self._runner, self.host, self.port).start()
+        logger.info("سرور فایل CDN روی http://%s:%s فعال شد", self.host, self.port)
+
+    async def stop(self):
+        """توقف سرور"""
+        if self._runner:
+            await self._runner.cleanup()
+            self._runner = None
+
+    async def _handle_file(self, request: web.Request) -> web.StreamResponse:
+        key = request.match_info['key']
+        expires = request.query.get('expires', '')
+        if not self.delivery.verify(key, expires, request.query.get('sig', '')):
+            self.rejected += 1
+            return web.Response(status=403)
+
+        path = self.delivery.storage.path(key)
+        if path is None:
+            return web.Response(status=404)
+
+        self.served += 1
+        max_age = max(0, int(expires) - int(time.time()))
+        return web.FileResponse(path, headers={
+            "Cache-Control": f"public, max-age={max_age}",
+            "Content-Disposition": f"attachment; filename*=UTF-8''{quote(path.name)}",
+        })
@@ -0,0 +1,71 @@
+"""
+نظارت بر فایل‌های تنظیمات و بارگذاری مجدد بدون ری‌استارت
+"""
+
+import asyncio
+import os
+import logging
+from typing import Awaitable, Callable, Dict, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+FileSignature = Optional[Tuple[int, int]]
+
+class ConfigWatcher:
+    """بررسی دوره‌ای mtime فایل‌ها و فراخوانی callback در صورت تغییر"""
+
+    def __init__(self, interval: float = 5.0):
+        self.interval = interval
+        self._watches: Dict[str, Tuple[Callable[[], Awaitable[None]], FileSignature]] = {}
+        self._task: Optional[asyncio.Task] = None
+
+    def watch(self, path: str, callback: Callable[[], Awaitable[None]]):
+        """ثبت فایل برای نظارت (وضعیت فعلی فایل مبنا قرار می‌گیرد)"""
+        self._watches[str(path)] = (callback, self._signature(path))
+
+    def start(self):
+        """شروع نظارت در پس‌زمینه"""
+        if self._task is None or self._task.done():
+            self._task = asyncio.ensure_future(self._run())
+
+    async def stop(self):
+        """توقف نظارت"""
+        if self._task and not self._task.done():
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+        self._task = None
+
+    async def check(self):
+        """یک دور بررسی همه فایل‌ها"""
+        for path, (callback, last_signature) in list(self._watches.items()):
+            signature = self._signature(path)
+            if signature == last_signature:
+                continue
+
+            self._watches[path] = (callback, signature)
+            if signature is None:
+                logger.warning("فایل تنظیمات حذف شد: %s", path)
+                continue
+
+            try:
+                await callback()
+            except Exception as e:
+                logger.error("خطا در بارگذاری مجدد %s: %s", path, e)
+
+    async def _run(self):
+        """حلقه نظارت"""
+        while True:
+            await asyncio.sleep(self.interval)
+            await self.check()
+
+    @staticmethod
+    def _signature(path: str) -> FileSignature:
+        """امضای فایل بر اساس زمان تغییر و حجم"""
+        try:
+            stat = os.stat(path)
+            return stat.st_mtime_ns, stat.st_size
+        except OSError:
+            return None
@@ -0,0 +1,75 @@
+"""
+حذف درخواست‌های تکراری
+
+- لینک تکراری یک کاربر تا پایان کار در حال اجرا (و مدت کوتاهی بعد از موفقیت) نادیده گرفته می‌شود
+- update هایی که تلگرام دوباره می‌فرستد با پنجره update_id حذف می‌شوند
+کلیدها (کاربر، کلید ۶۴ بیتی لینک نرمال‌شده) هستند تا حافظه کم بماند.
+"""
+
+import time
+from collections import deque
+from typing import Deque, Dict, Optional, Set, Tuple
+
+from utils.url_canon import url_key
+
+ACTIVE = float('inf')  # کار هنوز در جریان است
+
+RequestKey = Tuple[int, int]
+
+def request_key(user_id: int, url: str) -> RequestKey:
+    """(کاربر، کلید ۶۴ بیتی لینک نرمال‌شده)"""
+    return user_id, url_key(url)
+
+class RecentRequestFilter:
+    """فیلتر درخواست‌های اخیر هر کاربر + پنجره شناسه update ها"""
+
+    def __init__(self, completed_ttl: float = 30.0, update_window: int = 4096, max_entries: int = 100_000):
+        self.completed_ttl = completed_ttl
+        self.max_entries = max_entries
+        self._entries: Dict[RequestKey, float] = {}  # کلید -> زمان انقضا (ACTIVE برای کار در جریان)
+        self._update_ids: Deque[int] = deque(maxlen=update_window)
+        self._update_set: Set[int] = set()
+        self.dropped_urls = 0
+        self.dropped_updates = 0
+
+    def seen_update(self, update_id: int) -> bool:
+        """True اگر این update قبلاً پردازش شده باشد (در غیر این صورت ثبت می‌شود)"""
+        if update_id in self._update_set:
+            self.dropped_updates += 1
+            return True
+        if len(self._update_ids) == self._update_ids.maxlen:
+            self._update_set.discard(self._update_ids[0])
+        self._update_ids.append(update_id)
+        self._update_set.add(update_id)
+        return False
+
+    def claim(self, user_id: int, url: str) -> Optional[RequestKey]:
+        """
+        ثبت شروع کار برای (کاربر، لینک)
+        بازگشت: کلید برای release، یا None اگر همین لینک در جریان است یا تازه تحویل شده
+        """
+        key = request_key(user_id, url)
+        now = time.monotonic()
+        expires = self._entries.get(key)
+        if expires is not None and expires > now:
+            self.dropped_urls += 1
+            return None
+        if len(self._entries) >= self.max_entries:
+            self._prune(now)
+        self._entries[key] = ACTIVE
+        return key
+
+    def release(self, key: RequestKey, succeeded: bool):
+        """پایان کار: پس از موفقیت تا completed_ttl تکرار حذف می‌شود، خطا امکان تلاش مجدد فوری می‌دهد"""
+        if succeeded and self.completed_ttl > 0:
+            self._entries[key] = time.monotonic() + self.completed_ttl
+        else:
+            self._entries.pop(key, None)
+
+    def _prune(self, now: float):
+        for key in [key for key, expires in self._entries.items() if expires <= now]:
+            del self._entries[key]
+
+
+# نمونه سراسری
+recent_requests = RecentRequestFilter()
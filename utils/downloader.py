@@ -7,61 +7,169 @@ import aiofiles
 import asyncio
 import os
 import re
-from typing import Optional, Dict, Set
+import shutil
+import time
+from collections import deque, namedtuple
+from typing import Callable, Optional, Dict, Deque, Iterable
 from pathlib import Path
+from urllib.parse import urlparse
 import logging
 from datetime import datetime
 
+from config.i18n import translator
+from utils.timeseries import throughput
+from utils.histogram import latency
+from utils.metrics import metrics
+from utils.tracing import tracer
+
 logger = logging.getLogger(__name__)
 
+# نتیجه HEAD: نام فایل، حجم (۰ یعنی نامشخص)، نوع محتوا و شناسه نسخه فایل (ETag یا Last-Modified برای If-Range)
+ProbeResult = namedtuple('ProbeResult', ['filename', 'size', 'content_type', 'validator'])
+
+# Content-Range پاسخ 206: bytes <شروع>-<پایان>/<حجم کل یا *>
+CONTENT_RANGE = re.compile(r'bytes\s+(\d+)-\d+/(\d+|\*)')
+
+class ResizableSemaphore:
+    """سمافور با ظرفیت قابل تغییر در زمان اجرا (برای بارگذاری مجدد تنظیمات)"""
+    
+    def __init__(self, limit: int):
+        self._limit = max(1, limit)
+        self._active = 0
+        self._waiters: Deque[asyncio.Future] = deque()
+    
+    @property
+    def limit(self) -> int:
+        return self._limit
+    
+    @property
+    def active(self) -> int:
+        return self._active
+    
+    @property
+    def waiting(self) -> int:
+        """تعداد درخواست‌های در صف انتظار"""
+        return sum(1 for waiter in self._waiters if not waiter.done())
+    
+    def resize(self, limit: int):
+        """تغییر ظرفیت؛ اسلات‌های در حال استفاده تا پایان کار حفظ می‌شوند"""
+        self._limit = max(1, limit)
+        self._wake_up()
+    
+    async def acquire(self):
+        if self._active < self._limit and not self._waiters:
+            self._active += 1
+            return
+        
+        waiter = asyncio.get_event_loop().create_future()
+        self._waiters.append(waiter)
+        try:
+            await waiter
+        except asyncio.CancelledError:
+            if waiter.done() and not waiter.cancelled():
+                # اسلات داده شده بود ولی تسک لغو شد
+                self.release()
+            else:
+                try:
+                    self._waiters.remove(waiter)
+                except ValueError:
+                    pass
+            raise
+    
+    def release(self):
+        self._active -= 1
+        self._wake_up()
+    
+    def _wake_up(self):
+        while self._waiters and self._active < self._limit:
+            waiter = self._waiters.popleft()
+            if not waiter.done():
+                self._active += 1
+                waiter.set_result(None)
+    
+    async def __aenter__(self):
+        await self.acquire()
+    
+    async def __aexit__(self, exc_type, exc, tb):
+        self.release()
+
+class _NoLimit:
+    """جایگزین بی‌اثر برای اسلات‌های مشترک (حالت تک‌پروسه)"""
+    
+    async def __aenter__(self):
+        pass
+    
+    async def __aexit__(self, exc_type, exc, tb):
+        pass
+
 class DownloadManager:
     """مدیریت دانلود فایل‌ها با قابلیت محدودیت همزمان"""
     
     def __init__(self, max_file_size: int = 2 * 1024 * 1024 * 1024,  # 2GB
-                 parallel_downloads: int = 3):
+                 parallel_downloads: int = 3, config=None, request_timeout: int = 30):
         self.max_file_size = max_file_size
         self.parallel_downloads = parallel_downloads
-        self.semaphore = asyncio.Semaphore(parallel_downloads)
-        self.active_downloads: Set[int] = set()  # user_id های در حال دانلود
+        self.request_timeout = request_timeout
+        self.semaphore = ResizableSemaphore(parallel_downloads)
+        self.global_slots = _NoLimit()  # اسلات‌های مشترک بین worker ها (bot.supervisor.GlobalSlots)
+        self.active_downloads: Dict[int, int] = {}  # user_id -> تعداد دانلودهای در جریان (سقف هر کاربر در صف کارها اعمال می‌شود)
         self.session: Optional[aiohttp.ClientSession] = None
+        self.config = config  # AppConfig برای اعمال سهمیه کاربران
+        self.reserved_disk = 0  # حجم رزرو شده برای دانلودهای در جریان
         self.temp_dir = Path("temp")
         self.temp_dir.mkdir(exist_ok=True)
     
     async def _get_session(self) -> aiohttp.ClientSession:
         """دریافت یا ایجاد session"""
         if self.session is None or self.session.closed:
-            timeout = aiohttp.ClientTimeout(total=300)  # 5 دقیقه
-            self.session = aiohttp.ClientSession(timeout=timeout)
+            self.session = aiohttp.ClientSession(timeout=self._timeout())
         return self.session
     
-    async def download_file(self, url: str, user_id: int) -> Optional[Path]:
+    def _timeout(self) -> aiohttp.ClientTimeout:
+        """تایم‌اوت درخواست‌ها (هر درخواست مقدار فعلی را می‌خواند)"""
+        return aiohttp.ClientTimeout(
+            total=300,  # 5 دقیقه
+            sock_connect=self.request_timeout,
+            sock_read=self.request_timeout
+        )
+    
+    def apply_limits(self, max_file_size: int, parallel_downloads: int, request_timeout: int):
+        """اعمال محدودیت‌های جدید در زمان اجرا"""
+        self.max_file_size = max_file_size
+        self.request_timeout = request_timeout
+        if parallel_downloads != self.parallel_downloads:
+            self.parallel_downloads = parallel_downloads
+            self.semaphore.resize(parallel_downloads)
+        logger.info(
+            "محدودیت‌های دانلود به‌روز شد: همزمان=%s، حداکثر حجم=%s، تایم‌اوت=%ss",
+            parallel_downloads, self._format_size(max_file_size), request_timeout
+        )
+    
+    async def probe(self, url: str) -> ProbeResult:
         """
-        دانلود فایل از URL
-        بازگشت: مسیر فایل دانلود شده یا None در صورت خطا
+        بررسی لینک با HEAD بدون دانلود (وضعیت، حجم، نوع محتوا و پسوند مجاز)
+        خطاها مانند دانلود عادی با پیام قابل نمایش به کاربر
         """
-        # بررسی اینکه کاربر در حال دانلود فایل دیگری نباشد
-        if user_id in self.active_downloads:
-            raise Exception("⏳ شما در حال دانلود فایل دیگری هستید")
-        
-        self.active_downloads.add(user_id)
-        
-        try:
-            async with self.semaphore:
-                return await self._download_file_internal(url, user_id)
-        finally:
-            self.active_downloads.discard(user_id)
-    
-    async def _download_file_internal(self, url: str, user_id: int) -> Optional[Path]:
-        """دانلود داخلی فایل"""
         session = await self._get_session()
-        
         try:
-            # بررسی HEAD برای دریافت اطلاعات فایل
-            async with session.head(url, allow_redirects=True) as response:
+            return await self._head(session, url)
+        except aiohttp.ClientError as e:
+            metrics.count_error("http")
+            raise Exception(f"❌ خطا در ارتباط با سرور: {str(e)}")
+        except asyncio.TimeoutError:
+            metrics.count_error("timeout")
+            raise Exception("❌ زمان دانلود به پایان رسید")
+    
+    async def _head(self, session: aiohttp.ClientSession, url: str) -> ProbeResult:
+        # بررسی HEAD برای دریافت اطلاعات فایل
+        with latency.time("head"), tracer.span("head") as span:
+            async with session.head(url, allow_redirects=True, timeout=self._timeout()) as response:
+                span.set(status=response.status, content_length=response.headers.get('Content-Length'))
                 if not response.status == 200:
                     raise Exception(f"❌ سرور خطا داد: {response.status}")
                 
                 content_length = response.headers.get('Content-Length')
+                file_size = 0
                 if content_length:
                     file_size = int(content_length)
                     if file_size > self.max_file_size:
@@ -73,46 +181,219 @@ class DownloadManager:
                 content_type = response.headers.get('Content-Type', '')
                 if 'text/html' in content_type:
                     raise Exception("❌ لینک معتبر فایل نیست (صفحه HTML)")
+                
+                # If-Range فقط ETag قوی یا Last-Modified را می‌پذیرد
+                validator = response.headers.get('ETag', '')
+                if validator.startswith('W/'):
+                    validator = ''
+                validator = validator or response.headers.get('Last-Modified', '')
+        
+        # استخراج نام فایل
+        filename = self._extract_filename(url, response.headers)
+        
+        # بررسی پسوند فایل
+        if not self._check_file_extension(filename):
+            raise Exception("❌ این نوع فایل به دلایل امنیتی مجاز نیست")
+        return ProbeResult(filename, file_size, content_type, validator)
+    
+    async def download_file(self, url: str, user_id: int, job_id: Optional[str] = None,
+                            on_progress: Optional[Callable[[Path, int, str], None]] = None,
+                            probe: Optional[ProbeResult] = None, validator: str = "") -> Optional[Path]:
+        """
+        دانلود فایل از URL
+        job_id: نام فایل ثابت برای کار؛ اگر فایل نیمه‌تمام آن وجود داشته باشد با Range ادامه داده می‌شود
+        on_progress: فراخوانی با (مسیر فایل، بایت‌های دریافت شده، validator فایل) پس از هر قطعه
+        probe: نتیجه HEAD قبلی (خروجی probe) تا دوباره درخواست نشود
+        validator: ETag/Last-Modified فایل نیمه‌تمام از تلاش قبلی؛ اگر فایل روی سرور عوض شده باشد از ابتدا دانلود می‌شود
+        بازگشت: مسیر فایل دانلود شده یا None در صورت خطا
+        """
+        self.active_downloads[user_id] = self.active_downloads.get(user_id, 0) + 1
+        
+        try:
+            with tracer.span("download_file", host=urlparse(url).hostname):
+                queued_at = time.monotonic()
+                async with self.semaphore, self.global_slots:
+                    queue_wait = time.monotonic() - queued_at
+                    throughput.record(queue_wait=queue_wait, queued=1)
+                    tracer.record("queue_wait", queue_wait)
+                    return await self._download_file_internal(url, user_id, job_id, on_progress, probe, validator)
+        finally:
+            remaining = self.active_downloads.pop(user_id) - 1
+            if remaining:
+                self.active_downloads[user_id] = remaining
+    
+    async def _download_file_internal(self, url: str, user_id: int, job_id: Optional[str] = None,
+                                      on_progress: Optional[Callable[[Path, int, str], None]] = None,
+                                      probe: Optional[ProbeResult] = None, validator: str = "") -> Optional[Path]:
+        """دانلود داخلی فایل"""
+        session = await self._get_session()
+        slot_started = time.monotonic()
+        reserved = 0
+        total_size = 0
+        resumed_from = 0
+        
+        try:
+            filename, file_size, _, current_validator = probe or await self._head(session, url)
             
-            # استخراج نام فایل
-            filename = self._extract_filename(url, response.headers)
+            # ایجاد نام فایل منحصر به فرد (برای کارهای صف ثابت است تا بتوان ادامه داد)
+            if job_id:
+                unique_filename = f"{user_id}_{job_id}_{filename}"
+            else:
+                timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+                unique_filename = f"{user_id}_{timestamp}_{filename}"
+            filepath = self.temp_dir / unique_filename
+            if job_id and filepath.exists():
+                resumed_from = filepath.stat().st_size
+                if file_size and resumed_from > file_size:
+                    resumed_from = 0
+                elif resumed_from and validator and current_validator and validator != current_validator:
+                    logger.info("فایل %s روی سرور تغییر کرده است؛ شروع مجدد", filename)
+                    resumed_from = 0
+            # If-Range با نسخه‌ای که بخش دانلود شده از آن است
+            if_range = (validator if resumed_from else "") or current_validator
             
-            # بررسی پسوند فایل
-            if not self._check_file_extension(filename):
-                raise Exception("❌ این نوع فایل به دلایل امنیتی مجاز نیست")
+            # پذیرش بر اساس Content-Length (باقی‌مانده) پیش از شروع دانلود
+            remaining = max(0, file_size - resumed_from) if file_size else 0
+            budget = self._admit(user_id, remaining)
+            reserved = remaining
+            total_size = resumed_from
             
-            # ایجاد نام فایل منحصر به فرد
-            timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-            unique_filename = f"{user_id}_{timestamp}_{filename}"
-            filepath = self.temp_dir / unique_filename
+            if file_size and resumed_from == file_size:
+                logger.info("فایل %s قبلاً کامل دانلود شده است", filename)
+                return filepath
+            
+            if on_progress is not None:
+                on_progress(filepath, total_size, current_validator)
             
             # دانلود فایل
-            logger.info(f"شروع دانلود فایل: {filename} از {url}")
+            logger.info("شروع دانلود فایل: %s از %s", filename, url)
+            download_started = time.monotonic()
             
-            async with session.get(url) as response:
-                response.raise_for_status()
+            write_time = 0.0
+            chunks = 0
+            with tracer.span("get_stream", resumed_from=resumed_from) as span:
+                response, resumed_from = await self._get_stream(session, url, filename, resumed_from,
+                                                                if_range, file_size)
+                total_size = resumed_from
+                async with response:
+                    span.set(status=response.status)
+                    response.raise_for_status()
+                    
+                    async with aiofiles.open(filepath, 'ab' if resumed_from else 'wb') as f:
+                        async for chunk in response.content.iter_chunked(8192):  # 8KB chunks
+                            if not chunks:
+                                first_byte = time.monotonic() - download_started
+                                latency.observe("first_byte", first_byte)
+                                span.set(first_byte_ms=round(first_byte * 1000, 1))
+                            write_started = time.perf_counter()
+                            await f.write(chunk)
+                            write_time += time.perf_counter() - write_started
+                            chunks += 1
+                            total_size += len(chunk)
+                            
+                            if total_size > self.max_file_size:
+                                await f.close()
+                                if filepath.exists():
+                                    filepath.unlink()
+                                raise Exception("❌ حجم فایل بیش از حد مجاز است")
+                            
+                            if on_progress is not None:
+                                on_progress(filepath, total_size, current_validator)
+                            
+                            if budget is not None and total_size - resumed_from > budget:
+                                await f.close()
+                                if filepath.exists():
+                                    filepath.unlink()
+                                allowed, error_message = self.config.check_quota(user_id, total_size)
+                                raise Exception(error_message or "❌ سهمیه دانلود شما تمام شده است")
                 
-                total_size = 0
-                async with aiofiles.open(filepath, 'wb') as f:
-                    async for chunk in response.content.iter_chunked(8192):  # 8KB chunks
-                        await f.write(chunk)
-                        total_size += len(chunk)
-                        
-                        if total_size > self.max_file_size:
-                            await f.close()
-                            if filepath.exists():
-                                filepath.unlink()
-                            raise Exception("❌ حجم فایل بیش از حد مجاز است")
+                span.set(bytes=total_size)
+                tracer.record("disk_write", write_time, chunks=chunks, bytes=total_size)
             
-            logger.info(f"دانلود کامل شد: {filename} - حجم: {self._format_size(total_size)}")
+            download_time = time.monotonic() - download_started
+            latency.observe("download", download_time)
+            throughput.record(download_time=download_time, downloads=1)
+            logger.info("دانلود کامل شد: %s - حجم: %s", filename, self._format_size(total_size))
             return filepath
             
         except aiohttp.ClientError as e:
+            metrics.count_error("http")
             raise Exception(f"❌ خطا در ارتباط با سرور: {str(e)}")
         except asyncio.TimeoutError:
+            metrics.count_error("timeout")
             raise Exception("❌ زمان دانلود به پایان رسید")
         except Exception as e:
             raise e
+        finally:
+            transferred = total_size - resumed_from
+            throughput.record(bytes_in=transferred)
+            self._settle(user_id, reserved, transferred, time.monotonic() - slot_started)
+    
+    async def _get_stream(self, session: aiohttp.ClientSession, url: str, filename: str, resumed_from: int,
+                          validator: str, file_size: int):
+        """
+        شروع GET؛ برای ادامه دانلود با Range و If-Range
+        اگر سرور Range را نپذیرد، فایل تغییر کرده باشد یا Content-Range با فایل نیمه‌تمام نخواند
+        از ابتدا دانلود می‌شود
+        بازگشت: (پاسخ، offset شروع بدنه)
+        """
+        if resumed_from:
+            headers = {'Range': f"bytes={resumed_from}-"}
+            if validator:
+                headers['If-Range'] = validator
+            response = await session.get(url, headers=headers, timeout=self._timeout())
+            if response.status == 206 and self._range_matches(response, resumed_from, file_size):
+                logger.info("ادامه دانلود %s از بایت %s", filename, resumed_from)
+                return response, resumed_from
+            if response.status not in (206, 416):
+                # 200: سرور Range را پشتیبانی نمی‌کند یا If-Range رد شد؛ بدنه کل فایل است
+                logger.info("ادامه دانلود ممکن نیست؛ شروع مجدد %s", filename)
+                return response, 0
+            response.release()
+            logger.info("بازه پاسخ سرور با فایل نیمه‌تمام نمی‌خواند؛ شروع مجدد %s", filename)
+        return await session.get(url, timeout=self._timeout()), 0
+    
+    @staticmethod
+    def _range_matches(response, offset: int, file_size: int) -> bool:
+        """Content-Range پاسخ 206 از همان offset و با همان حجم کل فایل باشد"""
+        match = CONTENT_RANGE.match(response.headers.get('Content-Range', ''))
+        if not match or int(match.group(1)) != offset:
+            return False
+        total = match.group(2)
+        return total == '*' or not file_size or int(total) == file_size
+    
+    def _admit(self, user_id: int, file_size: int) -> Optional[int]:
+        """
+        پذیرش دانلود بر اساس سهمیه کاربر و فضای دیسک و رزرو آن
+        بازگشت: حداکثر بایت مجاز برای این دانلود (None یعنی بدون سهمیه)
+        """
+        budget = None
+        if self.config is not None:
+            allowed, error_message = self.config.check_quota(user_id, file_size)
+            if not allowed:
+                raise Exception(error_message)
+            budget = self.config.quota_remaining_bytes(user_id)
+        
+        if file_size:
+            free_space = shutil.disk_usage(str(self.temp_dir)).free
+            if free_space - self.reserved_disk < file_size:
+                user_lang = self.config.get_user_language(user_id) if self.config is not None else None
+                raise Exception(translator.get("server_busy", user_lang))
+            
+            self.reserved_disk += file_size
+            if self.config is not None:
+                self.config.reserve_quota(user_id, file_size)
+        
+        return budget
+    
+    def _settle(self, user_id: int, reserved: int, transferred: int, slot_seconds: float):
+        """آزادسازی رزرو و ثبت مصرف واقعی (بایت و زمان اسلات) در سهمیه کاربر"""
+        if reserved:
+            self.reserved_disk = max(0, self.reserved_disk - reserved)
+        if self.config is not None:
+            if reserved:
+                self.config.release_quota(user_id, reserved)
+            self.config.charge_quota(user_id, transferred, slot_seconds)
     
     def _extract_filename(self, url: str, headers: Dict) -> str:
         """استخراج نام فایل از URL یا headers"""
@@ -153,22 +434,9 @@ class DownloadManager:
     
     def _check_file_extension(self, filename: str) -> bool:
         """بررسی پسوند فایل برای امنیت"""
-        from config import get_config
-        import asyncio
+        from config import get_snapshot
         
-        try:
-            # بارگذاری تنظیمات (سازگار با پایتون 3.6)
-            loop = asyncio.get_event_loop()
-            config = loop.run_until_complete(get_config())
-            blocked_extensions = config.security.blocked_extensions
-            
-            extension = filename.split('.')[-1].lower() if '.' in filename else ''
-            return extension not in blocked_extensions
-        except:
-            # در صورت خطا، لیست پیش‌فرض
-            blocked_extensions = ["exe", "scr", "bat", "cmd", "msi", "vbs"]
-            extension = filename.split('.')[-1].lower() if '.' in filename else ''
-            return extension not in blocked_extensions
+        return not get_snapshot().is_extension_blocked(filename)
     
     def _format_size(self, size_bytes: int) -> str:
         """فرمت‌بندی حجم فایل"""
@@ -178,23 +446,24 @@ class DownloadManager:
             size_bytes /= 1024.0
         return f"{size_bytes:.2f} TB"
     
-    async def cleanup_temp_files(self, older_than_hours: int = 24):
-        """پاکسازی فایل‌های موقت قدیمی"""
+    async def cleanup_temp_files(self, older_than_hours: int = 24, keep: Iterable[str] = ()):
+        """پاکسازی فایل‌های موقت قدیمی (به جز keep: فایل‌های کارهای قابل ادامه)"""
+        keep = {Path(path).name for path in keep}
         try:
             now = datetime.now().timestamp()
             for filepath in self.temp_dir.iterdir():
-                if filepath.is_file():
+                if filepath.is_file() and filepath.name not in keep:
                     file_age = now - filepath.stat().st_mtime
                     if file_age > older_than_hours * 3600:
                         filepath.unlink()
-                        logger.info(f"فایل موقت حذف شد: {filepath.name}")
+                        logger.info("فایل موقت حذف شد: %s", filepath.name)
         except Exception as e:
             logger.error(f"خطا در پاکسازی فایل‌های موقت: {e}")
     
-    async def shutdown(self):
+    async def shutdown(self, keep: Iterable[str] = ()):
         """خاموش کردن manager"""
-        # پاکسازی فایل‌های موقت
-        await self.cleanup_temp_files(older_than_hours=0)
+        # پاکسازی فایل‌های موقت (فایل‌های کارهای نیمه‌تمام برای ادامه پس از ری‌استارت می‌مانند)
+        await self.cleanup_temp_files(older_than_hours=0, keep=keep)
         
         # بستن session
         if self.session and not self.session.closed:
@@ -0,0 +1,133 @@
+"""
+هیستوگرام تأخیر با سطل‌های لگاریتمی (سبک HDR) برای مراحل پردازش
+"""
+
+import time
+from contextlib import contextmanager
+from typing import Dict, Iterator, List, Optional, Tuple
+
+# هر توان دو به ۱۶ سطل تقسیم می‌شود (خطای نسبی حداکثر ~۶٪)
+SUB_BUCKET_BITS = 4
+SUB_BUCKETS = 1 << SUB_BUCKET_BITS
+
+def bucket_index(micros: int) -> int:
+    """شماره سطل برای مقدار (میکروثانیه)"""
+    if micros < SUB_BUCKETS:
+        return max(0, micros)
+    shift = micros.bit_length() - SUB_BUCKET_BITS - 1
+    return SUB_BUCKETS * (shift + 1) + ((micros >> shift) - SUB_BUCKETS)
+
+def bucket_bounds(index: int) -> Tuple[int, int]:
+    """بازه [پایین، بالا) سطل به میکروثانیه"""
+    if index < SUB_BUCKETS:
+        return index, index + 1
+    shift = index // SUB_BUCKETS - 1
+    mantissa = index % SUB_BUCKETS + SUB_BUCKETS
+    return mantissa << shift, (mantissa + 1) << shift
+
+class LatencyHistogram:
+    """هیستوگرام قابل ادغام (شمارش پراکنده سطل‌ها)"""
+
+    __slots__ = ('counts', 'count', 'total', 'max')
+
+    def __init__(self):
+        self.counts: Dict[int, int] = {}
+        self.count = 0
+        self.total = 0.0  # مجموع ثانیه‌ها
+        self.max = 0.0
+
+    def record(self, seconds: float):
+        index = bucket_index(int(seconds * 1_000_000))
+        self.counts[index] = self.counts.get(index, 0) + 1
+        self.count += 1
+        self.total += seconds
+        if seconds > self.max:
+            self.max = seconds
+
+    def merge(self, other: 'LatencyHistogram'):
+        for index, count in other.counts.items():
+            self.counts[index] = self.counts.get(index, 0) + count
+        self.count += other.count
+        self.total += other.total
+        self.max = max(self.max, other.max)
+
+    def percentile(self, q: float) -> float:
+        """صدک q (۰ تا ۱۰۰) به ثانیه (میانه سطل)"""
+        if not self.count:
+            return 0.0
+        target = max(1, int(round(self.count * q / 100.0)))
+        seen = 0
+        for index in sorted(self.counts):
+            seen += self.counts[index]
+            if seen >= target:
+                lower, upper = bucket_bounds(index)
+                return min(self.max, (lower + upper) / 2 / 1_000_000)
+        return self.max
+
+    @property
+    def mean(self) -> float:
+        return self.total / self.count if self.count else 0.0
+
+    def cumulative(self) -> List[Tuple[float, int]]:
+        """شمارش تجمعی به ازای حد بالای هر سطل (ثانیه) برای خروجی Prometheus"""
+        result = []
+        seen = 0
+        for index in sorted(self.counts):
+            seen += self.counts[index]
+            result.append((bucket_bounds(index)[1] / 1_000_000, seen))
+        return result
+
+class LatencyRecorder:
+    """هیستوگرام هر مرحله: کل دوره اجرا + پنجره‌های دقیقه‌ای (یک ساعت اخیر)"""
+
+    def __init__(self, window_minutes: int = 60):
+        self.window_minutes = window_minutes
+        self.lifetime: Dict[str, LatencyHistogram] = {}
+        self._minutes: Dict[str, List[Tuple[int, LatencyHistogram]]] = {}
+
+    def observe(self, stage: str, seconds: float):
+        """ثبت مدت زمان یک مرحله"""
+        histogram = self.lifetime.get(stage)
+        if histogram is None:
+            histogram = self.lifetime[stage] = LatencyHistogram()
+            self._minutes[stage] = [(-1, LatencyHistogram()) for _ in range(self.window_minutes)]
+        histogram.record(seconds)
+
+        minute = int(time.time() // 60)
+        ring = self._minutes[stage]
+        slot = minute % self.window_minutes
+        slot_minute, slot_histogram = ring[slot]
+        if slot_minute != minute:
+            slot_histogram = LatencyHistogram()
+            ring[slot] = (minute, slot_histogram)
+        slot_histogram.record(seconds)
+
+    @contextmanager
+    def time(self, stage: str) -> Iterator[None]:
+        """اندازه‌گیری مدت اجرای بلوک (با یا بدون خطا)"""
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(stage, time.perf_counter() - started)
+
+    def window(self, seconds: Optional[int] = None) -> Dict[str, LatencyHistogram]:
+        """هیستوگرام ادغام‌شده هر مرحله در `seconds` ثانیه اخیر (None = کل دوره)"""
+        if seconds is None:
+            return dict(self.lifetime)
+
+        minutes = max(1, min(self.window_minutes, -(-seconds // 60)))
+        current = int(time.time() // 60)
+        result = {}
+        for stage, ring in self._minutes.items():
+            merged = LatencyHistogram()
+            for slot_minute, slot_histogram in ring:
+                if current - minutes < slot_minute <= current:
+                    merged.merge(slot_histogram)
+            if merged.count:
+                result[stage] = merged
+        return result
+
+
+# نمونه سراسری
+latency = LatencyRecorder()
@@ -0,0 +1,88 @@
+"""
+فیلتر میزبان‌ها (لیست مجاز/مسدود) با درخت برچسب‌های معکوس
+
+هر ورودی دامنه و همه زیردامنه‌هایش را شامل می‌شود (example.com -> cdn.example.com).
+بررسی هر میزبان O(تعداد برچسب‌ها) است و قبل از هر درخواست شبکه انجام می‌شود.
+"""
+
+from typing import Dict, Iterable, Optional
+from urllib.parse import urlsplit
+
+_END = ''  # نشانه پایان یک ورودی در درخت (برچسب خالی در دامنه معتبر رخ نمی‌دهد)
+
+def normalize_host(host: str) -> str:
+    """حروف کوچک، حذف نقطه انتهایی و *. و تبدیل دامنه یونیکد به IDNA"""
+    host = host.strip().lower().rstrip('.')
+    if host.startswith('*.'):
+        host = host[2:]
+    try:
+        return host.encode('idna').decode('ascii')
+    except UnicodeError:
+        return host
+
+def url_host(url: str) -> Optional[str]:
+    """میزبان نرمال‌شده یک لینک (None اگر لینک میزبان نداشته باشد)"""
+    try:
+        host = urlsplit(url.strip()).hostname
+    except ValueError:
+        return None
+    return normalize_host(host) if host else None
+
+class SuffixTrie:
+    """درخت برچسب‌های معکوس دامنه‌ها (com -> example -> cdn)"""
+
+    __slots__ = ('_root', '_size')
+
+    def __init__(self, hosts: Iterable[str] = ()):
+        self._root: Dict[str, dict] = {}
+        self._size = 0
+        for host in hosts:
+            self.add(host)
+
+    def __len__(self) -> int:
+        return self._size
+
+    def add(self, host: str):
+        host = normalize_host(host)
+        if not host:
+            return
+        node = self._root
+        for label in reversed(host.split('.')):
+            node = node.setdefault(label, {})
+        if _END not in node:
+            node[_END] = {}
+            self._size += 1
+
+    def matches(self, host: str) -> bool:
+        """آیا میزبان (نرمال‌شده) خودش یا یکی از دامنه‌های والدش در درخت است"""
+        node = self._root
+        for label in reversed(host.split('.')):
+            node = node.get(label)
+            if node is None:
+                return False
+            if _END in node:
+                return True
+        return False
+
+class HostFilter:
+    """لیست مسدود بر لیست مجاز مقدم است؛ لیست مجاز خالی یعنی همه میزبان‌ها مجازند"""
+
+    __slots__ = ('allowed', 'blocked')
+
+    def __init__(self, allowed_hosts: Iterable[str] = (), blocked_hosts: Iterable[str] = ()):
+        self.allowed = SuffixTrie(allowed_hosts)
+        self.blocked = SuffixTrie(blocked_hosts)
+
+    def is_allowed(self, host: Optional[str]) -> bool:
+        """بررسی میزبان نرمال‌شده (خروجی url_host)"""
+        if not host:
+            return False
+        if self.blocked.matches(host):
+            return False
+        return not self.allowed or self.allowed.matches(host)
+
+    def check_url(self, url: str) -> bool:
+        """آیا دانلود از این لینک مجاز است"""
+        if not self.allowed and not self.blocked:
+            return True
+        return self.is_allowed(url_host(url))
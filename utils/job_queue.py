@@ -0,0 +1,423 @@
+"""
+صف ماندگار کارهای آپلود (SQLite)
+
+هندلرها کار را ثبت می‌کنند و فوراً برمی‌گردند؛ چند worker کارها را از صف برمی‌دارند.
+وضعیت و offset دانلود در پایگاه داده ذخیره می‌شود تا پس از ری‌استارت کارهای
+نیمه‌تمام (با HTTP Range) ادامه پیدا کنند یا دوباره اجرا شوند.
+
+هر کاربر صف انتظار جداگانه دارد و worker ها به نوبت (round-robin) از کاربرانی کار
+برمی‌دارند که کمتر از سقف همزمانی خود (بر اساس سطح کاربر) کار در حال اجرا دارند؛
+پس لینک‌های اضافه یک کاربر در صف می‌مانند و جلوی کاربران دیگر را نمی‌گیرند.
+"""
+
+import asyncio
+import logging
+import os
+import sqlite3
+import threading
+import time
+import uuid
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, fields
+from typing import Awaitable, Callable, Deque, Dict, List, Optional, Set, Tuple
+
+logger = logging.getLogger(__name__)
+
+JOBS_PATH = "data/jobs.sqlite3"
+
+QUEUED = "queued"
+RUNNING = "running"
+DELIVERING = "delivering"  # دانلود شده، منتظر ارسال با آلبوم دسته
+DONE = "done"
+FAILED = "failed"
+CANCELLED = "cancelled"
+
+UNFINISHED = (QUEUED, RUNNING, DELIVERING)
+
+CHECKPOINT_INTERVAL = 5.0  # ثانیه بین ذخیره offset
+
+@dataclass
+class Job:
+    job_id: str
+    user_id: int
+    chat_id: int
+    status_message_id: int
+    url: str
+    state: str = QUEUED
+    offset: int = 0  # بایت‌های دانلود شده (برای ادامه با Range)
+    filepath: str = ""  # فایل نیمه‌تمام
+    attempts: int = 0
+    error: str = ""
+    created_at: float = 0.0
+    updated_at: float = 0.0
+    batch_id: str = ""  # لینک‌هایی که با هم فرستاده شده‌اند (ارسال آلبومی)
+    validator: str = ""  # ETag/Last-Modified نسخه‌ای که فایل نیمه‌تمام از آن است (If-Range)
+
+JOB_COLUMNS = tuple(f.name for f in fields(Job))
+_UNFINISHED_MARKS = ", ".join("?" for _ in UNFINISHED)
+
+# ستون‌هایی که بعداً اضافه شده‌اند (برای پایگاه داده‌های قدیمی)
+_ADDED_COLUMNS = (
+    ('batch_id', "TEXT DEFAULT ''"),
+    ('validator', "TEXT DEFAULT ''"),
+)
+
+class JobStore:
+    """
+    جدول کارها در SQLite (WAL)
+    تغییرات فوراً در حافظه اعمال می‌شوند و نوشتن در پایگاه داده در یک thread جداگانه
+    انجام می‌شود (نوشتن‌های پشت سر هم در یک تراکنش)، پس حلقه رویداد منتظر دیسک نمی‌ماند.
+    """
+
+    def __init__(self, path: str = JOBS_PATH):
+        self.path = path
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._db = sqlite3.connect(path, isolation_level=None, check_same_thread=False)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("PRAGMA synchronous=NORMAL")
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS jobs ("
+            "job_id TEXT PRIMARY KEY, user_id INTEGER, chat_id INTEGER, status_message_id INTEGER, "
+            "url TEXT, state TEXT, offset INTEGER, filepath TEXT, attempts INTEGER, error TEXT, "
+            "created_at REAL, updated_at REAL, batch_id TEXT DEFAULT '', validator TEXT DEFAULT '')"
+        )
+        columns = {row[1] for row in self._db.execute("PRAGMA table_info(jobs)")}
+        for name, definition in _ADDED_COLUMNS:
+            if name not in columns:
+                self._db.execute(f"ALTER TABLE jobs ADD COLUMN {name} {definition}")
+        self._db.execute("CREATE INDEX IF NOT EXISTS jobs_state ON jobs (state)")
+        # همه دسترسی‌ها پس از این از یک thread (به ترتیب ثبت)
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="jobstore")
+        self._lock = threading.Lock()
+        self._writes: List[Tuple[str, tuple]] = []
+
+    def add(self, job: Job):
+        placeholders = ", ".join("?" for _ in JOB_COLUMNS)
+        self._write(
+            f"INSERT INTO jobs ({', '.join(JOB_COLUMNS)}) VALUES ({placeholders})",
+            tuple(getattr(job, name) for name in JOB_COLUMNS)
+        )
+
+    def update(self, job: Job, **changes):
+        """تغییر فیلدهای کار (فوراً در حافظه، سپس در پایگاه داده)"""
+        changes['updated_at'] = time.time()
+        for name, value in changes.items():
+            setattr(job, name, value)
+        assignments = ", ".join(f"{name} = ?" for name in changes)
+        self._write(f"UPDATE jobs SET {assignments} WHERE job_id = ?", (*changes.values(), job.job_id))
+
+    def unfinished(self) -> List[Job]:
+        """کارهای در صف یا در حال اجرا (به ترتیب ثبت؛ پس از نوشتن تغییرات قبلی)"""
+        rows = self._executor.submit(
+            self._query,
+            f"SELECT {', '.join(JOB_COLUMNS)} FROM jobs WHERE state IN ({_UNFINISHED_MARKS}) ORDER BY created_at",
+            UNFINISHED
+        ).result()
+        return [Job(*row) for row in rows]
+
+    def prune(self, older_than: float = 86400) -> int:
+        """حذف کارهای تمام‌شده قدیمی‌تر از older_than ثانیه"""
+        return self._executor.submit(
+            self._delete,
+            f"DELETE FROM jobs WHERE state NOT IN ({_UNFINISHED_MARKS}) AND updated_at < ?",
+            (*UNFINISHED, time.time() - older_than)
+        ).result()
+
+    def close(self):
+        """نوشتن تغییرات باقی‌مانده و بستن پایگاه داده"""
+        self._executor.shutdown(wait=True)
+        self._flush()
+        self._db.close()
+
+    def _write(self, sql: str, params: tuple):
+        with self._lock:
+            self._writes.append((sql, params))
+            if len(self._writes) > 1:
+                return  # نوشتن قبلی هنوز در صف thread است و این تغییر را هم می‌نویسد
+        self._executor.submit(self._flush)
+
+    def _flush(self):
+        with self._lock:
+            writes, self._writes = self._writes, []
+        if not writes:
+            return
+        try:
+            self._db.execute("BEGIN")
+            for sql, params in writes:
+                self._db.execute(sql, params)
+            self._db.execute("COMMIT")
+        except sqlite3.Error as e:
+            if self._db.in_transaction:
+                self._db.execute("ROLLBACK")
+            logger.error("خطا در ذخیره %s تغییر صف کارها: %s", len(writes), e)
+
+    def _query(self, sql: str, params: tuple) -> List[tuple]:
+        return self._db.execute(sql, params).fetchall()
+
+    def _delete(self, sql: str, params: tuple) -> int:
+        return self._db.execute(sql, params).rowcount
+
+JobHandler = Callable[[Job], Awaitable[str]]
+JobLimits = Callable[[int], Tuple[int, int]]  # user_id -> (کار همزمان، کار منتظر)
+
+def single_job(user_id: int) -> Tuple[int, int]:
+    """محدودیت پیش‌فرض: یک کار همزمان برای هر کاربر"""
+    return 1, 100
+
+class JobQueue:
+    """صف کارها با worker های ثابت؛ handler وضعیت نهایی (DONE/FAILED/...) را برمی‌گرداند"""
+
+    def __init__(self, store: JobStore, handler: JobHandler, workers: int = 8, max_attempts: int = 3,
+                 limits: JobLimits = single_job, on_batch_done: Optional[Callable[[str], None]] = None):
+        self.store = store
+        self.handler = handler
+        self.workers = max(1, workers)
+        self.max_attempts = max_attempts
+        self.limits = limits
+        self.on_batch_done = on_batch_done  # وقتی هیچ کاری از دسته در صف یا در حال اجرا نمانده
+        self._batches: Dict[str, int] = {}  # batch_id -> کارهای در صف یا در حال اجرا
+        self._waiting: Dict[int, Deque[Job]] = {}  # user_id -> کارهای منتظر به ترتیب ثبت
+        self._ready: Deque[int] = deque()  # کاربرانی که نوبت گرفتن کار دارند
+        self._ready_set: Set[int] = set()
+        self._user_running: Dict[int, int] = {}
+        self._wakeup = asyncio.Event()
+        self._tasks: List[asyncio.Task] = []
+        self._job_tasks: Dict[str, asyncio.Task] = {}
+        self._cancelling: Set[str] = set()
+        self._stopping = False
+        self.pending: Dict[str, Job] = {}  # در صف یا در حال اجرا
+        self.running: Dict[str, Job] = {}
+        self.queued_notices: Set[str] = set()  # کارهایی که پیام وضعیتشان جایگاه صف را نشان می‌دهد
+
+    @property
+    def depth(self) -> int:
+        """تعداد کارهای منتظر"""
+        return sum(len(jobs) for jobs in self._waiting.values())
+
+    def start(self) -> int:
+        """شروع worker ها و بازگرداندن کارهای نیمه‌تمام به صف؛ بازگشت: تعداد کارهای بازیابی شده"""
+        pruned = self.store.prune()
+        if pruned:
+            logger.info("%s کار قدیمی از صف حذف شد", pruned)
+
+        recovered = 0
+        for job in self.store.unfinished():
+            if job.attempts >= self.max_attempts:
+                self.store.update(job, state=FAILED, error="too many attempts")
+                logger.warning("کار %s پس از %s تلاش کنار گذاشته شد", job.job_id, job.attempts)
+                continue
+            self.store.update(job, state=QUEUED)
+            self._enqueue(job)
+            recovered += 1
+        if recovered:
+            logger.info("%s کار نیمه‌تمام دوباره در صف قرار گرفت", recovered)
+
+        self._tasks = [asyncio.ensure_future(self._worker()) for _ in range(self.workers)]
+        return recovered
+
+    async def stop(self):
+        """توقف worker ها؛ کارهای در حال اجرا در وضعیت running می‌مانند و بعداً ادامه می‌یابند"""
+        self._stopping = True
+        for task in self._tasks:
+            task.cancel()
+        if self._tasks:
+            await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+        self.store.close()
+
+    @staticmethod
+    def new_job_id() -> str:
+        """شناسه کار (برای ساخت دکمه لغو پیش از ثبت کار)"""
+        return uuid.uuid4().hex[:12]
+    
+    def submit(self, user_id: int, chat_id: int, status_message_id: int, url: str,
+               job_id: Optional[str] = None, batch_id: str = "") -> Job:
+        """ثبت کار جدید (بلافاصله در پایگاه داده ذخیره می‌شود)"""
+        now = time.time()
+        job = Job(
+            job_id=job_id or self.new_job_id(),
+            user_id=user_id,
+            chat_id=chat_id,
+            status_message_id=status_message_id,
+            url=url,
+            created_at=now,
+            updated_at=now,
+            batch_id=batch_id
+        )
+        self.store.add(job)
+        self._enqueue(job)
+        return job
+    
+    def room(self, user_id: int) -> int:
+        """تعداد کارهای جدیدی که کاربر می‌تواند ثبت کند (سقف همزمانی + عمق صف سطح کاربر)"""
+        concurrency, queue_depth = self.limits(user_id)
+        busy = self._user_running.get(user_id, 0) + len(self._waiting.get(user_id, ()))
+        return max(0, concurrency + queue_depth - busy)
+    
+    def can_submit(self, user_id: int) -> bool:
+        """آیا کاربر برای کار جدید جا دارد"""
+        return self.room(user_id) > 0
+    
+    def position_for_new(self, user_id: int) -> int:
+        """جایگاه کار جدید کاربر در صف انتظارش (۰ یعنی فوراً شروع می‌شود)"""
+        concurrency, _ = self.limits(user_id)
+        busy = self._user_running.get(user_id, 0) + len(self._waiting.get(user_id, ()))
+        return max(0, busy - concurrency + 1)
+    
+    def user_queue(self, user_id: int) -> Tuple[List[Job], List[Job]]:
+        """کارهای در حال اجرا و کارهای منتظر کاربر (به ترتیب صف)"""
+        running = [job for job in self.running.values() if job.user_id == user_id]
+        return running, list(self._waiting.get(user_id, ()))
+    
+    def user_jobs(self, user_id: int) -> List[Job]:
+        """کارهای در صف یا در حال اجرای کاربر (منتظرها اول، تا با لغو کار در حال اجرا شروع نشوند)"""
+        running, waiting = self.user_queue(user_id)
+        return waiting + running
+    
+    def batch_jobs(self, batch_id: str) -> List[Job]:
+        """کارهای در صف یا در حال اجرای یک دسته (منتظرها اول)"""
+        jobs = [job for job in self.pending.values() if job.batch_id == batch_id]
+        return sorted(jobs, key=lambda job: job.job_id in self.running)
+    
+    def finish(self, job: Job, state: str):
+        """ثبت وضعیت نهایی کاری که خارج از worker تمام شده است (ارسال آلبومی)"""
+        self.store.update(job, state=state)
+    
+    def resumable_files(self) -> Set[str]:
+        """فایل‌های نیمه‌تمام کارهایی که پس از ری‌استارت ادامه می‌یابند"""
+        return {job.filepath for job in self.pending.values() if job.filepath}
+    
+    def refresh(self):
+        """بررسی دوباره صف همه کاربران (پس از تغییر سطح یا محدودیت‌ها)"""
+        for user_id in list(self._waiting):
+            self._mark_ready(user_id)
+    
+    def cancel(self, job_id: str) -> Optional[str]:
+        """
+        لغو کار؛ بازگشت: QUEUED اگر هنوز شروع نشده بود (فقط از صف حذف می‌شود)،
+        RUNNING اگر task آن لغو شد، None اگر کار فعالی با این شناسه نیست
+        """
+        job = self.pending.get(job_id)
+        if job is None or job_id in self._cancelling:
+            return None
+        task = self._job_tasks.get(job_id)
+        if task is None:
+            waiting = self._waiting.get(job.user_id)
+            if waiting is not None and job in waiting:
+                waiting.remove(job)
+                if not waiting:
+                    del self._waiting[job.user_id]
+            self.queued_notices.discard(job_id)
+            self.store.update(job, state=CANCELLED)
+            self._forget(job)
+            return QUEUED
+        self._cancelling.add(job_id)
+        task.cancel()
+        return RUNNING
+    
+    def is_cancelling(self, job_id: str) -> bool:
+        """آیا لغو کار توسط کاربر درخواست شده است (در برابر توقف ربات)"""
+        return job_id in self._cancelling
+
+    def checkpoint(self, job: Job, offset: int, filepath: str = "", validator: str = "", force: bool = False):
+        """ذخیره پیشرفت دانلود (حداکثر هر CHECKPOINT_INTERVAL ثانیه یک بار؛ نسخه جدید فایل فوراً)"""
+        validator = validator or job.validator
+        if force or validator != job.validator or time.time() - job.updated_at >= CHECKPOINT_INTERVAL:
+            self.store.update(job, offset=offset, filepath=filepath or job.filepath, validator=validator)
+        else:
+            job.offset = offset
+            job.filepath = filepath or job.filepath
+
+    def _enqueue(self, job: Job):
+        self.pending[job.job_id] = job
+        if job.batch_id:
+            self._batches[job.batch_id] = self._batches.get(job.batch_id, 0) + 1
+        self._waiting.setdefault(job.user_id, deque()).append(job)
+        self._mark_ready(job.user_id)
+
+    def _forget(self, job: Job):
+        """خروج کار از صف (تمام، ناموفق یا لغو شده)"""
+        if self.pending.pop(job.job_id, None) is None or not job.batch_id:
+            return
+        remaining = self._batches.get(job.batch_id, 1) - 1
+        if remaining > 0:
+            self._batches[job.batch_id] = remaining
+            return
+        self._batches.pop(job.batch_id, None)
+        if self.on_batch_done is not None:
+            self.on_batch_done(job.batch_id)
+
+    def _mark_ready(self, user_id: int):
+        if user_id not in self._ready_set and self._waiting.get(user_id):
+            self._ready_set.add(user_id)
+            self._ready.append(user_id)
+            self._wakeup.set()
+
+    def _next_job(self) -> Optional[Job]:
+        """
+        کار بعدی به نوبت کاربران؛ کاربری که به سقف همزمانی رسیده تا پایان
+        یکی از کارهایش از نوبت خارج می‌شود
+        """
+        while self._ready:
+            user_id = self._ready.popleft()
+            self._ready_set.discard(user_id)
+            waiting = self._waiting.get(user_id)
+            if not waiting:
+                continue
+            concurrency, _ = self.limits(user_id)
+            if self._user_running.get(user_id, 0) >= concurrency:
+                continue
+            job = waiting.popleft()
+            if waiting:
+                self._mark_ready(user_id)
+            else:
+                del self._waiting[user_id]
+            self._user_running[user_id] = self._user_running.get(user_id, 0) + 1
+            return job
+        return None
+
+    async def _worker(self):
+        while True:
+            job = self._next_job()
+            if job is None:
+                self._wakeup.clear()
+                await self._wakeup.wait()
+                continue
+            await self._run(job)
+
+    async def _run(self, job: Job):
+        self.running[job.job_id] = job
+        task = asyncio.ensure_future(self.handler(job))
+        self._job_tasks[job.job_id] = task
+        try:
+            self.store.update(job, state=RUNNING, attempts=job.attempts + 1)
+            state = await task
+            self.store.update(job, state=state)
+        except asyncio.CancelledError:
+            if job.job_id in self._cancelling:
+                self.store.update(job, state=CANCELLED)
+            elif not self._stopping:
+                # لغو ناخواسته تسک کار (نه کاربر، نه توقف ربات): worker به کار ادامه می‌دهد
+                logger.error("کار %s به طور پیش‌بینی نشده لغو شد", job.job_id)
+                self.store.update(job, state=FAILED, error="cancelled unexpectedly")
+            if self._stopping:
+                raise  # توقف ربات: کار در حال اجرا بعداً ادامه می‌یابد
+        except Exception as e:
+            logger.error("خطای پیش‌بینی نشده در کار %s: %s", job.job_id, e)
+            self.store.update(job, state=FAILED, error=str(e)[:500])
+        finally:
+            self.running.pop(job.job_id, None)
+            self._job_tasks.pop(job.job_id, None)
+            self._cancelling.discard(job.job_id)
+            self.queued_notices.discard(job.job_id)
+            if job.state != RUNNING:
+                self._forget(job)
+            running = self._user_running.get(job.user_id, 1) - 1
+            if running > 0:
+                self._user_running[job.user_id] = running
+            else:
+                self._user_running.pop(job.user_id, None)
+            self._mark_ready(job.user_id)
@@ -0,0 +1,151 @@
+"""
+رتبه‌بندی افزایشی کاربران بر اساس تعداد دانلود
+"""
+
+from typing import Dict, Iterable, List, Optional, Tuple
+
+class Leaderboard:
+    """
+    جدول رتبه‌بندی با به‌روزرسانی افزایشی
+
+    کاربران بر اساس امتیاز در سطل‌ها نگه‌داری می‌شوند و یک Fenwick tree
+    تعداد کاربران هر امتیاز را نگه می‌دارد؛ به‌روزرسانی و رتبه O(log C)
+    و top-K برابر O(K log C) است (C = بیشترین امتیاز) و نیازی به مرتب‌سازی کل داده نیست.
+    """
+
+    def __init__(self, scores: Optional[Dict[str, int]] = None):
+        self._scores: Dict[str, int] = {}
+        self._buckets: Dict[int, Dict[str, None]] = {}  # امتیاز -> کاربران (به ترتیب رسیدن)
+        self._capacity = 64
+        self._tree: List[int] = [0] * (self._capacity + 1)
+        if scores:
+            self._bulk_load(scores.items())
+
+    def __len__(self) -> int:
+        return len(self._scores)
+
+    def __contains__(self, user_id: str) -> bool:
+        return user_id in self._scores
+
+    def score(self, user_id: str) -> int:
+        """امتیاز فعلی کاربر"""
+        return self._scores.get(user_id, 0)
+
+    def increment(self, user_id: str, amount: int = 1) -> int:
+        """افزایش امتیاز کاربر، بازگشت: امتیاز جدید"""
+        new_score = self._scores.get(user_id, 0) + amount
+        self.set(user_id, new_score)
+        return new_score
+
+    def set(self, user_id: str, score: int):
+        """تنظیم امتیاز کاربر (امتیاز صفر یعنی حذف)"""
+        old_score = self._scores.get(user_id, 0)
+        if old_score == score:
+            return
+
+        if old_score > 0:
+            bucket = self._buckets[old_score]
+            del bucket[user_id]
+            if not bucket:
+                del self._buckets[old_score]
+            self._update(old_score, -1)
+
+        if score > 0:
+            if score > self._capacity:
+                self._grow(score)
+            self._scores[user_id] = score
+            self._buckets.setdefault(score, {})[user_id] = None
+            self._update(score, 1)
+        else:
+            self._scores.pop(user_id, None)
+
+    def remove(self, user_id: str):
+        """حذف کاربر از رتبه‌بندی"""
+        self.set(user_id, 0)
+
+    def clear(self):
+        """پاک کردن کامل رتبه‌بندی"""
+        self._scores.clear()
+        self._buckets.clear()
+        self._tree = [0] * (self._capacity + 1)
+
+    def rank(self, user_id: str) -> Optional[int]:
+        """رتبه کاربر (۱ = بهترین)، None اگر فعالیتی نداشته باشد"""
+        score = self._scores.get(user_id, 0)
+        if score <= 0:
+            return None
+        return len(self._scores) - self._prefix(score) + 1
+
+    def top(self, k: int = 10) -> List[Tuple[str, int]]:
+        """k کاربر برتر به ترتیب نزولی امتیاز"""
+        result: List[Tuple[str, int]] = []
+        remaining = len(self._scores)
+        while remaining > 0 and len(result) < k:
+            # بزرگ‌ترین امتیاز غیرخالی که هنوز بررسی نشده
+            score = self._find(remaining)
+            for user_id in self._buckets[score]:
+                result.append((user_id, score))
+                if len(result) >= k:
+                    break
+            remaining = self._prefix(score - 1)
+        return result
+
+    # --- Fenwick tree روی امتیازها ---
+
+    def _update(self, index: int, delta: int):
+        tree = self._tree
+        while index <= self._capacity:
+            tree[index] += delta
+            index += index & -index
+
+    def _prefix(self, index: int) -> int:
+        """تعداد کاربران با امتیاز <= index"""
+        total = 0
+        tree = self._tree
+        index = min(index, self._capacity)
+        while index > 0:
+            total += tree[index]
+            index -= index & -index
+        return total
+
+    def _find(self, target: int) -> int:
+        """کوچک‌ترین امتیازی که تعداد کاربران تا آن >= target باشد"""
+        position = 0
+        step = 1 << self._capacity.bit_length()
+        tree = self._tree
+        while step:
+            next_position = position + step
+            if next_position <= self._capacity and tree[next_position] < target:
+                position = next_position
+                target -= tree[next_position]
+            step >>= 1
+        return position + 1
+
+    def _grow(self, score: int):
+        """بزرگ کردن درخت و ساخت مجدد در O(C)"""
+        while self._capacity < score:
+            self._capacity *= 2
+        self._rebuild()
+
+    def _rebuild(self):
+        tree = [0] * (self._capacity + 1)
+        for score, bucket in self._buckets.items():
+            tree[score] += len(bucket)
+        for index in range(1, self._capacity + 1):
+            parent = index + (index & -index)
+            if parent <= self._capacity:
+                tree[parent] += tree[index]
+        self._tree = tree
+
+    def _bulk_load(self, items: Iterable[Tuple[str, int]]):
+        """بارگذاری اولیه در O(n + C)"""
+        max_score = 0
+        for user_id, score in items:
+            if score <= 0:
+                continue
+            self._scores[user_id] = score
+            self._buckets.setdefault(score, {})[user_id] = None
+            max_score = max(max_score, score)
+        while self._capacity < max_score:
+            self._capacity *= 2
+        self._rebuild()
@@ -0,0 +1,65 @@
+"""
+لاگ‌گیری غیرهمزمان: رکوردها در صف قرار می‌گیرند و یک thread پس‌زمینه آن‌ها را
+روی کنسول و فایل (با چرخش بر اساس حجم یا زمان) می‌نویسد تا حلقه رویداد
+منتظر دیسک نماند.
+"""
+
+import logging
+import queue
+from logging.handlers import QueueHandler, QueueListener, RotatingFileHandler, TimedRotatingFileHandler
+from pathlib import Path
+from typing import List
+
+LOG_FORMAT = '%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+
+_listeners: List[QueueListener] = []
+
+def async_handler(*handlers: logging.Handler) -> QueueHandler:
+    """
+    ساخت QueueHandler که رکوردها را در thread جداگانه به handlers می‌دهد
+    (listener ها با stop_logging متوقف و خالی می‌شوند)
+    """
+    records: "queue.Queue[logging.LogRecord]" = queue.Queue(-1)
+    listener = QueueListener(records, *handlers, respect_handler_level=True)
+    listener.start()
+    _listeners.append(listener)
+    return QueueHandler(records)
+
+def setup_logging(level: str = "INFO", enable_file_logging: bool = True,
+                  log_file: str = "logs/bot.log", max_bytes: int = 10 * 1024 * 1024,
+                  backup_count: int = 5, rotate_when: str = "") -> None:
+    """
+    پیکربندی لاگ ریشه
+    rotate_when: خالی = چرخش بر اساس حجم (max_bytes)، در غیر این صورت مقدار when
+    در TimedRotatingFileHandler (مثال: midnight، H)
+    """
+    formatter = logging.Formatter(LOG_FORMAT)
+    handlers: List[logging.Handler] = [logging.StreamHandler()]
+
+    if enable_file_logging:
+        Path(log_file).parent.mkdir(parents=True, exist_ok=True)
+        if rotate_when:
+            handlers.append(TimedRotatingFileHandler(
+                log_file, when=rotate_when, backupCount=backup_count, encoding='utf-8'
+            ))
+        else:
+            handlers.append(RotatingFileHandler(
+                log_file, maxBytes=max_bytes, backupCount=backup_count, encoding='utf-8'
+            ))
+
+    for handler in handlers:
+        handler.setFormatter(formatter)
+
+    root = logging.getLogger()
+    for handler in list(root.handlers):
+        root.removeHandler(handler)
+    root.setLevel(getattr(logging, level.upper(), logging.INFO))
+    root.addHandler(async_handler(*handlers))
+
+def stop_logging():
+    """نوشتن رکوردهای باقی‌مانده در صف و توقف thread ها (هنگام خروج)"""
+    while _listeners:
+        listener = _listeners.pop()
+        listener.stop()
+        for handler in listener.handlers:
+            handler.close()
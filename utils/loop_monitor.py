@@ -0,0 +1,100 @@
+"""
+پایش تأخیر حلقه رویداد و تشخیص callback های مسدودکننده
+
+یک task دوره‌ای دیرکرد بیدار شدن از sleep را اندازه می‌گیرد (تأخیر زمان‌بندی)
+و یک thread نگهبان اگر حلقه بیش از آستانه جواب ندهد، پشته thread حلقه را لاگ می‌کند.
+"""
+
+import asyncio
+import logging
+import sys
+import threading
+import time
+import traceback
+from typing import Dict, Optional
+
+from utils.histogram import latency
+
+logger = logging.getLogger(__name__)
+
+STAGE = "event_loop_lag"
+
+class LoopMonitor:
+    """نمونه‌بردار تأخیر حلقه + نگهبان مسدود شدن"""
+
+    def __init__(self, interval: float = 0.25, block_threshold: float = 0.5):
+        self.interval = interval
+        self.block_threshold = block_threshold
+        self.last_lag = 0.0
+        self.blocked_count = 0
+        self._heartbeat = time.perf_counter()
+        self._loop_thread_id: Optional[int] = None
+        self._task: Optional[asyncio.Task] = None
+        self._thread: Optional[threading.Thread] = None
+        self._stopping = threading.Event()
+
+    def start(self):
+        """شروع پایش (از داخل حلقه رویداد فراخوانی شود)"""
+        if self._task is not None:
+            return
+        self._loop_thread_id = threading.get_ident()
+        self._heartbeat = time.perf_counter()
+        self._stopping.clear()
+        self._task = asyncio.ensure_future(self._sample())
+        self._thread = threading.Thread(target=self._watch, name="loop-watchdog", daemon=True)
+        self._thread.start()
+
+    async def stop(self):
+        """توقف پایش"""
+        self._stopping.set()
+        if self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        self._thread = None
+
+    def lag_summary(self, seconds: Optional[int] = 900) -> Dict[str, float]:
+        """صدک‌های تأخیر حلقه (ثانیه) در بازه اخیر"""
+        histogram = latency.window(seconds).get(STAGE)
+        if histogram is None:
+            return {'p50': 0.0, 'p95': 0.0, 'p99': 0.0, 'max': 0.0, 'count': 0}
+        return {
+            'p50': histogram.percentile(50),
+            'p95': histogram.percentile(95),
+            'p99': histogram.percentile(99),
+            'max': histogram.max,
+            'count': histogram.count,
+        }
+
+    async def _sample(self):
+        """تأخیر زمان‌بندی = دیرکرد بیدار شدن از sleep"""
+        while True:
+            expected = time.perf_counter() + self.interval
+            await asyncio.sleep(self.interval)
+            now = time.perf_counter()
+            self._heartbeat = now
+            self.last_lag = max(0.0, now - expected)
+            latency.observe(STAGE, self.last_lag)
+
+    def _watch(self):
+        """thread نگهبان: ثبت پشته حلقه در هر بار مسدود شدن (یک بار برای هر توقف)"""
+        reported = False
+        while not self._stopping.wait(self.block_threshold / 2):
+            stalled = time.perf_counter() - self._heartbeat - self.interval
+            if stalled < self.block_threshold:
+                reported = False
+                continue
+            if reported:
+                continue
+            reported = True
+            self.blocked_count += 1
+            frame = sys._current_frames().get(self._loop_thread_id)
+            stack = "".join(traceback.format_stack(frame)) if frame else "(پشته در دسترس نیست)"
+            logger.warning("حلقه رویداد %.2f ثانیه مسدود است؛ پشته فعلی:\n%s", stalled, stack)
+
+
+# نمونه سراسری
+loop_monitor = LoopMonitor()
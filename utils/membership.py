@@ -0,0 +1,231 @@
+"""
+بررسی عضویت کاربران در کانال‌های اجباری با کش
+
+- نتیجه مثبت با TTL طولانی و نتیجه منفی با TTL کوتاه کش می‌شود
+- همه فراخوانی‌های getChatMember از یک بودجه سراسری (token bucket) می‌گذرند
+- عضویت کاربران فعال پیش از انقضا در پس‌زمینه و با بودجه باقی‌مانده تازه می‌شود
+- رویدادهای chat_member (پیوستن/ترک) کش را بدون فراخوانی API به‌روز می‌کنند
+"""
+
+import asyncio
+import logging
+import time
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from utils.metrics import metrics
+
+logger = logging.getLogger(__name__)
+
+MEMBER_STATUSES = frozenset({'creator', 'administrator', 'member'})
+
+CacheKey = Tuple[int, str]
+
+class ApiBudget:
+    """token bucket برای محدود کردن فراخوانی‌های API (در ثانیه)"""
+
+    def __init__(self, rate: float, burst: Optional[float] = None):
+        self.rate = rate
+        self.capacity = burst if burst is not None else rate
+        self._tokens = self.capacity
+        self._updated = time.monotonic()
+
+    def _refill(self):
+        now = time.monotonic()
+        self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    def try_acquire(self) -> bool:
+        """برداشتن توکن بدون انتظار"""
+        self._refill()
+        if self._tokens >= 1:
+            self._tokens -= 1
+            return True
+        return False
+
+    async def acquire(self):
+        """برداشتن توکن (در صورت نیاز تا آزاد شدن توکن صبر می‌کند)"""
+        while not self.try_acquire():
+            await asyncio.sleep((1 - self._tokens) / self.rate)
+
+def normalize_channel(channel: str) -> str:
+    """کلید یکسان برای کانال (@Name و name یکی هستند)"""
+    channel = channel.strip().lower()
+    if channel and not channel.startswith('@') and not channel.lstrip('-').isdigit():
+        channel = '@' + channel
+    return channel
+
+class MembershipChecker:
+    """کش عضویت (کاربر، کانال) با بودجه API و تازه‌سازی پس‌زمینه"""
+
+    def __init__(self, bot, positive_ttl: float = 3600, negative_ttl: float = 60,
+                 api_rate: float = 20, refresh_interval: float = 60, refresh_batch: int = 50):
+        self.bot = bot  # aiogram Bot
+        self.positive_ttl = positive_ttl
+        self.negative_ttl = negative_ttl
+        self.budget = ApiBudget(api_rate)
+        self.refresh_interval = refresh_interval
+        self.refresh_batch = refresh_batch
+        self._cache: Dict[CacheKey, Tuple[bool, float]] = {}  # -> (عضو است، زمان انقضا)
+        self._pending: Dict[CacheKey, asyncio.Future] = {}
+        self._active_users: Dict[int, float] = {}  # کاربر -> آخرین بررسی
+        self._channels: Tuple[str, ...] = ()
+        self._task: Optional[asyncio.Task] = None
+        self.hits = 0
+        self.misses = 0
+        self.api_calls = 0
+
+    def start(self):
+        """شروع تازه‌سازی پس‌زمینه"""
+        if self._task is None or self._task.done():
+            self._task = asyncio.ensure_future(self._refresh_loop())
+
+    async def stop(self):
+        if self._task and not self._task.done():
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+        self._task = None
+
+    async def missing_channels(self, user_id: int, channels: Iterable[str]) -> List[str]:
+        """کانال‌هایی که کاربر عضو آن‌ها نیست (در حالت عادی بدون فراخوانی API)"""
+        channels = tuple(channels)
+        if not channels:
+            return []
+        self._channels = channels
+        now = time.monotonic()
+        self._active_users[user_id] = now
+
+        missing = []
+        lookups = []
+        for channel in channels:
+            key = (user_id, normalize_channel(channel))
+            cached = self._cache.get(key)
+            if cached is not None and cached[1] > now:
+                self.hits += 1
+                if not cached[0]:
+                    missing.append(channel)
+            else:
+                self.misses += 1
+                lookups.append((channel, key))
+
+        if lookups:
+            results = await asyncio.gather(*(self._lookup(key) for _, key in lookups))
+            missing.extend(channel for (channel, _), is_member in zip(lookups, results) if not is_member)
+        return missing
+
+    def invalidate(self, user_id: int, channel: Optional[str] = None):
+        """حذف نتیجه کش‌شده یک کاربر (برای یک کانال یا همه)"""
+        if channel is not None:
+            self._cache.pop((user_id, normalize_channel(channel)), None)
+            return
+        for key in [key for key in self._cache if key[0] == user_id]:
+            del self._cache[key]
+
+    def on_member_update(self, channel: str, user_id: int, status: str, is_member: Optional[bool] = None):
+        """به‌روزرسانی کش از رویداد chat_member (بدون فراخوانی API)"""
+        member = self._is_member_status(status, is_member)
+        ttl = self.positive_ttl if member else self.negative_ttl
+        self._cache[(user_id, normalize_channel(channel))] = (member, time.monotonic() + ttl)
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            'entries': len(self._cache),
+            'hits': self.hits,
+            'misses': self.misses,
+            'api_calls': self.api_calls,
+        }
+
+    async def _lookup(self, key: CacheKey) -> bool:
+        """یک درخواست API برای هر کلید (درخواست‌های همزمان یکی می‌شوند)"""
+        while True:
+            pending = self._pending.get(key)
+            if pending is None:
+                break
+            try:
+                return await asyncio.shield(pending)
+            except asyncio.CancelledError:
+                if not pending.cancelled():
+                    raise  # خود این درخواست لغو شده است
+                # درخواست صاحب lookup لغو شد: این درخواست خودش دوباره بررسی می‌کند
+
+        future = asyncio.get_event_loop().create_future()
+        self._pending[key] = future
+        try:
+            await self.budget.acquire()
+            is_member = await self._fetch(key)
+        except asyncio.CancelledError:
+            future.cancel()  # منتظران همزمان دوباره تلاش می‌کنند
+            raise
+        except Exception as e:
+            future.set_exception(e)
+            future.exception()  # بدون منتظر هم هشدار "exception never retrieved" ندهد
+            raise
+        else:
+            future.set_result(is_member)
+            return is_member
+        finally:
+            del self._pending[key]
+
+    async def _fetch(self, key: CacheKey) -> bool:
+        """getChatMember و ذخیره نتیجه در کش"""
+        user_id, channel = key
+        self.api_calls += 1
+        try:
+            member = await self.bot.get_chat_member(channel, user_id)
+        except Exception as e:
+            # کانال اشتباه یا ربات ادمین کانال نیست: کاربر را مسدود نمی‌کنیم
+            metrics.count_error("membership")
+            logger.warning("خطا در بررسی عضویت %s در %s: %s", user_id, channel, e)
+            self._cache[key] = (True, time.monotonic() + self.negative_ttl)
+            return True
+
+        is_member = self._is_member_status(str(getattr(member.status, 'value', member.status)),
+                                           getattr(member, 'is_member', None))
+        ttl = self.positive_ttl if is_member else self.negative_ttl
+        self._cache[key] = (is_member, time.monotonic() + ttl)
+        return is_member
+
+    @staticmethod
+    def _is_member_status(status: str, is_member: Optional[bool]) -> bool:
+        if status in MEMBER_STATUSES:
+            return True
+        return status == 'restricted' and bool(is_member)
+
+    async def _refresh_loop(self):
+        while True:
+            await asyncio.sleep(self.refresh_interval)
+            try:
+                await self._refresh()
+            except Exception as e:
+                logger.error("خطا در تازه‌سازی کش عضویت: %s", e)
+
+    async def _refresh(self):
+        """
+        تازه‌سازی نتایج مثبت کاربران فعال که تا دور بعد منقضی می‌شوند
+        (فقط با بودجه آزاد تا درخواست‌های کاربران منتظر نمانند) و پاکسازی کش
+        """
+        now = time.monotonic()
+        horizon = now + self.refresh_interval * 2
+        active_since = now - self.positive_ttl
+
+        for user_id in [user_id for user_id, seen in self._active_users.items() if seen < active_since]:
+            del self._active_users[user_id]
+        for key in [key for key, (_, expires) in self._cache.items()
+                    if expires < now and key[0] not in self._active_users]:
+            del self._cache[key]
+
+        channels = {normalize_channel(channel) for channel in self._channels}
+        due = sorted(
+            (expires, key) for key, (is_member, expires) in self._cache.items()
+            if is_member and expires < horizon and key[1] in channels and key[0] in self._active_users
+        )
+        refreshed = 0
+        for _, key in due[:self.refresh_batch]:
+            if key in self._pending or not self.budget.try_acquire():
+                continue
+            await self._fetch(key)
+            refreshed += 1
+        if refreshed:
+            logger.debug("عضویت %s کاربر تازه‌سازی شد", refreshed)
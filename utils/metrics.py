@@ -0,0 +1,170 @@
+"""
+خروجی متریک‌ها با فرمت متنی Prometheus (سرور HTTP اختیاری)
+
+مسیر پیام فقط شمارنده‌های ساده را افزایش می‌دهد؛ گیج‌ها و هیستوگرام‌ها
+فقط هنگام درخواست /metrics محاسبه می‌شوند.
+"""
+
+import logging
+from typing import Callable, Dict, List, Optional, Tuple, Union
+
+from aiohttp import web
+
+from utils.histogram import latency, LatencyHistogram
+from utils.timeseries import throughput, FIELDS
+
+logger = logging.getLogger(__name__)
+
+PREFIX = "prolink"
+
+# حدود ثابت سطل‌ها (ثانیه) تا سری‌ها بین scrape ها یکسان بمانند
+HISTOGRAM_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300)
+
+GaugeValue = Union[float, Dict[str, float]]
+
+class Counter:
+    """شمارنده با یک برچسب اختیاری"""
+
+    __slots__ = ('name', 'help', 'label', 'values')
+
+    def __init__(self, name: str, help_text: str, label: Optional[str] = None):
+        self.name = name
+        self.help = help_text
+        self.label = label
+        self.values: Dict[str, float] = {}
+
+    def inc(self, label_value: str = "", amount: float = 1):
+        self.values[label_value] = self.values.get(label_value, 0) + amount
+
+class MetricsRegistry:
+    """ثبت شمارنده‌ها و گیج‌ها و ساخت خروجی Prometheus"""
+
+    def __init__(self):
+        self._counters: Dict[str, Counter] = {}
+        self._gauges: List[Tuple[str, str, Optional[str], str, Callable[[], GaugeValue]]] = []
+        self.errors = self.counter("errors_total", "Errors by type", label="type")
+
+    def counter(self, name: str, help_text: str, label: Optional[str] = None) -> Counter:
+        """ایجاد (یا دریافت) شمارنده"""
+        if name not in self._counters:
+            self._counters[name] = Counter(name, help_text, label)
+        return self._counters[name]
+
+    def gauge(self, name: str, help_text: str, func: Callable[[], GaugeValue],
+              label: Optional[str] = None, kind: str = "gauge"):
+        """
+        ثبت متریک محاسبه‌ای؛ func هنگام scrape فراخوانی می‌شود (عدد یا دیکشنری برچسب -> مقدار)
+        برای شمارنده‌هایی که اجزای دیگر نگه می‌دارند kind="counter" بدهید
+        """
+        self._gauges = [gauge for gauge in self._gauges if gauge[0] != name]
+        self._gauges.append((name, help_text, label, kind, func))
+
+    def count_error(self, error_type: str):
+        """افزایش شمارنده خطا"""
+        self.errors.inc(error_type)
+
+    def render(self) -> str:
+        """ساخت متن خروجی Prometheus"""
+        lines: List[str] = []
+
+        for counter in self._counters.values():
+            self._header(lines, counter.name, counter.help, "counter")
+            for label_value, value in counter.values.items():
+                lines.append(self._sample(counter.name, counter.label, label_value, value))
+
+        # شمارنده‌های گذردهی از ابتدای اجرا
+        for field in FIELDS:
+            name = f"throughput_{field}_total"
+            self._header(lines, name, f"Throughput counter '{field}' since start", "counter")
+            lines.append(self._sample(name, None, "", throughput.lifetime[field]))
+
+        for name, help_text, label, kind, func in self._gauges:
+            try:
+                value = func()
+            except Exception as e:
+                logger.error("خطا در محاسبه متریک %s: %s", name, e)
+                continue
+            self._header(lines, name, help_text, kind)
+            if isinstance(value, dict):
+                for label_value, item in value.items():
+                    lines.append(self._sample(name, label, label_value, item))
+            else:
+                lines.append(self._sample(name, None, "", value))
+
+        name = "stage_duration_seconds"
+        self._header(lines, name, "Pipeline stage latency", "histogram")
+        for stage, histogram in sorted(latency.window().items()):
+            self._histogram(lines, name, stage, histogram)
+
+        return "\n".join(lines) + "\n"
+
+    @staticmethod
+    def _header(lines: List[str], name: str, help_text: str, kind: str):
+        lines.append(f"# HELP {PREFIX}_{name} {help_text}")
+        lines.append(f"# TYPE {PREFIX}_{name} {kind}")
+
+    @staticmethod
+    def _sample(name: str, label: Optional[str], label_value: str, value: float) -> str:
+        labels = f'{{{label}="{_escape(label_value)}"}}' if label else ""
+        return f"{PREFIX}_{name}{labels} {_format_value(value)}"
+
+    @staticmethod
+    def _histogram(lines: List[str], name: str, stage: str, histogram: LatencyHistogram):
+        """تبدیل سطل‌های لگاریتمی به سطل‌های ثابت Prometheus"""
+        cumulative = histogram.cumulative()
+        position = 0
+        seen = 0
+        stage = _escape(stage)
+        for bound in HISTOGRAM_BUCKETS:
+            while position < len(cumulative) and cumulative[position][0] <= bound:
+                seen = cumulative[position][1]
+                position += 1
+            lines.append(f'{PREFIX}_{name}_bucket{{stage="{stage}",le="{bound:g}"}} {seen}')
+        lines.append(f'{PREFIX}_{name}_bucket{{stage="{stage}",le="+Inf"}} {histogram.count}')
+        lines.append(f'{PREFIX}_{name}_sum{{stage="{stage}"}} {_format_value(histogram.total)}')
+        lines.append(f'{PREFIX}_{name}_count{{stage="{stage}"}} {histogram.count}')
+
+def _format_value(value: float) -> str:
+    """عدد کامل بدون نماد علمی (شمارنده‌های بایت دقت کامل لازم دارند)"""
+    if isinstance(value, float) and not value.is_integer():
+        return repr(value)
+    return str(int(value))
+
+def _escape(value: str) -> str:
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+class MetricsServer:
+    """سرور HTTP سبک برای /metrics"""
+
+    def __init__(self, registry: 'MetricsRegistry', host: str = "127.0.0.1", port: int = 9108):
+        self.registry = registry
+        self.host = host
+        self.port = port
+        self._runner: Optional[web.AppRunner] = None
+
+    async def start(self):
+        """شروع سرور"""
+        app = web.Application()
+        app.router.add_get("/metrics", self._handle_metrics)
+        self._runner = web.AppRunner(app, access_log=None)
+        await self._runner.setup()
+        await web.TCPSite(self._runner, self.host, self.port).start()
+        logger.info("سرور متریک روی http://%s:%s/metrics فعال شد", self.host, self.port)
+
+    async def stop(self):
+        """توقف سرور"""
+        if self._runner:
+            await self._runner.cleanup()
+            self._runner = None
+
+    async def _handle_metrics(self, request: web.Request) -> web.Response:
+        return web.Response(
+            text=self.registry.render(),
+            content_type="text/plain",
+            charset="utf-8",
+            headers={"Cache-Control": "no-cache"}
+        )
+
+
+# نمونه سراسری
+metrics = MetricsRegistry()
@@ -0,0 +1,139 @@
+"""
+پروفایل لحظه‌ای حلقه رویداد برای دستور ادمین /profile
+
+cProfile روی thread حلقه رویداد فعال می‌شود (همه هندلرها و callback ها را می‌بیند)
+و همزمان task های asyncio نمونه‌برداری می‌شوند تا زمان حضور هر coroutine به دست آید.
+"""
+
+import asyncio
+import cProfile
+import io
+import pstats
+import time
+from dataclasses import dataclass, field
+from typing import Dict, List, Set, Tuple
+
+SAMPLE_INTERVAL = 0.05  # ثانیه
+
+@dataclass
+class ProfileReport:
+    """نتیجه پروفایل"""
+    duration: float
+    top_functions: List[Tuple[str, int, float, float]]  # (تابع، تعداد فراخوانی، زمان تجمعی، زمان داخلی)
+    coroutine_busy: List[Tuple[str, float]]             # زمان اجرای واقعی هر coroutine روی حلقه
+    coroutine_wall: List[Tuple[str, int, float]]        # (coroutine، تعداد task، مجموع زمان حضور)
+    full_text: str = field(repr=False, default="")
+
+_running = False
+
+def is_running() -> bool:
+    return _running
+
+async def profile_loop(seconds: float, limit: int = 20) -> ProfileReport:
+    """پروفایل حلقه رویداد به مدت `seconds` ثانیه"""
+    global _running
+    if _running:
+        raise RuntimeError("profiler is already running")
+    _running = True
+
+    profiler = cProfile.Profile()
+    first_seen: Dict[asyncio.Task, float] = {}
+    last_seen: Dict[asyncio.Task, float] = {}
+    coroutine_codes: Set[Tuple[str, int, str]] = set()
+    current = asyncio.current_task()
+    started = time.perf_counter()
+    profiler.enable()
+    try:
+        deadline = started + seconds
+        while True:
+            now = time.perf_counter()
+            for task in asyncio.all_tasks():
+                if task is not current:
+                    first_seen.setdefault(task, now)
+                    last_seen[task] = now
+                    _collect_coroutine_codes(task, coroutine_codes)
+            if now >= deadline:
+                break
+            await asyncio.sleep(min(SAMPLE_INTERVAL, deadline - now))
+    finally:
+        profiler.disable()
+        _running = False
+    duration = time.perf_counter() - started
+
+    stats = pstats.Stats(profiler)
+    top_functions = []
+    coroutine_busy = []
+    for key, (_, calls, own_time, cumulative, _) in stats.stats.items():
+        if _is_loop_internal(*key):
+            continue  # خود حلقه رویداد (در فایل کامل گزارش باقی می‌ماند)
+        label = _label(*key)
+        top_functions.append((label, calls, cumulative, own_time))
+        # هر بار ادامه coroutine یک «فراخوانی» است؛ زمان تجمعی = زمان اشغال حلقه
+        if key in coroutine_codes:
+            coroutine_busy.append((label, cumulative))
+    top_functions.sort(key=lambda item: item[2], reverse=True)
+    coroutine_busy.sort(key=lambda item: item[1], reverse=True)
+
+    wall: Dict[str, List[float]] = {}
+    for task, seen in first_seen.items():
+        coro = task.get_coro()
+        entry = wall.setdefault(getattr(coro, '__qualname__', type(coro).__name__), [0, 0.0])
+        entry[0] += 1
+        entry[1] += last_seen[task] - seen + SAMPLE_INTERVAL
+    coroutine_wall = sorted(
+        ((name, int(count), total) for name, (count, total) in wall.items()),
+        key=lambda item: item[2], reverse=True
+    )
+
+    buffer = io.StringIO()
+    stats.stream = buffer
+    stats.sort_stats('cumulative').print_stats(60)
+
+    return ProfileReport(
+        duration=duration,
+        top_functions=top_functions[:limit],
+        coroutine_busy=coroutine_busy[:limit],
+        coroutine_wall=coroutine_wall[:limit],
+        full_text=buffer.getvalue()
+    )
+
+def format_report(report: ProfileReport, limit: int = 15) -> str:
+    """متن خلاصه گزارش برای پیام تلگرام"""
+    lines = [f"🔬 پروفایل {report.duration:.1f} ثانیه\n", "⏱ توابع برتر (تجمعی / داخلی / فراخوانی):"]
+    for label, calls, cumulative, own_time in report.top_functions[:limit]:
+        lines.append(f"• {cumulative * 1000:.0f} / {own_time * 1000:.0f} ms / {calls} — {label}")
+
+    if report.coroutine_busy:
+        lines.append("\n⚙️ زمان اشغال حلقه توسط coroutine ها:")
+        for label, busy in report.coroutine_busy[:limit]:
+            lines.append(f"• {busy * 1000:.0f} ms — {label}")
+
+    if report.coroutine_wall:
+        lines.append("\n🕰 زمان حضور task ها (wall):")
+        for name, count, total in report.coroutine_wall[:limit]:
+            lines.append(f"• {total:.1f}s ({count} task) — {name}")
+    return "\n".join(lines)
+
+def _label(filename: str, line: int, name: str) -> str:
+    if filename == '~':
+        return name  # توابع داخلی C
+    parts = filename.replace('\\', '/').split('/')
+    return f"{name} ({'/'.join(parts[-2:])}:{line})"
+
+def _is_loop_internal(filename: str, line: int, name: str) -> bool:
+    path = filename.replace('\\', '/')
+    return (
+        '/asyncio/' in path
+        or path.endswith(('/selectors.py', '/profiler.py'))
+        or name in ("<method 'run' of '_contextvars.Context' objects>", "<method 'poll' of 'select.epoll' objects>")
+    )
+
+def _collect_coroutine_codes(task: asyncio.Task, codes: Set[Tuple[str, int, str]]):
+    """کلید pstats همه coroutine های زنجیره await یک task"""
+    coro = task.get_coro()
+    while coro is not None:
+        code = getattr(coro, 'cr_code', None)
+        if code is None:
+            break
+        codes.add((code.co_filename, code.co_firstlineno, code.co_name))
+        coro = getattr(coro, 'cr_await', None)
@@ -3,17 +3,26 @@
 """
 
 import aiohttp
+from collections import OrderedDict
 from typing import Optional
 import logging
 
+from utils.metrics import metrics
+from utils.url_canon import url_key
+
 logger = logging.getLogger(__name__)
 
 class ShortLinkService:
     """سرویس لینک کوتاه با پشتیبانی از چندین سرویس"""
     
-    def __init__(self, service: str = "is.gd"):
+    def __init__(self, service: str = "is.gd", cache_size: int = 1024):
         self.service = service
         self.session: Optional[aiohttp.ClientSession] = None
+        # کش LRU لینک‌های کوتاه شده (کلید: سرویس و کلید ۱۲۸ بیتی لینک نرمال‌شده)
+        self.cache_size = cache_size
+        self._cache: "OrderedDict[tuple, str]" = OrderedDict()
+        self.cache_hits = 0
+        self.cache_misses = 0
     
     async def _get_session(self) -> aiohttp.ClientSession:
         """دریافت یا ایجاد session"""
@@ -30,6 +39,24 @@ class ShortLinkService:
         if not url or not url.startswith(("http://", "https://")):
             return url
         
+        # لینک نرمال‌شده فقط کلید کش است؛ خود لینک اصلی کوتاه می‌شود
+        key = (self.service, url_key(url, 128))
+        cached = self._cache.get(key)
+        if cached is not None:
+            self._cache.move_to_end(key)
+            self.cache_hits += 1
+            return cached
+        self.cache_misses += 1
+        
+        short_url = await self._shorten(url)
+        if short_url != url:
+            self._cache[key] = short_url
+            if len(self._cache) > self.cache_size:
+                self._cache.popitem(last=False)
+        return short_url
+    
+    async def _shorten(self, url: str) -> str:
+        """درخواست لینک کوتاه از سرویس"""
         try:
             session = await self._get_session()
             
@@ -40,11 +67,12 @@ class ShortLinkService:
             elif self.service == "cleanuri":
                 return await self._shorten_cleanuri(session, url)
             else:
-                logger.warning(f"سرویس لینک کوتاه نامعتبر: {self.service}")
+                logger.warning("سرویس لینک کوتاه نامعتبر: %s", self.service)
                 return url
                 
         except Exception as e:
-            logger.error(f"خطا در کوتاه کردن لینک {url}: {e}")
+            metrics.count_error("shortlink")
+            logger.error("خطا در کوتاه کردن لینک %s: %s", url, e)
             return url
     
     async def _shorten_tinyurl(self, session: aiohttp.ClientSession, url: str) -> str:
@@ -54,7 +82,7 @@ class ShortLinkService:
             if response.status == 200:
                 short_url = await response.text()
                 if short_url.startswith("http"):
-                    logger.info(f"لینک کوتاه شده با TinyURL: {url} -> {short_url}")
+                    logger.info("لینک کوتاه شده با TinyURL: %s -> %s", url, short_url)
                     return short_url
         return url
     
@@ -65,7 +93,7 @@ class ShortLinkService:
             if response.status == 200:
                 short_url = await response.text()
                 if short_url.startswith("http"):
-                    logger.info(f"لینک کوتاه شده با is.gd: {url} -> {short_url}")
+                    logger.info("لینک کوتاه شده با is.gd: %s -> %s", url, short_url)
                     return short_url
         return url
     
@@ -79,7 +107,7 @@ class ShortLinkService:
                 result = await response.json()
                 if "result_url" in result:
                     short_url = result["result_url"]
-                    logger.info(f"لینک کوتاه شده با CleanURI: {url} -> {short_url}")
+                    logger.info("لینک کوتاه شده با CleanURI: %s -> %s", url, short_url)
                     return short_url
         return url
     
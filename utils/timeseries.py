@@ -0,0 +1,150 @@
+"""
+آمار گذردهی در بازه‌های دقیقه‌ای، ساعتی و روزانه با حافظه ثابت
+"""
+
+import json
+import logging
+import os
+import time
+from typing import Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+# شمارنده‌های هر بازه
+FIELDS = (
+    'started', 'finished', 'failed',
+    'bytes_in', 'bytes_out',
+    'queue_wait', 'queued',
+    'download_time', 'downloads',
+    'upload_time', 'uploads',
+)
+_FIELD_INDEX = {name: index for index, name in enumerate(FIELDS)}
+
+class RollupRing:
+    """بافر حلقوی با تعداد بازه ثابت؛ بازه‌های قدیمی هنگام استفاده مجدد صفر می‌شوند"""
+
+    def __init__(self, resolution: int, size: int):
+        self.resolution = resolution
+        self.size = size
+        self._ids: List[int] = [-1] * size
+        self._values: List[List[float]] = [[0] * len(FIELDS) for _ in range(size)]
+
+    def add(self, now: float, index: int, value: float):
+        bucket = int(now // self.resolution)
+        slot = bucket % self.size
+        if self._ids[slot] != bucket:
+            if bucket < self._ids[slot]:
+                return  # قدیمی‌تر از پنجره حلقه
+            self._ids[slot] = bucket
+            self._values[slot] = [0] * len(FIELDS)
+        self._values[slot][index] += value
+
+    def totals(self, now: float, count: int, offset: int = 0) -> List[float]:
+        """جمع `count` بازه آخر (با فاصله `offset` بازه از بازه جاری)"""
+        result = [0] * len(FIELDS)
+        current = int(now // self.resolution) - offset
+        for bucket in range(current - count + 1, current + 1):
+            slot = bucket % self.size
+            if self._ids[slot] == bucket:
+                for index, value in enumerate(self._values[slot]):
+                    result[index] += value
+        return result
+
+    def to_dict(self) -> Dict[str, list]:
+        """فرم فشرده برای ذخیره (فقط بازه‌های غیرخالی)"""
+        ids, values = [], []
+        for bucket, slot_values in zip(self._ids, self._values):
+            if bucket >= 0 and any(slot_values):
+                ids.append(bucket)
+                values.append([round(value, 3) for value in slot_values])
+        return {'ids': ids, 'values': values}
+
+    def load_dict(self, data: Dict[str, list]):
+        for bucket, slot_values in zip(data.get('ids', []), data.get('values', [])):
+            if len(slot_values) != len(FIELDS):
+                continue
+            slot = bucket % self.size
+            if bucket > self._ids[slot]:
+                self._ids[slot] = bucket
+                self._values[slot] = list(slot_values)
+
+class ThroughputRollups:
+    """آمار گذردهی کارها (شروع/پایان/خطا، حجم، زمان انتظار و انتقال)"""
+
+    def __init__(self):
+        self.rings = {
+            'minute': RollupRing(60, 120),    # دو ساعت اخیر
+            'hour': RollupRing(3600, 48),     # دو روز اخیر
+            'day': RollupRing(86400, 60),     # دو ماه اخیر
+        }
+        self.lifetime: Dict[str, float] = dict.fromkeys(FIELDS, 0)  # از ابتدای اجرا (برای متریک‌ها)
+
+    def record(self, now: Optional[float] = None, **values: float):
+        """ثبت مقادیر (مثال: record(finished=1, bytes_out=1024))"""
+        now = time.time() if now is None else now
+        for name, value in values.items():
+            index = _FIELD_INDEX[name]
+            self.lifetime[name] += value
+            for ring in self.rings.values():
+                ring.add(now, index, value)
+
+    def totals(self, span: int, offset: int = 0, now: Optional[float] = None) -> Dict[str, float]:
+        """جمع شمارنده‌ها در `span` ثانیه اخیر (با ریزترین حلقه‌ای که بازه را پوشش دهد)"""
+        now = time.time() if now is None else now
+        for ring in self.rings.values():
+            if span + offset <= ring.resolution * ring.size and span % ring.resolution == 0:
+                values = ring.totals(now, span // ring.resolution, offset // ring.resolution)
+                return dict(zip(FIELDS, values))
+        ring = self.rings['day']
+        values = ring.totals(now, max(1, span // ring.resolution), offset // ring.resolution)
+        return dict(zip(FIELDS, values))
+
+    def summary(self, span: int, now: Optional[float] = None) -> Dict[str, float]:
+        """نرخ‌ها و میانگین‌ها در `span` ثانیه اخیر"""
+        totals = self.totals(span, now=now)
+        return {
+            'started': totals['started'],
+            'finished': totals['finished'],
+            'failed': totals['failed'],
+            'jobs_per_minute': totals['finished'] * 60 / span,
+            'bytes_in_per_second': totals['bytes_in'] / span,
+            'bytes_out_per_second': totals['bytes_out'] / span,
+            'avg_queue_wait': totals['queue_wait'] / totals['queued'] if totals['queued'] else 0.0,
+            'avg_download_time': totals['download_time'] / totals['downloads'] if totals['downloads'] else 0.0,
+            'avg_upload_time': totals['upload_time'] / totals['uploads'] if totals['uploads'] else 0.0,
+        }
+
+    def trend(self, field: str, span: int, now: Optional[float] = None) -> Optional[float]:
+        """درصد تغییر `field` در `span` ثانیه اخیر نسبت به بازه قبل از آن"""
+        current = self.totals(span, now=now)[field]
+        previous = self.totals(span, offset=span, now=now)[field]
+        if not previous:
+            return None
+        return (current - previous) * 100 / previous
+
+    def to_dict(self) -> Dict[str, Dict[str, list]]:
+        data = {name: ring.to_dict() for name, ring in self.rings.items()}
+        data['fields'] = list(FIELDS)
+        return data
+
+    def load(self, path: str):
+        """بارگذاری از فایل (در صورت نبود یا خرابی فایل، نادیده گرفته می‌شود)"""
+        try:
+            if not os.path.exists(path):
+                return
+            with open(path, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+            if data.get('fields') != list(FIELDS):
+                logger.warning("قالب فایل آمار گذردهی تغییر کرده است؛ از نو شروع می‌شود")
+                return
+            for name, ring in self.rings.items():
+                ring.load_dict(data.get(name, {}))
+        except Exception as e:
+            logger.error("خطا در بارگذاری آمار گذردهی: %s", e)
+
+    def dumps(self) -> str:
+        return json.dumps(self.to_dict(), separators=(',', ':'))
+
+
+# نمونه سراسری
+throughput = ThroughputRollups()
@@ -0,0 +1,196 @@
+"""
+ردیابی ساختاریافته هر کار آپلود (شناسه کار + span های زمان‌دار)
+
+هر trace پس از پایان به صورت یک خط JSON در logs/traces.jsonl (با چرخش فایل) نوشته می‌شود.
+نمونه‌برداری: کارهای ناموفق و کند همیشه ذخیره می‌شوند و بقیه با نرخ TRACE_SAMPLE_RATE.
+"""
+
+import json
+import logging
+import random
+import time
+import uuid
+from contextlib import contextmanager
+from contextvars import ContextVar
+from logging.handlers import RotatingFileHandler
+from pathlib import Path
+from typing import Any, Dict, Iterator, List, Optional
+
+from utils.logging_setup import async_handler
+
+logger = logging.getLogger(__name__)
+
+TRACE_PATH = "logs/traces.jsonl"
+
+class Span:
+    """یک مرحله زمان‌دار داخل trace"""
+
+    __slots__ = ('name', 'span_id', 'parent_id', 'start', 'duration', 'status', 'attrs')
+
+    def __init__(self, name: str, span_id: int, parent_id: Optional[int], start: float, attrs: Dict[str, Any]):
+        self.name = name
+        self.span_id = span_id
+        self.parent_id = parent_id
+        self.start = start
+        self.duration = 0.0
+        self.status = "ok"
+        self.attrs = attrs
+
+    def set(self, **attrs):
+        """افزودن ویژگی (مثال: span.set(status=200, bytes=1024))"""
+        self.attrs.update(attrs)
+
+class _NoopSpan:
+    """span بی‌اثر وقتی trace فعالی وجود ندارد"""
+
+    __slots__ = ()
+
+    def set(self, **attrs):
+        pass
+
+_NOOP_SPAN = _NoopSpan()
+
+class Trace:
+    """trace یک کار (شناسه کار، ویژگی‌ها و span ها)"""
+
+    def __init__(self, name: str, attrs: Dict[str, Any]):
+        self.job_id = uuid.uuid4().hex[:12]
+        self.name = name
+        self.attrs = attrs
+        self.started_at = time.time()
+        self.start = time.perf_counter()
+        self.duration = 0.0
+        self.status = "ok"
+        self.spans: List[Span] = []
+        self._next_id = 1
+        self._tokens = None
+
+    def set(self, **attrs):
+        self.attrs.update(attrs)
+
+    def new_span(self, name: str, parent_id: Optional[int], start: float, attrs: Dict[str, Any]) -> Span:
+        span = Span(name, self._next_id, parent_id, start, attrs)
+        self._next_id += 1
+        self.spans.append(span)
+        return span
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            'job_id': self.job_id,
+            'name': self.name,
+            'started_at': round(self.started_at, 3),
+            'duration_ms': round(self.duration * 1000, 2),
+            'status': self.status,
+            'attrs': self.attrs,
+            'spans': [
+                {
+                    'id': span.span_id,
+                    'parent': span.parent_id,
+                    'name': span.name,
+                    'start_ms': round((span.start - self.start) * 1000, 2),
+                    'duration_ms': round(span.duration * 1000, 2),
+                    'status': span.status,
+                    'attrs': span.attrs,
+                }
+                for span in self.spans
+            ],
+        }
+
+_current_trace: ContextVar[Optional[Trace]] = ContextVar("current_trace", default=None)
+_current_span: ContextVar[Optional[Span]] = ContextVar("current_span", default=None)
+
+class Tracer:
+    """ایجاد trace ها و نوشتن آن‌ها در فایل JSONL"""
+
+    def __init__(self):
+        self.enabled = False
+        self.sample_rate = 0.1
+        self.slow_threshold = 60.0
+        self._writer: Optional[logging.Logger] = None
+
+    def configure(self, enabled: bool, sample_rate: float = 0.1, slow_threshold: float = 60.0,
+                  path: str = TRACE_PATH, max_bytes: int = 10 * 1024 * 1024, backup_count: int = 5):
+        """اعمال تنظیمات (قابل فراخوانی مجدد هنگام بارگذاری مجدد .env)"""
+        self.enabled = enabled
+        self.sample_rate = min(1.0, max(0.0, sample_rate))
+        self.slow_threshold = slow_threshold
+        if enabled and self._writer is None:
+            Path(path).parent.mkdir(parents=True, exist_ok=True)
+            handler = RotatingFileHandler(path, maxBytes=max_bytes, backupCount=backup_count, encoding='utf-8')
+            handler.setFormatter(logging.Formatter('%(message)s'))
+            writer = logging.getLogger("prolink.traces")
+            writer.setLevel(logging.INFO)
+            writer.propagate = False
+            writer.addHandler(async_handler(handler))
+            self._writer = writer
+
+    def start(self, name: str, **attrs) -> Trace:
+        """شروع trace کار جاری؛ شناسه کار حتی با ردیابی غیرفعال ساخته می‌شود"""
+        trace = Trace(name, attrs)
+        if self.enabled:
+            trace._tokens = (_current_trace.set(trace), _current_span.set(None))
+        return trace
+
+    def finish(self, trace: Trace, error: Optional[BaseException] = None, status: Optional[str] = None):
+        """
+        پایان trace و نوشتن آن در صورت انتخاب شدن در نمونه‌برداری
+        status: وضعیت غیر از ok بدون خطا (مثل cancelled)؛ مانند خطا همیشه نوشته می‌شود
+        """
+        if trace._tokens is None:
+            return
+        trace_token, span_token = trace._tokens
+        trace._tokens = None
+        _current_trace.reset(trace_token)
+        _current_span.reset(span_token)
+
+        trace.duration = time.perf_counter() - trace.start
+        if error is not None:
+            trace.status = "error"
+            trace.attrs['error'] = str(error)
+        elif status is not None:
+            trace.status = status
+
+        keep = (
+            trace.status != "ok"
+            or trace.duration >= self.slow_threshold
+            or random.random() < self.sample_rate
+        )
+        if keep and self._writer:
+            try:
+                self._writer.info(json.dumps(trace.to_dict(), ensure_ascii=False, default=str))
+            except Exception as e:
+                logger.error("خطا در نوشتن trace %s: %s", trace.job_id, e)
+
+    @contextmanager
+    def span(self, name: str, **attrs) -> Iterator[Any]:
+        """اندازه‌گیری یک مرحله داخل trace جاری (بدون trace فعال بی‌اثر است)"""
+        trace = _current_trace.get()
+        if trace is None:
+            yield _NOOP_SPAN
+            return
+
+        parent = _current_span.get()
+        span = trace.new_span(name, parent.span_id if parent else None, time.perf_counter(), attrs)
+        token = _current_span.set(span)
+        try:
+            yield span
+        except BaseException as e:
+            span.status = "error"
+            span.attrs['error'] = str(e) or type(e).__name__
+            raise
+        finally:
+            span.duration = time.perf_counter() - span.start
+            _current_span.reset(token)
+
+    def record(self, name: str, duration: float, **attrs):
+        """ثبت span تمام‌شده با مدت مشخص (برای زمان‌های تجمیعی مثل نوشتن روی دیسک)"""
+        trace = _current_trace.get()
+        if trace is None:
+            return
+        parent = _current_span.get()
+        span = trace.new_span(name, parent.span_id if parent else None, time.perf_counter() - duration, attrs)
+        span.duration = duration
+
+
+# نمونه سراسری
+tracer = Tracer()
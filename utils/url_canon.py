@@ -0,0 +1,122 @@
+"""
+نرمال‌سازی لینک‌ها برای کلید کش و حذف تکراری
+
+- scheme و host با حروف کوچک، host یونیکد به IDNA
+- حذف پورت پیش‌فرض (80/443) و fragment
+- یکسان‌سازی percent-encoding (حروف مجاز decode و بقیه با هگز بزرگ)
+- حذف پارامترهای ردیابی (utm_*, fbclid, ...) قابل تنظیم با URL_TRACKING_PARAMS
+
+لینک‌های ساده که از قبل نرمال هستند فقط با یک regex بررسی می‌شوند و نتیجه
+بقیه در یک حافظه LRU نگه داشته می‌شود.
+"""
+
+import hashlib
+import re
+from functools import lru_cache
+from typing import FrozenSet, Iterable, Tuple
+from urllib.parse import quote, urlsplit, urlunsplit
+
+DEFAULT_TRACKING_PARAMS = (
+    "utm_*", "fbclid", "gclid", "dclid", "gbraid", "wbraid", "msclkid", "yclid",
+    "igshid", "mc_cid", "mc_eid", "_ga", "_gl", "ref_src",
+)
+
+DEFAULT_PORTS = {'http': 80, 'https': 443}
+
+# لینکی که از قبل نرمال است: scheme و host کوچک (بدون نقطه انتهایی)، بدون پورت، %، query و fragment
+_CANONICAL_RE = re.compile(r'^https?://(?:[a-z0-9-]+\.)*[a-z0-9-]+/[A-Za-z0-9._~!$&\'()*+,;=:@/-]*$')
+_ESCAPE_RE = re.compile(r'%([0-9A-Fa-f]{2})')
+
+_UNRESERVED = frozenset("ABCDEFGHIJKLMNOPQRSTUVWXYZabcdefghijklmnopqrstuvwxyz0123456789-._~")
+_PATH_SAFE = "/!$&'()*+,;=:@%"
+_QUERY_SAFE = "/?!$'()*+,;:@%"
+
+_exact_params: FrozenSet[str] = frozenset()
+_prefix_params: Tuple[str, ...] = ()
+
+def configure(tracking_params: Iterable[str] = DEFAULT_TRACKING_PARAMS):
+    """تنظیم پارامترهای ردیابی (نام دقیق یا پیشوند با *)؛ حافظه LRU پاک می‌شود"""
+    global _exact_params, _prefix_params
+    params = [param.strip().lower() for param in tracking_params if param.strip()]
+    _exact_params = frozenset(param for param in params if not param.endswith('*'))
+    _prefix_params = tuple(param[:-1] for param in params if param.endswith('*'))
+    _canonicalize.cache_clear()
+
+def canonicalize(url: str) -> str:
+    """شکل نرمال لینک (لینک نامعتبر بدون تغییر برمی‌گردد)"""
+    url = url.strip()
+    if _CANONICAL_RE.match(url):
+        return url
+    return _canonicalize(url)
+
+def url_key(url: str, bits: int = 64) -> int:
+    """کلید فشرده ۶۴ یا ۱۲۸ بیتی لینک نرمال‌شده"""
+    digest = hashlib.blake2b(canonicalize(url).encode('utf-8'), digest_size=bits // 8).digest()
+    return int.from_bytes(digest, 'big')
+
+def cache_info():
+    return _canonicalize.cache_info()
+
+@lru_cache(maxsize=8192)
+def _canonicalize(url: str) -> str:
+    try:
+        parts = urlsplit(url)
+        port = parts.port
+    except ValueError:
+        return url
+    scheme = parts.scheme.lower()
+    if not parts.hostname:
+        return url
+
+    host = _normalize_host(parts.hostname)
+    if ':' in host:
+        host = f"[{host}]"  # IPv6
+    netloc = host
+    if port is not None and port != DEFAULT_PORTS.get(scheme):
+        netloc = f"{host}:{port}"
+    if parts.username is not None:
+        userinfo = parts.netloc.rpartition('@')[0]
+        netloc = f"{userinfo}@{netloc}"
+
+    path = _normalize_escapes(parts.path, _PATH_SAFE) or '/'
+    query = _normalize_query(parts.query)
+    return urlunsplit((scheme, netloc, path, query, ''))
+
+def _normalize_host(host: str) -> str:
+    host = host.lower().rstrip('.')
+    if host.isascii():
+        return host
+    try:
+        return host.encode('idna').decode('ascii')
+    except UnicodeError:
+        return quote(host, safe='.-')
+
+def _normalize_escapes(value: str, safe: str) -> str:
+    """decode حروف مجاز، هگز بزرگ برای بقیه و encode کاراکترهای غیرمجاز"""
+    if '%' in value:
+        value = _ESCAPE_RE.sub(_fix_escape, value)
+    return quote(value, safe=safe)
+
+def _fix_escape(match) -> str:
+    char = chr(int(match.group(1), 16))
+    return char if char in _UNRESERVED else '%' + match.group(1).upper()
+
+def _is_tracking(name: str) -> bool:
+    name = name.lower()
+    return name in _exact_params or name.startswith(_prefix_params)
+
+def _normalize_query(query: str) -> str:
+    if not query:
+        return ''
+    kept = []
+    for pair in query.split('&'):
+        if not pair:
+            continue
+        name = pair.split('=', 1)[0]
+        if _is_tracking(name):
+            continue
+        kept.append('='.join(_normalize_escapes(part, _QUERY_SAFE) for part in pair.split('=', 1)))
+    return '&'.join(kept)
+
+
+configure()